@@ -273,6 +273,9 @@ ZDS_APP['site']['googleTagManagerID'] = 'to-fill'
 ZDS_APP['article']['repo_path'] = '/opt/zds/data/articles-data'
 ZDS_APP['content']['repo_private_path'] = '/opt/zds/data/contents-private'
 ZDS_APP['content']['repo_public_path'] = '/opt/zds/data/contents-public'
+
+# extra contents (pdf, epub...) are sent by nginx, see the `/contents-public-internal/` location
+ZDS_APP['sendfile']['backend'] = 'x-accel-redirect'
 ZDS_APP['content']['extra_content_generation_policy'] = 'WATCHDOG'
 
 # enable ping!
@@ -3,6 +3,7 @@
 import factory
 from zds.forum.models import Category, Forum, Topic, Post
 from zds.utils.models import Tag
+from zds.utils.templatetags.emarkdown import get_renderer_version
 
 
 class CategoryFactory(factory.DjangoModelFactory):
@@ -45,6 +46,7 @@ class PostFactory(factory.DjangoModelFactory):
     ip_address = '192.168.3.1'
     text = "Bonjour, je me présente, je m'appelle l'homme au texte bidonné"
     text_html = text
+    text_html_version = factory.LazyFunction(get_renderer_version)
 
     @classmethod
     def _prepare(cls, create, **kwargs):
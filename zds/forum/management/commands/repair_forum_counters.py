@@ -0,0 +1,50 @@
+# coding: utf-8
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max
+
+from zds.forum.models import Forum, Topic, Post
+
+
+class Command(BaseCommand):
+    """
+    `python manage.py repair_forum_counters`; compute again the numbers of topics and posts and the last post of the
+    forums, and the numbers of posts of the topics (which are maintained by signals), and fix the wrong ones.
+    """
+    help = 'Check and repair the counters of the forums and topics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', default=False, dest='dry_run',
+                            help='only report the wrong counters')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        with transaction.atomic():
+            post_counts = dict(Post.objects.values_list('topic').annotate(count=Count('pk')).order_by())
+            wrong_topics = 0
+            for pk, post_count in Topic.objects.values_list('pk', 'post_count').iterator():
+                expected = post_counts.get(pk, 0)
+                if post_count != expected:
+                    wrong_topics += 1
+                    self.stdout.write(u'Topic #{}: {} posts instead of {}'.format(pk, post_count, expected))
+                    if not dry_run:
+                        Topic.objects.filter(pk=pk).update(post_count=expected)
+
+            topic_counts = dict(Topic.objects.values_list('forum').annotate(count=Count('pk')).order_by())
+            forum_posts = {forum_pk: (count, last_post_pk) for forum_pk, count, last_post_pk in Post.objects
+                           .values_list('topic__forum').annotate(count=Count('pk'), last=Max('pk')).order_by()}
+            wrong_forums = 0
+            for pk, topic_count, post_count, last_post_pk in Forum.objects \
+                    .values_list('pk', 'topic_count', 'post_count', 'last_post'):
+                expected = (topic_counts.get(pk, 0),) + forum_posts.get(pk, (0, None))
+                if (topic_count, post_count, last_post_pk) != expected:
+                    wrong_forums += 1
+                    self.stdout.write(u'Forum #{}: {} topics, {} posts, last post #{} instead of {}, {}, #{}'.format(
+                        pk, topic_count, post_count, last_post_pk, *expected))
+                    if not dry_run:
+                        Forum.objects.filter(pk=pk).update(
+                            topic_count=expected[0], post_count=expected[1], last_post=expected[2])
+
+        self.stdout.write(u'{} topic(s) and {} forum(s) {}.'.format(
+            wrong_topics, wrong_forums, 'to repair' if dry_run else 'repaired'))
@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
+import time
 
+from django.apps import apps
 from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 from django.db.models import Q, F
 from model_utils.managers import InheritanceManager
@@ -16,19 +19,13 @@ class ForumManager(models.Manager):
 
         :param category: the related category
         :type category: zds.forum.models.Category
-        :param with_count: optional parameter: if true, will preload thread and post number for each forum inside \
-        category
+        :param with_count: optional parameter: if true, will preload the last message of each forum inside category \
+        (the numbers of threads and posts are stored in the forum)
         :type with_count: bool
         """
         query_set = self.filter(category=category, groups__isnull=True).select_related('category').distinct()
         if with_count:
-            # this request count the threads in each forum
-            thread_sub_query = 'SELECT COUNT(*) FROM forum_topic WHERE forum_topic.forum_id=forum_forum.id'
-            # this request count the posts in each forum
-            post_sub_query = 'SELECT COUNT(*) FROM forum_post WHERE forum_post.topic_id ' \
-                             'IN(SELECT id FROM forum_topic WHERE forum_topic.forum_id=forum_forum.id)'
-
-            query_set = query_set.extra(select={'thread_count': thread_sub_query, 'post_count': post_sub_query})
+            query_set = query_set.select_related('last_post__topic')
         return query_set.all()
 
     def get_private_forums_of_category(self, category, user):
@@ -36,6 +33,58 @@ class ForumManager(models.Manager):
             .order_by('position_in_category')\
             .select_related('category').distinct().all()
 
+    readable_generation_key = 'forum:readable:generation'
+
+    def get_readable_generation(self):
+        generation = cache.get(self.readable_generation_key)
+        if generation is None:
+            # start from the current time, so that the entries of an evicted generation are never used again
+            cache.add(self.readable_generation_key, int(time.time() * 1000), None)
+            generation = cache.get(self.readable_generation_key) or 0
+        return generation
+
+    def invalidate_readable_pks(self):
+        """Hide every cached set of readable forums (and of groups of the users), once the groups of a user or of a
+        forum changed, or a forum was created or deleted.
+        """
+        try:
+            cache.incr(self.readable_generation_key)
+        except ValueError:  # the generation was evicted
+            cache.set(self.readable_generation_key, int(time.time() * 1000), None)
+
+    def get_readable_pks(self, user):
+        """Find the forums a user is allowed to read: the public ones and the ones restricted to one of their groups.
+
+        The result is cached for each set of groups (the groups of each user are cached as well), until
+        ``invalidate_readable_pks()`` is called.
+
+        :param user: the user, may be anonymous or ``None``
+        :return: the ``pk`` of the forums
+        :rtype: list
+        """
+        generation = self.get_readable_generation()
+        timeout = settings.ZDS_APP['forum']['readable_cache_timeout']
+
+        group_pks = []
+        if user is not None and user.is_authenticated():
+            key = 'forum:groups:{}:{}'.format(generation, user.pk)
+            group_pks = cache.get(key)
+            if group_pks is None:
+                group_pks = sorted(user.groups.values_list('pk', flat=True))
+                cache.set(key, group_pks, timeout)
+
+        key = 'forum:readable:{}:{}'.format(generation, '-'.join(str(pk) for pk in group_pks))
+        forum_pks = cache.get(key)
+        if forum_pks is None:
+            forum_pks = sorted(set(self.filter(Q(groups__isnull=True) | Q(groups__pk__in=group_pks))
+                                   .values_list('pk', flat=True)))
+            cache.set(key, forum_pks, timeout)
+        return forum_pks
+
+
+def get_readable_forum_pks(user):
+    return apps.get_model('forum', 'Forum').objects.get_readable_pks(user)
+
 
 class TopicManager(models.Manager):
     """
@@ -48,10 +97,7 @@ class TopicManager(models.Manager):
         :param current_user:
         :return:
         """
-        if current_user.is_authenticated():
-            return Q(forum__groups__isnull=True) | Q(forum__groups__pk__in=current_user.profile.group_pks)
-        else:
-            return Q(forum__groups__isnull=True)
+        return Q(forum__pk__in=get_readable_forum_pks(current_user))
 
     def last_topics_of_a_member(self, author, user):
         """
@@ -112,9 +158,7 @@ class PostManager(InheritanceManager):
         :param current_user:
         :return:
         """
-        if current_user.is_authenticated():
-            return Q(topic__forum__groups__isnull=True) | Q(topic__forum__groups__pk__in=current_user.profile.group_pks)
-        return Q(topic__forum__groups__isnull=True)
+        return Q(topic__forum__pk__in=get_readable_forum_pks(current_user))
 
     def get_messages_of_a_topic(self, topic_pk):
         return self.filter(topic__pk=topic_pk)\
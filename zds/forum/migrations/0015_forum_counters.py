@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+import django.db.models.deletion
+
+
+def compute_counters(apps, schema_editor):
+    Forum = apps.get_model('forum', 'Forum')
+    Topic = apps.get_model('forum', 'Topic')
+    Post = apps.get_model('forum', 'Post')
+
+    for topic_count in Post.objects.values('topic').annotate(count=Count('pk')).order_by():
+        Topic.objects.filter(pk=topic_count['topic']).update(post_count=topic_count['count'])
+
+    for forum_count in Topic.objects.values('forum').annotate(count=Count('pk')).order_by():
+        Forum.objects.filter(pk=forum_count['forum']).update(topic_count=forum_count['count'])
+
+    for forum_count in Post.objects.values('topic__forum').annotate(count=Count('pk'), last=Max('pk')).order_by():
+        Forum.objects.filter(pk=forum_count['topic__forum']).update(
+            post_count=forum_count['count'], last_post=forum_count['last'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0014_topic_github_issue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forum',
+            name='topic_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Nombre de sujets'),
+        ),
+        migrations.AddField(
+            model_name='forum',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Nombre de messages'),
+        ),
+        migrations.AddField(
+            model_name='forum',
+            name='last_post',
+            field=models.ForeignKey(related_name='+', on_delete=django.db.models.deletion.SET_NULL, blank=True,
+                                    to='forum.Post', null=True, verbose_name='Dernier message'),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Nombre de messages'),
+        ),
+        migrations.RunPython(compute_counters, migrations.RunPython.noop),
+    ]
@@ -3,21 +3,24 @@ from __future__ import unicode_literals
 from django.utils.encoding import python_2_unicode_compatible
 import logging
 from datetime import datetime, timedelta
+from collections import namedtuple
 from math import ceil
 
 from django.conf import settings
-from django.contrib.auth.models import Group, User, AnonymousUser
+from django.contrib.auth.models import Group, User
 from django.core.urlresolvers import reverse
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q
 from django.dispatch import receiver
-from django.db.models.signals import pre_delete
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 
 from elasticsearch_dsl.field import Text, Keyword, Integer, Boolean, Float, Date
 
 from zds.forum.managers import TopicManager, ForumManager, PostManager, TopicReadManager
 from zds.notification import signals
 from zds.settings import ZDS_APP
-from zds.searchv2.models import AbstractESDjangoIndexable, delete_document_in_elasticsearch, ESIndexManager
+from zds.searchv2.models import AbstractESDjangoIndexable, delete_document_in_elasticsearch, get_index_manager, \
+    log_index_changes
 from zds.utils import get_current_user, slugify
 from zds.utils.models import Comment, Tag
 
@@ -62,7 +65,7 @@ class Category(models.Model):
 
         :param user: the related user
         :type user: User
-        :param with_count: If true will preload thread and post number for each forum of this category
+        :param with_count: If true will preload the last message of each forum of this category
         :type with_count: bool
         :return: All forums in category, ordered by forum's position in category
         :rtype: list[Forum]
@@ -98,6 +101,14 @@ class Forum(models.Model):
                                                null=True, blank=True, db_index=True)
 
     slug = models.SlugField(max_length=80, unique=True)
+
+    # counters maintained by the signals of topics and posts (see ``repair_forum_counters``)
+    topic_count = models.PositiveIntegerField('Nombre de sujets', default=0)
+    post_count = models.PositiveIntegerField('Nombre de messages', default=0)
+    last_post = models.ForeignKey('Post', null=True, blank=True, on_delete=models.SET_NULL, related_name='+',
+                                  verbose_name='Dernier message')
+    counter_fields = ('topic_count', 'post_count', 'last_post')
+
     _nb_group = None
     objects = ForumManager()
 
@@ -107,36 +118,39 @@ class Forum(models.Model):
     def get_absolute_url(self):
         return reverse('forum-topics-list', kwargs={'cat_slug': self.category.slug, 'forum_slug': self.slug})
 
-    def get_topic_count(self):
-        """Retrieve or agregate the number of threads in this forum. If this number already exists, it must be stored \
-        in thread_count. Otherwise it will process a SQL query
+    def save(self, *args, **kwargs):
+        """Overridden so that the counters are not overwritten by an outdated instance
+        """
+
+        if self.pk is not None and Forum.objects.filter(pk=self.pk).exists():
+            kwargs.setdefault('update_fields', get_fields_but_counters(self))
 
+        return super(Forum, self).save(*args, **kwargs)
+
+    def get_topic_count(self):
+        """
         :return: the number of threads in the forum.
         """
-        try:
-            return self.thread_count
-        except AttributeError:
-            return Topic.objects.filter(forum=self).count()
+        return self.topic_count
 
     def get_post_count(self):
-        """Retrieve or agregate the number of posts in this forum. If this number already exists, it must be stored \
-        in post_count. Otherwise it will process a SQL query
-
+        """
         :return: the number of posts for a forum.
         """
-        try:
-            return self.post_count
-        except AttributeError:
-            return Post.objects.filter(topic__forum=self).count()
+        return self.post_count
 
     def get_last_message(self):
         """
         :return: the last message on the forum, if there are any.
         """
-        try:
-            return Post.objects.filter(topic__forum=self).order_by('-pubdate').all()[0]
-        except IndexError:
-            return None
+        return self.last_post
+
+    def update_last_post(self):
+        """Find the last message of the forum again (once it was deleted or moved).
+        """
+
+        self.last_post = Post.objects.filter(topic__forum=self).order_by('-pk').first()
+        Forum.objects.filter(pk=self.pk).update(last_post=self.last_post)
 
     def can_read(self, user):
         """
@@ -148,17 +162,7 @@ class Forum(models.Model):
         :return: `True` if the user can read this forum, `False` otherwise.
         """
 
-        if not self.has_group:
-            return True
-        else:
-            # authentication is the best way to be sure groups are available in the user object
-            if user is not None:
-                groups = list(user.groups.all()) if not isinstance(user, AnonymousUser) else []
-                return Forum.objects.filter(
-                    groups__in=groups,
-                    pk=self.pk).exists()
-            else:
-                return False
+        return self.pk in Forum.objects.get_readable_pks(user)
 
     @property
     def has_group(self):
@@ -173,6 +177,20 @@ class Forum(models.Model):
         return self._nb_group > 0
 
 
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=Forum.groups.through)
+def invalidate_readable_forums_on_groups_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        Forum.objects.invalidate_readable_pks()
+
+
+@receiver(post_save, sender=Forum)
+@receiver(post_delete, sender=Forum)
+@receiver(post_delete, sender=Group)
+def invalidate_readable_forums(sender, **kwargs):
+    Forum.objects.invalidate_readable_pks()
+
+
 @python_2_unicode_compatible
 class Topic(AbstractESDjangoIndexable):
     """
@@ -210,6 +228,10 @@ class Topic(AbstractESDjangoIndexable):
 
     github_issue = models.PositiveIntegerField('Ticket GitHub', null=True, blank=True)
 
+    # maintained by the signals of posts (see ``repair_forum_counters``)
+    post_count = models.PositiveIntegerField('Nombre de messages', default=0)
+    counter_fields = ('post_count',)
+
     tags = models.ManyToManyField(
         Tag,
         verbose_name='Tags du forum',
@@ -231,7 +253,7 @@ class Topic(AbstractESDjangoIndexable):
         """
         :return: the number of posts in the topic.
         """
-        return Post.objects.filter(topic__pk=self.pk).count()
+        return self.post_count
 
     def get_last_post(self):
         """
@@ -310,6 +332,8 @@ class Topic(AbstractESDjangoIndexable):
         else:
             try:
                 pk, pos = self.resolve_last_post_pk_and_pos_read_by_user(user)
+                if pk is None:  # never read, according to the state resolved by ``resolve_read_states()``
+                    raise TopicRead.DoesNotExist()
                 page_nb = 1
                 if pos > ZDS_APP['forum']['posts_per_page']:
                     page_nb += (pos - 1) // ZDS_APP['forum']['posts_per_page']
@@ -326,6 +350,10 @@ class Topic(AbstractESDjangoIndexable):
         :return: the primary key
         :rtype: int
         """
+        read_state = self.get_read_state(user)
+        if read_state is not None:
+            return read_state.last_read_post_pk, read_state.last_read_position
+
         t_read = TopicRead.objects\
                           .select_related('post')\
                           .filter(topic__pk=self.pk,
@@ -350,6 +378,10 @@ class Topic(AbstractESDjangoIndexable):
             if user is None:
                 user = get_current_user()
 
+            read_state = self.get_read_state(user)
+            if read_state is not None:
+                return read_state.first_unread_post
+
             last_post = TopicRead.objects \
                                  .filter(topic__pk=self.pk,
                                          user__pk=user.pk) \
@@ -362,6 +394,17 @@ class Topic(AbstractESDjangoIndexable):
         except (TopicRead.DoesNotExist, Post.DoesNotExist):
             return self.first_post()
 
+    def get_read_state(self, user):
+        """
+        :param user: a user
+        :return: the read state of this topic for this user, if it was resolved by ``resolve_read_states()``
+        :rtype: TopicReadState
+        """
+        read_state = getattr(self, 'read_state', None)
+        if read_state is not None and user is not None and read_state.user_pk == user.pk:
+            return read_state
+        return None
+
     def antispam(self, user=None):
         """
         Check if the user is allowed to post in a topic according to the `ZDS_APP['forum']['spam_limit_seconds']` value.
@@ -450,15 +493,68 @@ class Topic(AbstractESDjangoIndexable):
         """Overridden to handle the displacement of the topic to another forum
         """
 
+        old_self = None
         try:
             old_self = Topic.objects.get(pk=self.pk)
         except Topic.DoesNotExist:
             pass
         else:
             if old_self.forum.pk != self.forum.pk or old_self.title != self.title:
-                Post.objects.filter(topic__pk=self.pk).update(es_flagged=True)
+                posts = Post.objects.filter(topic__pk=self.pk)
+                posts.update(es_flagged=True)
+                log_index_changes(Post, list(posts.values_list('pk', flat=True)))
+
+            # the counters are maintained by the signals, an outdated instance must not overwrite them
+            kwargs.setdefault('update_fields', get_fields_but_counters(self))
 
-        return super(Topic, self).save(*args, **kwargs)
+        with transaction.atomic():
+            result = super(Topic, self).save(*args, **kwargs)
+
+            if old_self is not None and old_self.forum_id != self.forum_id:
+                # move the counters along with the topic
+                Forum.objects.filter(pk=old_self.forum_id).update(
+                    topic_count=F('topic_count') - 1, post_count=F('post_count') - old_self.post_count)
+                Forum.objects.filter(pk=self.forum_id).update(
+                    topic_count=F('topic_count') + 1, post_count=F('post_count') + old_self.post_count)
+                old_self.forum.update_last_post()
+                self.forum.update_last_post()
+
+        return result
+
+
+def get_fields_but_counters(instance):
+    """
+    :param instance: a forum or a topic
+    :return: the fields to save, the counters excepted
+    :rtype: list
+    """
+    deferred_fields = instance.get_deferred_fields()
+    return [field.name for field in instance._meta.concrete_fields
+            if not field.primary_key and field.name not in instance.counter_fields and
+            field.attname not in deferred_fields]
+
+
+@receiver(post_save, sender=Topic)
+def increment_topic_count(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Forum.objects.filter(pk=instance.forum_id).update(topic_count=F('topic_count') + 1)
+
+
+@receiver(pre_delete, sender=Topic)
+def decrement_topic_count(sender, instance, **kwargs):
+    """Remove the topic and its posts from the counters of the forum at once: the posts may be deleted after the
+    topic, so they cannot update the forum themselves (see ``decrement_post_counts()``)."""
+    post_count = Topic.objects.filter(pk=instance.pk).values_list('post_count', flat=True).first() or 0
+    Forum.objects.filter(pk=instance.forum_id).update(
+        topic_count=F('topic_count') - 1, post_count=F('post_count') - post_count)
+    Topic.objects.filter(pk=instance.pk).update(post_count=0)
+
+
+@receiver(post_delete, sender=Topic)
+def update_last_post_of_forum(sender, instance, **kwargs):
+    forum = Forum.objects.filter(pk=instance.forum_id, last_post__isnull=True).first()
+    if forum is not None:
+        forum.update_last_post()
 
 
 @receiver(pre_delete, sender=Topic)
@@ -558,7 +654,7 @@ class Post(Comment, AbstractESDjangoIndexable):
 
         super(Post, self).hide_comment_by_user(user, text_hidden)
 
-        index_manager = ESIndexManager(**settings.ES_SEARCH_INDEX)
+        index_manager = get_index_manager()
         index_manager.update_single_document(self, {'is_visible': False})
 
 
@@ -568,6 +664,34 @@ def delete_post_in_elasticsearch(sender, instance, **kwargs):
     return delete_document_in_elasticsearch(instance)
 
 
+@receiver(post_save, sender=Post)
+def increment_post_counts(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+
+    forum_id = Topic.objects.filter(pk=instance.topic_id).values_list('forum_id', flat=True).first()
+    with transaction.atomic():
+        Topic.objects.filter(pk=instance.topic_id).update(post_count=F('post_count') + 1)
+        Forum.objects.filter(pk=forum_id).update(post_count=F('post_count') + 1)
+        Forum.objects.filter(Q(last_post__isnull=True) | Q(last_post__lt=instance.pk), pk=forum_id) \
+                     .update(last_post=instance)
+
+
+@receiver(post_delete, sender=Post)
+def decrement_post_counts(sender, instance, **kwargs):
+    forum_id = Topic.objects.filter(pk=instance.topic_id).values_list('forum_id', flat=True).first()
+    if forum_id is None:  # deleted along with its topic, which already updated the forum
+        return
+
+    with transaction.atomic():
+        # when the topic is being deleted, its counter was already reset and the forum updated
+        if Topic.objects.filter(pk=instance.topic_id, post_count__gt=0).update(post_count=F('post_count') - 1):
+            Forum.objects.filter(pk=forum_id).update(post_count=F('post_count') - 1)
+        forum = Forum.objects.filter(pk=forum_id, last_post__isnull=True).first()  # it was the last post
+        if forum is not None:
+            forum.update_last_post()
+
+
 @python_2_unicode_compatible
 class TopicRead(models.Model):
     """
@@ -603,9 +727,62 @@ def is_read(topic, user=None):
     if user is None:
         user = get_current_user()
 
+    read_state = topic.get_read_state(user)
+    if read_state is not None:
+        return read_state.is_read
+
     return TopicRead.objects.filter(post=topic.last_message, topic=topic, user=user).exists()
 
 
+TopicReadState = namedtuple('TopicReadState', 'user_pk is_read last_read_post_pk last_read_position first_unread_post')
+
+
+def resolve_read_states(topics, user=None):
+    """
+    Resolve, in two queries, the read state of some topics for a user: is the last post read, which post was read last
+    and which one is the first unread. The state is stored in the ``read_state`` attribute of each topic, and used by
+    ``is_read()``, ``Topic.first_unread_post()``, ``Topic.resolve_last_post_pk_and_pos_read_by_user()`` and
+    ``Topic.resolve_last_read_post_absolute_url()`` instead of querying each topic.
+
+    :param topics: the topics (a list, since its elements are modified)
+    :param user: A user. If undefined, the current user is used.
+    :return: the topics
+    """
+    if user is None:
+        user = get_current_user()
+    if not topics:
+        return topics
+
+    last_read = {}
+    if user is not None and user.is_authenticated():
+        last_read = {read['topic']: (read['post'], read['post__position']) for read in TopicRead.objects
+                     .filter(user=user, topic__in=topics)
+                     .values('topic', 'post', 'post__position')}
+
+    # the first unread post is the one following the last read post (or the first one if the topic was never read)
+    next_posts = Q()
+    for topic in topics:
+        next_posts |= Q(topic=topic, position=last_read.get(topic.pk, (None, 0))[1] + 1)
+    first_unread_posts = {post.topic_id: post for post in Post.objects.filter(next_posts).select_related('author')}
+
+    for topic in topics:
+        post_pk, position = last_read.get(topic.pk, (None, None))
+        first_unread_post = first_unread_posts.get(topic.pk)
+        if first_unread_post is not None:
+            first_unread_post.topic = topic
+        elif post_pk != topic.last_message_id:
+            # there is an unread post, but not at the expected position (deleted post): let the topic find it
+            first_unread_post = topic.first_unread_post(user)
+        topic.read_state = TopicReadState(
+            user_pk=user.pk if user is not None else None,
+            is_read=post_pk is not None and post_pk == topic.last_message_id,
+            last_read_post_pk=post_pk,
+            last_read_position=position,
+            first_unread_post=first_unread_post)
+
+    return topics
+
+
 def mark_read(topic, user=None):
     """
     Mark the last message of a topic as read for the current user.
@@ -3,20 +3,27 @@
 from datetime import datetime, timedelta
 
 from django.conf import settings
-from django.contrib.auth.models import Group
+from django.contrib.auth.models import AnonymousUser, Group
 from django.core import mail
+from django.core.management import call_command
+from django.core.paginator import EmptyPage
 from django.core.urlresolvers import reverse
 from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils.six import StringIO
+from mock import patch
 
 from zds.forum.commons import PostEditMixin
 from zds.forum.factories import CategoryFactory, ForumFactory, \
     TopicFactory, PostFactory, TagFactory
-from zds.forum.models import Forum, TopicRead, Post, Topic, is_read
+from zds.forum.models import Forum, TopicRead, Post, Topic, is_read, resolve_read_states
+from zds.forum.views import ForumTopicsListView
 from zds.member.factories import ProfileFactory, StaffProfileFactory
 from zds.notification.models import TopicAnswerSubscription
 from zds.utils import slugify
 from zds.utils.forums import get_tag_by_title
 from zds.utils.models import Alert, Tag
+from zds.utils.paginator import KeysetPaginator, PositionPaginator
 from zds import settings as zds_settings
 
 
@@ -1305,3 +1312,204 @@ class TestMixins(TestCase):
         PostEditMixin.perform_unread_message(post, viewer)
         PostEditMixin.perform_unread_message(post, viewer)
         self.assertEqual(0, TopicRead.objects.count())
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ReadableForumsTests(TestCase):
+    def setUp(self):
+        self.category = CategoryFactory()
+        self.public_forum = ForumFactory(category=self.category)
+        self.group = Group.objects.create(name='readers')
+        self.private_forum = ForumFactory(category=self.category)
+        self.private_forum.groups.add(self.group)
+        self.user = ProfileFactory().user
+
+    def test_cache_and_invalidation(self):
+        anonymous = AnonymousUser()
+        self.assertEqual(Forum.objects.get_readable_pks(anonymous), [self.public_forum.pk])
+        self.assertEqual(Forum.objects.get_readable_pks(None), [self.public_forum.pk])
+        self.assertEqual(Forum.objects.get_readable_pks(self.user), [self.public_forum.pk])
+
+        # the groups of the user and the readable forums are cached
+        with self.assertNumQueries(0):
+            self.assertTrue(self.public_forum.can_read(self.user))
+            self.assertFalse(self.private_forum.can_read(self.user))
+
+        # joining a group
+        self.user.groups.add(self.group)
+        self.assertTrue(self.private_forum.can_read(self.user))
+        self.assertEqual(Topic.objects.filter(Topic.objects.visibility_check_query(self.user)).count(), 0)
+        topic = TopicFactory(forum=self.private_forum, author=self.user)
+        self.assertEqual(list(Topic.objects.filter(Topic.objects.visibility_check_query(self.user))), [topic])
+        self.assertEqual(Topic.objects.filter(Topic.objects.visibility_check_query(anonymous)).count(), 0)
+
+        # leaving it
+        self.user.groups.remove(self.group)
+        self.assertFalse(self.private_forum.can_read(self.user))
+
+        # a forum which is not restricted anymore
+        self.private_forum.groups.clear()
+        self.assertTrue(self.private_forum.can_read(anonymous))
+
+        # a new forum
+        forum = ForumFactory(category=self.category)
+        self.assertTrue(forum.pk in Forum.objects.get_readable_pks(anonymous))
+
+
+class ReadStatesTests(TestCase):
+    def setUp(self):
+        self.forum = ForumFactory(category=CategoryFactory(), position_in_category=1)
+        self.author = ProfileFactory().user
+        self.reader = ProfileFactory().user
+
+        self.topics = [TopicFactory(forum=self.forum, author=self.author) for _ in range(3)]
+        self.posts = [[PostFactory(topic=topic, author=self.author, position=i) for i in range(1, 4)]
+                      for topic in self.topics]
+
+        # the first topic is partially read, the second one never read and the last one completely read
+        TopicRead(topic=self.topics[0], post=self.posts[0][0], user=self.reader).save()
+        TopicRead(topic=self.topics[2], post=self.posts[2][2], user=self.reader).save()
+
+    def test_resolve_read_states(self):
+        expected = []
+        for topic in Topic.objects.filter(pk__in=[t.pk for t in self.topics]).order_by('pk'):
+            expected.append((
+                is_read(topic, self.reader),
+                topic.first_unread_post(self.reader),
+                topic.resolve_last_post_pk_and_pos_read_by_user(self.reader)
+                if TopicRead.objects.filter(topic=topic, user=self.reader).exists() else (None, None)))
+
+        topics = list(Topic.objects.filter(pk__in=[t.pk for t in self.topics]).order_by('pk'))
+        with self.assertNumQueries(2):
+            resolve_read_states(topics, self.reader)
+
+        with self.assertNumQueries(0):
+            states = [(is_read(topic, self.reader),
+                       topic.first_unread_post(self.reader),
+                       topic.resolve_last_post_pk_and_pos_read_by_user(self.reader)) for topic in topics]
+        self.assertEqual(states, expected)
+        self.assertEqual(states[0][1], self.posts[0][1])
+        self.assertEqual(states[1][1], self.posts[1][0])
+        self.assertIsNone(states[2][1])
+
+        # a state is only used for the user it was resolved for
+        self.assertEqual(topics[1].first_unread_post(self.author), self.posts[1][0])
+        self.assertIsNone(topics[0].get_read_state(self.author))
+
+        # the anonymous users did not read anything
+        topics = list(Topic.objects.filter(pk__in=[t.pk for t in self.topics]).order_by('pk'))
+        with self.assertNumQueries(1):
+            resolve_read_states(topics, AnonymousUser())
+        self.assertEqual([topic.read_state.first_unread_post for topic in topics], [p[0] for p in self.posts])
+        self.assertFalse(any(topic.read_state.is_read for topic in topics))
+
+
+class CountersTests(TestCase):
+    def setUp(self):
+        category = CategoryFactory()
+        self.forum = ForumFactory(category=category, position_in_category=1)
+        self.other_forum = ForumFactory(category=category, position_in_category=2)
+        self.author = ProfileFactory().user
+
+        self.topics = [TopicFactory(forum=self.forum, author=self.author) for _ in range(2)]
+        self.posts = [[PostFactory(topic=topic, author=self.author, position=i) for i in range(1, 4)]
+                      for topic in self.topics]
+
+    def assertCounters(self, forum, topic_count, post_count, last_post):
+        forum = Forum.objects.get(pk=forum.pk)
+        self.assertEqual(forum.get_topic_count(), topic_count)
+        self.assertEqual(forum.get_post_count(), post_count)
+        self.assertEqual(forum.get_last_message(), last_post)
+
+    def test_counters(self):
+        self.assertCounters(self.forum, 2, 6, self.posts[1][2])
+        self.assertEqual(Topic.objects.get(pk=self.topics[0].pk).get_post_count(), 3)
+
+        # saving an outdated instance does not overwrite the counters
+        self.forum.save()
+        self.topics[0].save()
+        self.assertCounters(self.forum, 2, 6, self.posts[1][2])
+        self.assertEqual(Topic.objects.get(pk=self.topics[0].pk).get_post_count(), 3)
+
+        # delete the last post
+        Topic.objects.filter(pk=self.topics[1].pk).update(last_message=self.posts[1][1])
+        self.posts[1][2].delete()
+        self.assertCounters(self.forum, 2, 5, self.posts[1][1])
+        self.assertEqual(Topic.objects.get(pk=self.topics[1].pk).get_post_count(), 2)
+
+        # move a topic
+        topic = Topic.objects.get(pk=self.topics[1].pk)
+        topic.forum = self.other_forum
+        topic.save()
+        self.assertCounters(self.forum, 1, 3, self.posts[0][2])
+        self.assertCounters(self.other_forum, 1, 2, self.posts[1][1])
+
+        # delete a topic, along with its posts
+        Topic.objects.get(pk=self.topics[0].pk).delete()
+        self.assertCounters(self.forum, 0, 0, None)
+        self.assertCounters(self.other_forum, 1, 2, self.posts[1][1])
+
+    def test_repair_command(self):
+        Forum.objects.filter(pk=self.forum.pk).update(topic_count=12, post_count=0, last_post=None)
+        Topic.objects.filter(pk=self.topics[0].pk).update(post_count=1)
+
+        call_command('repair_forum_counters', '--dry-run', stdout=StringIO())
+        self.assertCounters(self.forum, 12, 0, None)
+
+        out = StringIO()
+        call_command('repair_forum_counters', stdout=out)
+        self.assertIn('1 topic(s) and 1 forum(s) repaired', out.getvalue())
+        self.assertCounters(self.forum, 2, 6, self.posts[1][2])
+        self.assertCounters(self.other_forum, 0, 0, None)
+        self.assertEqual(Topic.objects.get(pk=self.topics[0].pk).get_post_count(), 3)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.forum = ForumFactory(category=CategoryFactory(), position_in_category=1)
+        self.author = ProfileFactory().user
+
+    def test_topics(self):
+        topics = [TopicFactory(forum=self.forum, author=self.author) for _ in range(7)]
+        for topic in topics:
+            PostFactory(topic=topic, author=self.author, position=1)
+        queryset = Topic.objects.get_all_topics_of_a_forum(self.forum.pk)
+        expected = list(queryset.order_by('-last_message__pubdate', '-pk'))
+
+        for cache_key in (None, 'forum'):
+            paginator = KeysetPaginator(queryset, 3, ('-last_message__pubdate', '-pk'), count=7, cache_key=cache_key)
+            self.assertEqual(paginator.num_pages, 3)
+            for number in (3, 1, 2, 3):  # a jump, then from a page to the next one
+                page = paginator.page(number)
+                self.assertEqual(list(page.object_list), expected[(number - 1) * 3:number * 3])
+                previous_item = expected[(number - 1) * 3 - 1] if number > 1 else None
+                self.assertEqual(paginator.get_previous_item(page), previous_item)
+
+    def test_topics_bumped_between_two_pages(self):
+        topics = [TopicFactory(forum=self.forum, author=self.author) for _ in range(7)]
+        for topic in topics:
+            PostFactory(topic=topic, author=self.author, position=1)
+        url = reverse('forum-topics-list', args=[self.forum.category.slug, self.forum.slug])
+
+        with patch.object(ForumTopicsListView, 'paginate_by', 3):
+            response = self.client.get(url + '?page=3')
+            self.assertEqual(list(response.context['topics']), topics[:1])
+
+            # an answer brings the last topic to the top of the list, the pages must not skip or repeat a topic
+            PostFactory(topic=topics[0], author=self.author, position=2)
+            expected = topics[:1] + topics[::-1][:-1]
+            for number in (2, 3):
+                response = self.client.get(url + '?page={}'.format(number))
+                self.assertEqual(list(response.context['topics']), expected[(number - 1) * 3:number * 3])
+
+    def test_posts(self):
+        topic = TopicFactory(forum=self.forum, author=self.author)
+        posts = [PostFactory(topic=topic, author=self.author, position=i) for i in range(1, 8)]
+        paginator = PositionPaginator(Post.objects.get_messages_of_a_topic(topic.pk), 3, count=7)
+
+        page = paginator.page(3)
+        self.assertEqual(list(page.object_list), posts[6:])
+        self.assertEqual(paginator.get_previous_item(page), posts[5])
+        self.assertEqual(list(paginator.page(2).object_list), posts[3:6])
+        self.assertRaises(EmptyPage, paginator.page, 4)
@@ -21,15 +21,15 @@ from django.views.generic.detail import SingleObjectMixin
 
 from zds.forum.commons import TopicEditMixin, PostEditMixin, SinglePostObjectMixin, ForumEditMixin
 from zds.forum.forms import TopicForm, PostForm, MoveTopicForm
-from zds.forum.models import Category, Forum, Topic, Post, is_read, mark_read, TopicRead
+from zds.forum.models import Category, Forum, Topic, Post, is_read, mark_read, resolve_read_states
 from zds.member.decorator import can_write_and_read_now
 from zds.notification import signals
 from zds.notification.models import NewTopicSubscription, TopicAnswerSubscription
 from zds.utils import slugify
-from zds.utils.forums import create_topic, send_post, CreatePostView
+from zds.utils.forums import create_topic, send_post, CreatePostView, get_messages_context
 from zds.utils.mixins import FilterMixin
-from zds.utils.models import Alert, Tag, CommentVote
-from zds.utils.paginator import ZdSPagingListView
+from zds.utils.models import Alert, Tag
+from zds.utils.paginator import ZdSPagingListView, KeysetPaginator, PositionPaginator
 
 
 class CategoriesForumsListView(ListView):
@@ -66,6 +66,7 @@ class ForumTopicsListView(FilterMixin, ForumEditMixin, ZdSPagingListView, Update
     filter_url_kwarg = 'filter'
     default_filter_param = 'all'
     object = None
+    sticky_topics = None
 
     def get(self, request, *args, **kwargs):
         self.object = self.get_object()
@@ -90,13 +91,31 @@ class ForumTopicsListView(FilterMixin, ForumEditMixin, ZdSPagingListView, Update
             return HttpResponse(json.dumps(response), content_type='application/json')
         return redirect(u'{}?page={}'.format(self.object.get_absolute_url(), self.page))
 
+    def get_sticky_topics(self):
+        if self.sticky_topics is None:
+            self.sticky_topics = list(
+                self.filter_queryset(
+                    Topic.objects.get_all_topics_of_a_forum(self.object.pk, is_sticky=True),
+                    self.get_filter_param()))
+        return self.sticky_topics
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        filter_param = self.get_filter_param()
+        count = None
+        if filter_param == self.default_filter_param:
+            # the forum counts its topics, the sticky ones included
+            count = self.object.get_topic_count() - len(self.get_sticky_topics())
+        return KeysetPaginator(
+            queryset, per_page, ('-last_message__pubdate', '-pk'), count=count,
+            # a new message moves its topic to the top of the list, and the remembered boundaries get outdated
+            cache_key='forum:{}:{}:{}:{}'.format(
+                self.object.pk, filter_param, self.object.last_post_id, self.object.get_topic_count()),
+            allow_empty_first_page=allow_empty_first_page, **kwargs)
+
     def get_context_data(self, **kwargs):
         context = super(ForumTopicsListView, self).get_context_data(**kwargs)
-        context['topics'] = list(context['topics'].all())
-        sticky = list(
-            self.filter_queryset(
-                Topic.objects.get_all_topics_of_a_forum(self.object.pk, is_sticky=True),
-                context['filter']))
+        context['topics'] = list(context['topics'])
+        sticky = self.get_sticky_topics()
         # we need to load it in memory because later we will get the
         # "already read topic" set out of this list and MySQL does not support that type of subquery
 
@@ -109,7 +128,8 @@ class ForumTopicsListView(FilterMixin, ForumEditMixin, ZdSPagingListView, Update
         context.update({
             'forum': self.object,
             'sticky_topics': sticky,
-            'topic_read': TopicRead.objects.list_read_topic_pk(self.request.user, context['topics'] + sticky),
+            'topic_read': [topic.pk for topic in resolve_read_states(context['topics'] + sticky, self.request.user)
+                           if topic.read_state.is_read],
             'subscriber_count': NewTopicSubscription.objects.get_subscriptions(self.object).count(),
         })
         return context
@@ -166,10 +186,8 @@ class TopicPostsListView(ZdSPagingListView, SingleObjectMixin):
             'form_move': MoveTopicForm(topic=self.object),
         })
 
-        votes = CommentVote.objects.filter(user_id=self.request.user.pk, comment__in=context['posts']).all()
-        context['user_like'] = [vote.comment_id for vote in votes if vote.positive]
-        context['user_dislike'] = [vote.comment_id for vote in votes if not vote.positive]
         context['is_staff'] = self.request.user.has_perm('forum.change_topic')
+        context.update(get_messages_context(posts, self.request.user, context['is_staff']))
         context['isantispam'] = self.object.antispam()
         context['subscriber_count'] = TopicAnswerSubscription.objects.get_subscriptions(self.object).count()
         if hasattr(self.request.user, 'profile'):
@@ -177,14 +195,8 @@ class TopicPostsListView(ZdSPagingListView, SingleObjectMixin):
             context['tags'] = settings.ZDS_APP['site']['repository']['tags']
             context['has_token'] = self.request.user.profile.github_token != ''
 
-        if self.request.user.has_perm('forum.change_topic'):
-            context['user_can_modify'] = [post.pk for post in context['posts']]
-        else:
-            context['user_can_modify'] = [post.pk for post in context['posts'] if post.author == self.request.user]
-
         if self.request.user.is_authenticated():
-            for post in posts:
-                signals.content_read.send(sender=post.__class__, instance=post, user=self.request.user)
+            signals.contents_read.send(sender=Post, instances=posts, user=self.request.user)
             if not is_read(self.object):
                 mark_read(self.object)
         return context
@@ -195,6 +207,11 @@ class TopicPostsListView(ZdSPagingListView, SingleObjectMixin):
     def get_queryset(self):
         return Post.objects.get_messages_of_a_topic(self.object.pk)
 
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        # the messages are numbered by their position, even if some of them were deleted
+        return PositionPaginator(queryset, per_page, count=self.object.last_message.position,
+                                 allow_empty_first_page=allow_empty_first_page, **kwargs)
+
 
 class TopicNew(CreateView, SingleObjectMixin):
 
@@ -426,7 +443,8 @@ class FindTopicByTag(FilterMixin, ForumEditMixin, ZdSPagingListView, SingleObjec
         context.update({
             'tag': self.object,
             'subscriber_count': NewTopicSubscription.objects.get_subscriptions(self.object).count(),
-            'topic_read': TopicRead.objects.list_read_topic_pk(self.request.user, context['topics'])
+            'topic_read': [topic.pk for topic in resolve_read_states(context['topics'], self.request.user)
+                           if topic.read_state.is_read]
         })
         return context
 
@@ -26,7 +26,7 @@ from django.utils.translation import ugettext_lazy as _
 from django.views.decorators.http import require_POST
 from django.views.generic import DetailView, UpdateView, CreateView, FormView
 
-from zds.forum.models import Topic, TopicRead
+from zds.forum.models import Topic, resolve_read_states
 from zds.gallery.forms import ImageAsAvatarForm
 from zds.gallery.models import UserGallery
 from zds.member import NEW_ACCOUNT, EMAIL_EDIT
@@ -86,7 +86,8 @@ class MemberDetail(DetailView):
         context['articles'] = PublishedContent.objects.last_articles_of_a_member_loaded(usr)
         context['opinions'] = PublishedContent.objects.last_opinions_of_a_member_loaded(usr)
         context['tutorials'] = PublishedContent.objects.last_tutorials_of_a_member_loaded(usr)
-        context['topic_read'] = TopicRead.objects.list_read_topic_pk(self.request.user, context['topics'])
+        context['topic_read'] = [topic.pk for topic in resolve_read_states(context['topics'], self.request.user)
+                                 if topic.read_state.is_read]
         context['subscriber_count'] = NewPublicationSubscription.objects.get_subscriptions(self.object).count()
         if self.request.user.has_perm('member.change_profile'):
             sanctions = list(Ban.objects.filter(user=usr).select_related('moderator'))
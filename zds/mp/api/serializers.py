@@ -17,10 +17,11 @@ class PrivatePostSerializer(ZdSModelSerializer):
     Serializers of a private post object.
     """
     permissions = DRYPermissionsField()
+    text_html = serializers.CharField(source='get_text_html', read_only=True)
 
     class Meta:
         model = PrivatePost
-        fields = '__all__'
+        exclude = ('text_html_version',)
         serializers = (UserListSerializer,)
         formats = {'Html': 'text_html', 'Markdown': 'text'}
         read_only_fields = ('permissions',)
@@ -1,8 +1,6 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
 
-from zds.utils.templatetags.emarkdown import emarkdown
-
 
 class LeavePrivateTopic(object):
     """
@@ -31,8 +29,7 @@ class UpdatePrivatePost(object):
     """
 
     def perform_update(self, instance, data):
-        instance.text = data.get('text')
-        instance.text_html = emarkdown(data.get('text'))
+        instance.update_content(data.get('text'))
         instance.update = datetime.now()
         instance.save()
         return instance
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mp', '0002_auto_20150416_1750'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='privatepost',
+            name='text_html_version',
+            field=models.CharField(default='', max_length=80, verbose_name='Version du rendu du texte en HTML', blank=True),
+        ),
+    ]
@@ -10,6 +10,7 @@ from zds.mp.managers import PrivateTopicManager, PrivatePostManager
 from zds.notification import signals
 
 from zds.utils import get_current_user, slugify
+from zds.utils.templatetags.emarkdown import emarkdown, get_renderer_version
 
 
 @python_2_unicode_compatible
@@ -220,6 +221,7 @@ class PrivatePost(models.Model):
     author = models.ForeignKey(User, verbose_name='Auteur', related_name='privateposts', db_index=True)
     text = models.TextField(u'Texte')
     text_html = models.TextField(u'Texte en HTML')
+    text_html_version = models.CharField(u'Version du rendu du texte en HTML', max_length=80, blank=True, default='')
     pubdate = models.DateTimeField(u'Date de publication', auto_now_add=True, db_index=True)
     update = models.DateTimeField(u'Date d\'édition', null=True, blank=True)
     position_in_topic = models.IntegerField(u'Position dans le sujet', db_index=True)
@@ -245,6 +247,37 @@ class PrivatePost(models.Model):
 
         return '{0}?page={1}#p{2}'.format(self.privatetopic.get_absolute_url(), page, self.pk)
 
+    def update_content(self, text):
+        """
+        Set the text of the message and render it. The message is not saved.
+
+        :param text: the new text, in markdown.
+        """
+        self.text = text
+        self.text_html = emarkdown(text)
+        self.text_html_version = get_renderer_version()
+
+    def get_text_html(self):
+        """
+        Get the html version of the text, which is rendered again (and saved) if it was generated by another
+        version of the markdown renderer.
+
+        :return: the html version of the text.
+        """
+        if self.text_html_version != get_renderer_version():
+            self.render_text_html()
+        return self.text_html
+
+    def render_text_html(self):
+        """
+        Render the text again with the current markdown renderer. Only ``text_html`` and ``text_html_version`` are
+        saved.
+        """
+        self.update_content(self.text)
+        if self.pk:
+            PrivatePost.objects.filter(pk=self.pk).update(text_html=self.text_html,
+                                                          text_html_version=self.text_html_version)
+
     def is_author(self, user):
         """
         Check if the user given is the author of the message.
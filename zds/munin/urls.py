@@ -2,7 +2,8 @@
 
 from django.conf.urls import url
 
-from zds.munin.views import total_topics, total_posts, total_mps, total_tutorials, total_articles, total_opinions
+from zds.munin.views import total_topics, total_posts, total_mps, total_tutorials, total_articles, total_opinions, \
+    markdown_render_cache
 
 
 urlpatterns = [
@@ -12,4 +13,5 @@ urlpatterns = [
     url(r'^total_tutorials/$', total_tutorials, name='total_tutorial'),
     url(r'^total_articles/$', total_articles, name='total_articles'),
     url(r'^total_opinions/$', total_opinions, name='total_opinions'),
+    url(r'^markdown_render_cache/$', markdown_render_cache, name='markdown_render_cache'),
 ]
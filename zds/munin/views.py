@@ -2,6 +2,7 @@ from munin.helpers import muninview
 from zds.forum.models import Topic, Post
 from zds.mp.models import PrivateTopic, PrivatePost
 from zds.tutorialv2.models.models_database import PublishableContent, ContentReaction
+from zds.utils.templatetags.emarkdown import render_cache
 
 
 @muninview(config="""graph_title Total Topics
@@ -62,3 +63,23 @@ def total_opinions(request):
             ('featured', opinions.filter(sha_picked__isnull=False).count()),
             ('published', opinions.filter(sha_public__isnull=False).count()),
             ('converted', opinions.filter(converted_to__sha_public__isnull=False).count())]
+
+
+@muninview(config="""graph_title Markdown render cache (one worker)
+graph_vlabel #renders
+graph_args --lower-limit 0
+local_hits.label Local hits
+local_hits.type DERIVE
+local_hits.min 0
+shared_hits.label Shared hits
+shared_hits.type DERIVE
+shared_hits.min 0
+shared_misses.label Renders
+shared_misses.type DERIVE
+shared_misses.min 0
+""")
+def markdown_render_cache(request):
+    stats = render_cache.stats()
+    return [('local_hits', stats['local_hits']),
+            ('shared_hits', stats['shared_hits']),
+            ('shared_misses', stats['shared_misses'])]
@@ -0,0 +1,51 @@
+# coding: utf-8
+import inspect
+import timeit
+
+from django.core.management import BaseCommand
+
+from zds.notification.receivers import disable_for_loaddata
+
+
+def receiver(*args, **kwargs):
+    pass
+
+
+def detect_loaddata_with_stack(signal_handler):
+    """The previous implementation of ``disable_for_loaddata()``, which looked for ``loaddata`` in the stack."""
+    def wrapper(*args, **kwargs):
+        for fr in inspect.stack():
+            if inspect.getmodulename(fr[1]) == 'loaddata':
+                return
+        signal_handler(*args, **kwargs)
+    return wrapper
+
+
+def call_under_stack(depth, function):
+    """Call a function under ``depth`` more frames, like a receiver called during a request."""
+    if depth > 0:
+        return call_under_stack(depth - 1, function)
+    return function(sender=None, instance=None, created=True)
+
+
+class Command(BaseCommand):
+    """
+    `python manage.py benchmark_disable_for_loaddata`; measure the time spent by a receiver decorated by
+    ``disable_for_loaddata()`` (called for each topic, post, reaction... saved), compared to the detection of the
+    fixture loading which walked the stack.
+    """
+    help = 'Measure the overhead of disable_for_loaddata'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--depth', type=int, default=60, dest='depth',
+                            help='number of frames above the receiver')
+        parser.add_argument('--number', type=int, default=1000, dest='number',
+                            help='number of calls measured')
+
+    def handle(self, *args, **options):
+        depth, number = options['depth'], options['number']
+        for title, function in (('stack only', receiver),
+                                ('inspect.stack()', detect_loaddata_with_stack(receiver)),
+                                ('disable_for_loaddata', disable_for_loaddata(receiver))):
+            duration = min(timeit.repeat(lambda: call_under_stack(depth, function), repeat=3, number=number))
+            self.stdout.write(u'{}:\t{:.1f} us per call'.format(title, duration / number * 1e6))
@@ -0,0 +1,73 @@
+# coding: utf-8
+import logging
+import time
+
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from zds import settings
+from zds.notification.models import NotificationJob, send_emails
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    `python manage.py notification_worker`; notify the subscribers to the forums, topics and contents about the new
+    topics and answers queued when the ``fan_out_policy`` setting is ``'QUEUE'``.
+
+    The emails of a batch of jobs are sent together, through a single connection to the mail server and no faster
+    than ``email_rate``. Several workers can run at the same time: a job is claimed by only one of them.
+    """
+    help = 'Send the queued notifications'
+
+    def add_arguments(self, parser):
+        queue_settings = settings.ZDS_APP['notification']['queue']
+        parser.add_argument('--batch-size', type=int, default=queue_settings['batch_size'], dest='batch_size',
+                            help='number of jobs run before sending their emails')
+        parser.add_argument('--once', action='store_true', dest='once', default=False,
+                            help='stop when there is no more job ready to run instead of waiting for new ones')
+
+    def handle(self, *args, **options):
+        queue_settings = settings.ZDS_APP['notification']['queue']
+
+        try:
+            while True:
+                stalled = NotificationJob.objects.requeue_stalled(queue_settings['stalled_after'])
+                if stalled:
+                    self.stdout.write(u'{} stalled jobs queued again'.format(stalled))
+
+                jobs = NotificationJob.objects.claim(max(1, options['batch_size']))
+                if jobs:
+                    self.run_jobs(jobs, queue_settings['email_rate'])
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(queue_settings['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+
+    def run_jobs(self, jobs, email_rate):
+        start = time.time()
+        emails = []
+        failed = 0
+        for job in jobs:
+            try:
+                # a job is deleted along with the creation of its notifications, so that a job is never run twice
+                # (which would duplicate the notifications). Its emails are thus sent at most once: they are lost if
+                # the worker dies before sending them.
+                with transaction.atomic():
+                    to_email = job.run()
+                    job_emails = [subscription.build_email(notification) for subscription, notification in to_email]
+                    job.finish()
+            except Exception as e:
+                logger.exception('Could not run %s', job)
+                job.finish(error=repr(e))
+                failed += 1
+            else:
+                emails.extend(job_emails)
+
+        send_emails(emails, rate=email_rate)
+
+        self.stdout.write(u'{} jobs run ({} failed), {} emails sent ({:.1f}s)'.format(
+            len(jobs), failed, len(emails), time.time() - start))
@@ -1,13 +1,26 @@
 # -*- coding: utf-8 -*-
+import datetime
+
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
+from django.db.models import Case, When, Value, Max
 
 from zds.forum.models import Topic
 from zds.notification import signals
 from zds.utils import get_current_user
 
 
+def notifications_updated():
+    """
+    Invalidates the responses of the API about the notifications, as ``post_save`` does, after ``update()`` or
+    ``bulk_create()``.
+    """
+    cache.set('api_updated_notification', datetime.datetime.utcnow())
+
+
 class SubscriptionManager(models.Manager):
     """
     Custom subscription manager
@@ -91,6 +104,147 @@ class SubscriptionManager(models.Manager):
 
         return subscription
 
+    def fan_out(self, subscribed_object, content, sender, send_email=True):
+        """
+        Notifies the subscribers to an object (but the sender) about a new content.
+
+        :param subscribed_object: the object the subscriptions are about (a forum, a topic...)
+        :param content: the new content (a topic, an answer...)
+        :param sender: the user whose action triggered the notifications
+        :type sender: django.contrib.auth.models.User
+        :param send_email: whether an email must be sent for the subscriptions by email
+        :type send_email: bool
+        :return: the ``(subscription, notification)`` to send by email
+        :rtype: list
+        """
+        subscriptions = self.get_subscriptions(subscribed_object).exclude(user=sender) \
+                            .select_related('user', 'last_notification')
+        return self.send_notifications(subscriptions, content, sender, send_email)
+
+    def send_notifications(self, subscriptions, content, sender, send_email=True):
+        """
+        Sends the notification about the given content to many subscriptions at once, as ``send_notification()``
+        does for one of them, with a few set-based queries: the notifications are created with ``bulk_create()`` and
+        the ``last_notification`` of the subscriptions are updated with a single query.
+
+        :param subscriptions: subscriptions of this model, all to the same object
+        :param content: the content the notifications are about
+        :param sender: the user whose action triggered the notifications
+        :type sender: django.contrib.auth.models.User
+        :param send_email: whether an email must be sent for the subscriptions by email
+        :type send_email: bool
+        :return: the ``(subscription, notification)`` to send by email
+        :rtype: list
+        """
+        from zds.notification.models import SingleNotificationMixin
+
+        subscriptions = list(subscriptions)
+        if not subscriptions:
+            return []
+
+        if issubclass(self.model, SingleNotificationMixin):
+            notified = self._send_single_notifications(subscriptions, content, sender)
+        else:
+            notified = self._create_notifications(subscriptions, self._get_notification_fields(
+                subscriptions[0], content, sender))
+        notifications_updated()
+
+        if not send_email:
+            return []
+        return [(subscription, notification) for subscription, notification in notified if subscription.by_email]
+
+    def _get_notification_fields(self, subscription, content, sender):
+        return {
+            'content_type': ContentType.objects.get_for_model(content),
+            'object_id': content.pk,
+            'sender': sender,
+            'url': subscription.get_notification_url(content),
+            'title': subscription.get_notification_title(content),
+            'is_read': False,
+        }
+
+    def _send_single_notifications(self, subscriptions, content, sender):
+        from zds.notification.models import Notification
+
+        # as in ``SingleNotificationMixin.send_notification()``, a subscription gets a new notification only if its
+        # last one was read, otherwise its unread notification is moved to the content if it is older
+        to_notify = [subscription for subscription in subscriptions
+                     if subscription.last_notification is None or subscription.last_notification.is_read]
+        to_notify_pks = set(subscription.pk for subscription in to_notify)
+        to_move = [subscription.last_notification_id for subscription in subscriptions
+                   if subscription.pk not in to_notify_pks and subscription.last_notification.pubdate > content.pubdate]
+
+        if to_move:
+            Notification.objects.filter(pk__in=to_move) \
+                                .update(content_type=ContentType.objects.get_for_model(content), object_id=content.pk)
+        if not to_notify:
+            return []
+
+        fields = self._get_notification_fields(to_notify[0], content, sender)
+        fields['pubdate'] = content.pubdate
+
+        # the notification of a subscription is reused
+        notifications = {}
+        for notification in Notification.objects.filter(subscription__in=list(to_notify_pks)).order_by('pk'):
+            notifications.setdefault(notification.subscription_id, notification)
+        Notification.objects.filter(pk__in=[n.pk for n in notifications.values()]).update(**fields)
+        for notification in notifications.values():
+            for name, value in fields.items():
+                setattr(notification, name, value)
+
+        reused = [(subscription, notifications[subscription.pk]) for subscription in to_notify
+                  if subscription.pk in notifications]
+        self._set_last_notifications({subscription.pk: notification.pk for subscription, notification in reused
+                                      if subscription.last_notification_id != notification.pk})
+        for subscription, notification in reused:
+            subscription.last_notification = notification
+
+        return reused + self._create_notifications(
+            [subscription for subscription in to_notify if subscription.pk not in notifications], fields)
+
+    def _create_notifications(self, subscriptions, fields):
+        """
+        Creates a notification for each subscription and makes it their last one.
+
+        :param subscriptions: the subscriptions
+        :param fields: the values of the fields of the notifications
+        :return: the ``(subscription, notification)``
+        :rtype: list
+        """
+        from zds.notification.models import Notification
+
+        if not subscriptions:
+            return []
+
+        notifications = [Notification(subscription=subscription, **fields) for subscription in subscriptions]
+        Notification.objects.bulk_create(notifications)
+
+        # ``bulk_create()`` does not set the primary keys with every database: the last notification of each
+        # subscription about the content is the one just created
+        last_notifications = dict(Notification.objects
+                                  .filter(subscription__in=[subscription.pk for subscription in subscriptions],
+                                          content_type=fields['content_type'], object_id=fields['object_id'])
+                                  .values_list('subscription').annotate(Max('pk')).order_by())
+        self._set_last_notifications(last_notifications)
+
+        for subscription, notification in zip(subscriptions, notifications):
+            notification.pk = last_notifications[subscription.pk]
+            subscription.last_notification = notification
+        return list(zip(subscriptions, notifications))
+
+    def _set_last_notifications(self, last_notifications):
+        """
+        :param last_notifications: the primary key of the last notification of each subscription (by primary key)
+        :type last_notifications: dict
+        """
+        from zds.notification.models import Subscription
+
+        if last_notifications:
+            Subscription.objects.filter(pk__in=last_notifications.keys()).update(last_notification=Case(
+                *[When(pk=subscription_pk, then=Value(notification_pk))
+                  for subscription_pk, notification_pk in last_notifications.items()],
+                output_field=models.IntegerField()))
+
     def get_subscriptions(self, content_object, is_active=True):
         """
         Gets subscriptions of the content object.
@@ -212,6 +366,18 @@ class NotificationManager(models.Manager):
     Custom notification manager.
     """
 
+    def mark_read(self, *args, **kwargs):
+        """
+        Marks as read, with a single query, the unread notifications matching the given lookup.
+
+        :return: the number of notifications marked as read.
+        :rtype: int
+        """
+        count = self.filter(*args, is_read=False, **kwargs).update(is_read=True)
+        if count:
+            notifications_updated()
+        return count
+
     def get_notifications_of(self, user):
         """
         Gets all notifications of a user.
@@ -276,3 +442,62 @@ class TopicFollowedManager(models.Manager):
             user = get_current_user()
 
         return self.filter(topic=topic, user=user).exists()
+
+
+class NotificationJobManager(models.Manager):
+    """
+    Queue of the notifications to send to the subscribers.
+    """
+
+    def notify_subscribers(self, subscription_model, subscribed_object, content, sender, send_email=True):
+        """
+        Notifies the subscribers to an object about a new content, now or through the queue, depending on the
+        ``ZDS_APP['notification']['fan_out_policy']`` setting.
+
+        :param subscription_model: the model of the subscriptions
+        :param subscribed_object: the object the subscriptions are about (a forum, a topic...)
+        :param content: the new content (a topic, an answer...)
+        :param sender: the user whose action triggered the notifications
+        :type sender: django.contrib.auth.models.User
+        :param send_email: whether an email must be sent for the subscriptions by email
+        :type send_email: bool
+        """
+        if settings.ZDS_APP['notification']['fan_out_policy'] == 'QUEUE':
+            self.create(subscription_model=subscription_model._meta.label, subscribed_object=subscribed_object,
+                        content_object=content, sender=sender, send_email=send_email)
+            return
+
+        from zds.notification.models import send_emails
+        to_email = subscription_model.objects.fan_out(subscribed_object, content, sender, send_email)
+        send_emails([subscription.build_email(notification) for subscription, notification in to_email])
+
+    def claim(self, limit):
+        """
+        Marks some jobs ready to run as running, so that no other worker takes them.
+
+        :param limit: maximum number of jobs to claim
+        :return: the claimed jobs
+        :rtype: list
+        """
+        claimed = []
+        now = datetime.datetime.now()
+        candidates = self.filter(state='QUEUED', next_attempt_date__lte=now).order_by('pk')[:limit]
+        for job in candidates:
+            # the update only succeeds if no other worker claimed it in the meantime
+            if self.filter(pk=job.pk, state='QUEUED').update(state='RUNNING', start_date=now) == 1:
+                job.state = 'RUNNING'
+                job.start_date = now
+                claimed.append(job)
+        return claimed
+
+    def requeue_stalled(self, stalled_after):
+        """
+        Queues again the jobs which have been running for too long, probably because their worker died.
+
+        :param stalled_after: number of seconds after which a running job is considered as stalled
+        :return: the number of jobs queued again
+        :rtype: int
+        """
+        limit = datetime.datetime.now() - datetime.timedelta(seconds=stalled_after)
+        return self.filter(state='RUNNING', start_date__lt=limit) \
+            .update(state='QUEUED', next_attempt_date=datetime.datetime.now())
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notification', '0014_pingsubscription'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationJob',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('subscription_model', models.CharField(max_length=80, verbose_name="Type d'abonnement")),
+                ('subscribed_id', models.PositiveIntegerField()),
+                ('object_id', models.PositiveIntegerField()),
+                ('send_email', models.BooleanField(default=True, verbose_name='Envoyer des courriels')),
+                ('state', models.CharField(default='QUEUED', max_length=10, verbose_name='État', db_index=True, choices=[('QUEUED', 'En attente'), ('RUNNING', 'En cours'), ('FAILURE', 'Échoué')])),
+                ('attempts', models.IntegerField(default=0, verbose_name='Nombre de tentatives')),
+                ('error', models.TextField(default='', verbose_name='Erreur', blank=True)),
+                ('creation_date', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('next_attempt_date', models.DateTimeField(default=datetime.datetime.now, verbose_name='Date de la prochaine tentative', db_index=True)),
+                ('start_date', models.DateTimeField(null=True, verbose_name='Date de début', blank=True)),
+                ('content_type', models.ForeignKey(related_name='+', to='contenttypes.ContentType')),
+                ('sender', models.ForeignKey(related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('subscribed_type', models.ForeignKey(related_name='+', to='contenttypes.ContentType')),
+            ],
+            options={
+                'verbose_name': 'Envoi de notifications',
+                'verbose_name_plural': 'Envois de notifications',
+            },
+        ),
+    ]
@@ -2,13 +2,17 @@
 from __future__ import unicode_literals
 from django.utils.encoding import python_2_unicode_compatible
 import logging
+import socket
+import time
+from datetime import datetime, timedelta
 from smtplib import SMTPException
 
+from django.apps import apps
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ObjectDoesNotExist
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.db import models, IntegrityError
 from django.template.loader import render_to_string
 from django.utils.translation import ugettext_lazy as _
@@ -17,7 +21,7 @@ from zds import settings
 from zds.forum.models import Topic
 from zds.member.models import Profile
 from zds.notification.managers import NotificationManager, SubscriptionManager, TopicFollowedManager, \
-    TopicAnswerSubscriptionManager, NewTopicSubscriptionManager
+    TopicAnswerSubscriptionManager, NewTopicSubscriptionManager, NotificationJobManager
 from zds.utils.misc import convert_camel_to_underscore
 
 
@@ -92,6 +96,14 @@ class Subscription(models.Model):
         """
         Sends an email notification
         """
+        send_emails([self.build_email(notification)])
+
+    def build_email(self, notification):
+        """
+        :param notification: the notification
+        :return: the email about this notification
+        :rtype: django.core.mail.EmailMultiAlternatives
+        """
 
         assert hasattr(self, 'module')
 
@@ -114,10 +126,7 @@ class Subscription(models.Model):
 
         msg = EmailMultiAlternatives(subject, message_txt, from_email, [receiver.email])
         msg.attach_alternative(message_html, 'text/html')
-        try:
-            msg.send()
-        except SMTPException:
-            pass
+        return msg
 
     @staticmethod
     def has_read_permission(request):
@@ -127,6 +136,38 @@ class Subscription(models.Model):
         return Subscription.has_read_permission(request) and self.user == request.user
 
 
+def send_emails(messages, rate=None):
+    """
+    Sends emails through a single connection to the mail server.
+
+    :param messages: the emails
+    :type messages: list[django.core.mail.EmailMessage]
+    :param rate: maximum number of emails sent per second, if any
+    """
+    if not messages:
+        return
+
+    connection = get_connection()
+    try:
+        connection.open()  # otherwise, each message opens (and closes) its own connection
+    except (SMTPException, socket.error):
+        LOG.exception('Could not connect to the mail server to send %s notification emails', len(messages))
+        return
+
+    try:
+        for message in messages:
+            start = time.time()
+            message.connection = connection
+            try:
+                message.send()
+            except SMTPException:
+                LOG.exception('Could not send the notification email to %s', message.to)
+            if rate:
+                time.sleep(max(0, 1. / rate - (time.time() - start)))
+    finally:
+        connection.close()
+
+
 class SingleNotificationMixin(object):
     """
     Mixin for the subscription that can only have one active notification at a time
@@ -394,6 +435,86 @@ class Notification(models.Model):
         return Notification.has_read_permission(request) and self.subscription.user == request.user
 
 
+NOTIFICATION_JOB_STATES = (
+    ('QUEUED', _(u'En attente')),
+    ('RUNNING', _(u'En cours')),
+    ('FAILURE', _(u'Échoué')),
+)
+
+
+@python_2_unicode_compatible
+class NotificationJob(models.Model):
+    """
+    Notification of the subscribers to an object (a forum, a topic...) about a new content (a topic, an answer...),
+    queued when the ``ZDS_APP['notification']['fan_out_policy']`` setting is ``'QUEUE'`` and run by the
+    ``notification_worker`` command. A job is deleted once done.
+    """
+    class Meta:
+        verbose_name = _(u'Envoi de notifications')
+        verbose_name_plural = _(u'Envois de notifications')
+
+    subscription_model = models.CharField(_(u'Type d\'abonnement'), max_length=80)
+    subscribed_type = models.ForeignKey(ContentType, related_name='+')
+    subscribed_id = models.PositiveIntegerField()
+    subscribed_object = GenericForeignKey('subscribed_type', 'subscribed_id')
+    content_type = models.ForeignKey(ContentType, related_name='+')
+    object_id = models.PositiveIntegerField()
+    content_object = GenericForeignKey('content_type', 'object_id')
+    sender = models.ForeignKey(User, related_name='+')
+    send_email = models.BooleanField(_(u'Envoyer des courriels'), default=True)
+
+    state = models.CharField(_(u'État'), max_length=10, choices=NOTIFICATION_JOB_STATES, default='QUEUED',
+                             db_index=True)
+    attempts = models.IntegerField(_(u'Nombre de tentatives'), default=0)
+    error = models.TextField(_(u'Erreur'), blank=True, default='')
+    creation_date = models.DateTimeField(_(u'Date de création'), auto_now_add=True)
+    next_attempt_date = models.DateTimeField(_(u'Date de la prochaine tentative'), default=datetime.now,
+                                             db_index=True)
+    start_date = models.DateTimeField(_(u'Date de début'), null=True, blank=True)
+
+    objects = NotificationJobManager()
+
+    def __str__(self):
+        return _('<Envoi des notifications {0} pour le {1} #{2}>')\
+            .format(self.subscription_model, self.content_type, self.object_id)
+
+    def run(self):
+        """
+        Notifies the subscribers.
+
+        :return: the ``(subscription, notification)`` to send by email
+        :rtype: list
+        """
+        content = self.content_object
+        subscribed_object = self.subscribed_object
+        if content is None or subscribed_object is None:  # deleted in the meantime
+            return []
+        subscription_model = apps.get_model(self.subscription_model)
+        return subscription_model.objects.fan_out(subscribed_object, content, self.sender, self.send_email)
+
+    def finish(self, error=''):
+        """
+        Records the result of an attempt: a successful job is deleted, a failed one is queued again (with an
+        exponential backoff) until it reaches the maximum number of attempts.
+
+        :param error: the error, if any
+        """
+        if not error:
+            self.delete()
+            return
+
+        queue_settings = settings.ZDS_APP['notification']['queue']
+        self.attempts += 1
+        self.error = error
+        if self.attempts < queue_settings['max_attempts']:
+            self.state = 'QUEUED'
+            self.next_attempt_date = datetime.now() + timedelta(
+                seconds=queue_settings['retry_delay'] * 2 ** (self.attempts - 1))
+        else:
+            self.state = 'FAILURE'
+        self.save()
+
+
 @python_2_unicode_compatible
 class TopicFollowed(models.Model):
     """
@@ -7,6 +7,7 @@ from django.db.backends.dummy.base import DatabaseError
 
 import zds
 
+from zds.utils import is_loading_fixtures
 from zds.utils.models import Tag
 
 try:
@@ -14,15 +15,15 @@ try:
 except ImportError:
     from django.utils.functional import wraps
 
-import inspect
+from django.db.models import Q
 from django.db.models.signals import post_save, m2m_changed, pre_delete
 from django.dispatch import receiver
-from zds.forum.models import Topic, Post
+from zds.forum.models import Forum, Topic, Post
 from zds.mp.models import PrivateTopic, PrivatePost
 from zds.notification.models import TopicAnswerSubscription, ContentReactionAnswerSubscription, \
     PrivateTopicAnswerSubscription, Subscription, Notification, NewTopicSubscription, NewPublicationSubscription, \
-    PingSubscription
-from zds.notification.signals import answer_unread, content_read, new_content, edit_content
+    PingSubscription, NotificationJob, send_emails
+from zds.notification.signals import answer_unread, content_read, contents_read, new_content, edit_content
 from zds.tutorialv2.models.models_database import PublishableContent, ContentReaction
 import zds.tutorialv2.signals
 
@@ -32,14 +33,14 @@ logger = logging.getLogger(__name__)
 def disable_for_loaddata(signal_handler):
     """
     Decorator
-    Avoid the signal to be treated when sent by fixtures
+    Avoid the signal to be treated when sent by fixtures: while ``loaddata``, ``load_fixtures`` or
+    ``load_factory_data`` runs (see ``zds.utils.loading_fixtures()``), or for a raw save.
     See https://code.djangoproject.com/ticket/8399#comment:7
     """
     @wraps(signal_handler)
     def wrapper(*args, **kwargs):
-        for fr in inspect.stack():
-            if inspect.getmodulename(fr[1]) == 'loaddata':
-                return
+        if kwargs.get('raw') or is_loading_fixtures():
+            return
         signal_handler(*args, **kwargs)
     return wrapper
 
@@ -72,30 +73,19 @@ def mark_topic_notifications_read(sender, **kwargs):
     """
     topic = kwargs.get('instance')
     user = kwargs.get('user')
+    topic_content_type = ContentType.objects.get_for_model(topic)
 
-    # Subscription to the topic
-    subscription = TopicAnswerSubscription.objects.get_existing(user, topic, is_active=True)
-    if subscription:
-        subscription.mark_notification_read()
-
-    # Subscription to the forum
-    subscription = NewTopicSubscription.objects.get_existing(user, topic.forum, is_active=True)
-    if subscription:
-        subscription.mark_notification_read(content=topic)
-
-    # Subscription to the tags
-    for tag in topic.tags.all():
-        subscription = NewTopicSubscription.objects.get_existing(user, tag, is_active=True)
-        if subscription:
-            subscription.mark_notification_read(content=topic)
+    # Subscription to the topic (its notification is about the last answer)
+    subscriptions = TopicAnswerSubscription.objects.filter(user=user, content_type__pk=topic_content_type.pk,
+                                                           object_id=topic.pk, is_active=True)
+    Notification.objects.mark_read(pk__in=subscriptions.values('last_notification'))
 
-    content_type = ContentType.objects.get_for_model(topic)
-    notifications = Notification.objects.filter(subscription__user=user, object_id=topic.pk,
-                                                content_type__pk=content_type.pk, is_read=False,
-                                                is_dead=True)
-    for notification in notifications:
-        notification.is_read = True
-        notification.save()
+    # Subscriptions to the forum and to the tags, and the dead notifications
+    subscriptions = NewTopicSubscription.objects.filter(user=user, is_active=True).filter(
+        Q(content_type__pk=ContentType.objects.get_for_model(Forum).pk, object_id=topic.forum_id) |
+        Q(content_type__pk=ContentType.objects.get_for_model(Tag).pk, object_id__in=topic.tags.values('pk')))
+    Notification.objects.mark_read(Q(subscription__in=subscriptions) | Q(is_dead=True), subscription__user=user,
+                                   object_id=topic.pk, content_type__pk=topic_content_type.pk)
 
 
 @receiver(content_read, sender=PublishableContent)
@@ -145,12 +135,25 @@ def mark_pm_reactions_read(sender, **kwargs):
 @receiver(content_read, sender=ContentReaction)
 @receiver(content_read, sender=Post)
 def mark_comment_read(sender, **kwargs):
-    comment = kwargs.get('instance')
-    user = kwargs.get('user')
+    mark_comments_read(sender, instances=[kwargs.get('instance')], user=kwargs.get('user'))
 
-    subscription = PingSubscription.objects.get_existing(user, comment, is_active=True)
-    if subscription:
-        subscription.mark_notification_read(comment)
+
+@receiver(contents_read, sender=ContentReaction)
+@receiver(contents_read, sender=Post)
+def mark_comments_read(sender, **kwargs):
+    """
+    :param kwargs:  contains
+        - instances: the comments marked as read (a page of them)
+        - user: the user reading the comments
+    Marks as read, at once, the notifications of the pings of the user in these comments.
+    """
+    comment_pks = [comment.pk for comment in kwargs.get('instances')]
+    content_type = ContentType.objects.get_for_model(sender)
+
+    subscriptions = PingSubscription.objects.filter(user=kwargs.get('user'), content_type__pk=content_type.pk,
+                                                    object_id__in=comment_pks, is_active=True)
+    Notification.objects.mark_read(subscription__in=subscriptions, content_type__pk=content_type.pk,
+                                   object_id__in=comment_pks)
 
 
 @receiver(edit_content, sender=Topic)
@@ -207,14 +210,14 @@ def edit_topic_event(sender, **kwargs):
                 notification.save()
 
         # Add notification of new topic for the subscription on the new tags
-        for tag in topic.tags.all():
-            subscriptions = NewTopicSubscription.objects.filter(
-                object_id=tag.id, content_type__pk=tag_content_type.pk, is_active=True)
-            for subscription in subscriptions:
-                notification = Notification.objects.filter(object_id=topic.id, subscription=subscription)
-                if not notification:
-                    if subscription.user != topic.author:
-                        subscription.send_notification(content=topic, sender=topic.author)
+        subscriptions = NewTopicSubscription.objects \
+            .filter(object_id__in=topic.tags.values('pk'), content_type__pk=tag_content_type.pk, is_active=True) \
+            .exclude(user=topic.author) \
+            .exclude(pk__in=Notification.objects
+                     .filter(object_id=topic.pk, content_type__pk=topic_content_type.pk).values('subscription')) \
+            .select_related('user')
+        to_email = NewTopicSubscription.objects.send_notifications(subscriptions, topic, topic.author)
+        send_emails([notified.build_email(notification) for notified, notification in to_email])
 
 
 @receiver(post_save, sender=Topic)
@@ -226,11 +229,7 @@ def new_topic_event(sender, **kwargs):
     """
     if kwargs.get('created', True):
         topic = kwargs.get('instance')
-
-        subscriptions = NewTopicSubscription.objects.get_subscriptions(topic.forum)
-        for subscription in subscriptions:
-            if subscription.user != topic.author:
-                subscription.send_notification(content=topic, sender=topic.author)
+        NotificationJob.objects.notify_subscribers(NewTopicSubscription, topic.forum, topic, topic.author)
 
 
 @receiver(post_save, sender=Post)
@@ -245,11 +244,7 @@ def answer_topic_event(sender, **kwargs):
     """
     if kwargs.get('created', True):
         post = kwargs.get('instance')
-
-        subscription_list = TopicAnswerSubscription.objects.get_subscriptions(post.topic)
-        for subscription in subscription_list:
-            if subscription.user != post.author:
-                subscription.send_notification(content=post, sender=post.author)
+        NotificationJob.objects.notify_subscribers(TopicAnswerSubscription, post.topic, post, post.author)
 
         # Follow topic on answering
         TopicAnswerSubscription.objects.get_or_create_active(post.author, post.topic)
@@ -269,10 +264,8 @@ def answer_content_reaction_event(sender, **kwargs):
         publishable_content = content_reaction.related_content
         author = content_reaction.author
 
-        subscription_list = ContentReactionAnswerSubscription.objects.get_subscriptions(publishable_content)
-        for subscription in subscription_list:
-            if subscription.user != author:
-                subscription.send_notification(content=content_reaction, sender=author)
+        NotificationJob.objects.notify_subscribers(
+            ContentReactionAnswerSubscription, publishable_content, content_reaction, author)
 
         # Follow publishable content on answering
         ContentReactionAnswerSubscription.objects.get_or_create_active(author, publishable_content)
@@ -299,11 +292,13 @@ def content_published_event(sender, **kwargs):
         # this allows to fix the "auto subscribe issue" but can deactivate a manually triggered subscription
         subscription.deactivate()
 
-        for subscription in NewPublicationSubscription.objects.get_subscriptions(user).exclude(user__in=authors):
-            # this condition is here to avoid exponential notifications when a user already follows one of the authors
-            # while they are also among the authors.
-            by_email = subscription.by_email and subscription.user.profile.email_for_answer
-            subscription.send_notification(content=content, sender=user, send_email=by_email)
+        # the authors are excluded to avoid exponential notifications when a user already follows one of the authors
+        # while they are also among the authors.
+        subscriptions = NewPublicationSubscription.objects.get_subscriptions(user) \
+            .exclude(user__in=authors).select_related('user__profile')
+        to_email = NewPublicationSubscription.objects.send_notifications(subscriptions, content, user)
+        send_emails([notified.build_email(notification) for notified, notification in to_email
+                     if notified.user.profile.email_for_answer])
 
 
 @receiver(new_content, sender=ContentReaction)
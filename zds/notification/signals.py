@@ -13,3 +13,6 @@ edit_content = Signal(providing_args=['instance', 'action'])
 
 # is sent when a content is read (topic, article or tutorial)
 content_read = Signal(providing_args=['instance', 'user', 'target'])
+
+# is sent when several contents of the same type are read at once (e.g. the messages of a page)
+contents_read = Signal(providing_args=['instances', 'user'])
@@ -4,8 +4,11 @@ from datetime import datetime, timedelta
 from django.contrib.auth.models import Group
 from django.contrib.contenttypes.models import ContentType
 from django.core import mail
+from django.core.management import call_command
 from django.core.urlresolvers import reverse
 from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils.six import StringIO
 from django.db import IntegrityError
 
 from zds import settings
@@ -16,12 +19,12 @@ from zds.member.factories import ProfileFactory, StaffProfileFactory, UserFactor
 from zds.mp.models import mark_read
 from zds.notification import signals
 from zds.notification.models import Notification, TopicAnswerSubscription, ContentReactionAnswerSubscription, \
-    PrivateTopicAnswerSubscription, NewTopicSubscription, NewPublicationSubscription
+    PrivateTopicAnswerSubscription, NewTopicSubscription, NewPublicationSubscription, PingSubscription, NotificationJob
 from zds.tutorialv2.factories import PublishableContentFactory, LicenceFactory, ContentReactionFactory, \
     SubCategoryFactory, PublishedContentFactory
 from zds.tutorialv2.models.models_database import ContentReaction, PublishableContent
 from zds.tutorialv2.publication_utils import publish_content
-from zds.utils import slugify
+from zds.utils import slugify, loading_fixtures
 from zds.utils.mps import send_mp, send_message_mp
 
 
@@ -461,6 +464,95 @@ class NotificationForumTest(TestCase):
 
         self.assertEqual(1, len(Notification.objects.filter(object_id=topic.pk, is_read=False, is_dead=True).all()))
 
+    def test_queued_answer_notifications(self):
+        """
+        With the 'QUEUE' policy, the followers of a topic are notified (and emailed) by the worker
+        """
+        topic = TopicFactory(forum=self.forum11, author=self.user1)
+        PostFactory(topic=topic, author=self.user1, position=1)
+        TopicAnswerSubscription.objects.toggle_follow(topic, self.user2, by_email=True)
+        self.user2.email = 'user2@example.com'
+        self.user2.save()
+
+        zds_app = copy.deepcopy(settings.ZDS_APP)
+        zds_app['notification']['fan_out_policy'] = 'QUEUE'
+        zds_app['notification']['queue']['email_rate'] = 0
+        with override_settings(ZDS_APP=zds_app):
+            post = PostFactory(topic=topic, author=self.user1, position=2)
+            subscription = TopicAnswerSubscription.objects.get_existing(self.user2, topic, is_active=True)
+            self.assertIsNone(subscription.last_notification)
+            self.assertEqual(1, NotificationJob.objects.count())
+
+            call_command('notification_worker', '--once', stdout=StringIO())
+
+        self.assertEqual(0, NotificationJob.objects.count())
+        subscription = TopicAnswerSubscription.objects.get_existing(self.user2, topic, is_active=True)
+        self.assertEqual(post, subscription.last_notification.content_object)
+        self.assertFalse(subscription.last_notification.is_read)
+        self.assertEqual(1, len(mail.outbox))
+        self.assertEqual(['user2@example.com'], mail.outbox[0].to)
+
+        # the unread notification is kept for the next answers, without any new email
+        PostFactory(topic=topic, author=self.user1, position=3)
+        self.assertEqual(1, Notification.objects.filter(subscription=subscription).count())
+        self.assertEqual(1, len(mail.outbox))
+
+    def test_notifications_of_many_subscriptions(self):
+        """
+        The notifications of all the followers of a forum are created at once, and are their last notification
+        """
+        followers = [ProfileFactory().user for _ in range(5)]
+        for user in followers:
+            NewTopicSubscription.objects.toggle_follow(self.forum11, user, by_email=user == followers[0])
+        subscriptions = list(NewTopicSubscription.objects.get_subscriptions(self.forum11).select_related('user'))
+        topic = TopicFactory(forum=self.forum11, author=self.user2)
+        ContentType.objects.get_for_model(topic)  # cached
+
+        # the notifications are created, then read back and set as the last ones of the subscriptions
+        with self.assertNumQueries(3):
+            to_email = NewTopicSubscription.objects.send_notifications(subscriptions, topic, self.user2)
+
+        self.assertEqual([followers[0]], [subscription.user for subscription, _ in to_email])
+        self.assertEqual(to_email[0][0].last_notification, to_email[0][1])
+        for subscription in NewTopicSubscription.objects.get_subscriptions(self.forum11):
+            self.assertEqual(topic, subscription.last_notification.content_object)
+            self.assertEqual(self.user2, subscription.last_notification.sender)
+            self.assertEqual(2, Notification.objects.filter(subscription=subscription).count())
+
+    def test_no_notification_while_loading_fixtures(self):
+        """
+        The receivers are disabled while fixtures are loaded
+        """
+        NewTopicSubscription.objects.toggle_follow(self.forum11, self.user2)
+        topic_type = ContentType.objects.get_for_model(Topic)
+
+        with loading_fixtures():
+            topic = TopicFactory(forum=self.forum11, author=self.user1)
+            PostFactory(topic=topic, author=self.user1, position=1)
+        self.assertEqual(0, Notification.objects.filter(object_id=topic.pk, content_type=topic_type).count())
+
+        topic = TopicFactory(forum=self.forum11, author=self.user1)
+        PostFactory(topic=topic, author=self.user1, position=1)
+        self.assertEqual(1, Notification.objects.filter(object_id=topic.pk, content_type=topic_type).count())
+
+    def test_mark_read_pings_of_a_page(self):
+        """
+        The pings in the messages of a page are marked as read at once
+        """
+        topic = TopicFactory(forum=self.forum11, author=self.user1)
+        posts = [PostFactory(topic=topic, author=self.user1, position=i) for i in range(1, 4)]
+        for post in posts[:2]:
+            for user in (self.user2, self.user1):
+                subscription = PingSubscription.objects.get_or_create_active(user, post)
+                subscription.send_notification(content=post, sender=post.author, send_email=False)
+        self.assertEqual(4, Notification.objects.filter(is_read=False).count())
+
+        with self.assertNumQueries(1):
+            signals.contents_read.send(sender=posts[0].__class__, instances=posts, user=self.user2)
+
+        self.assertEqual(0, Notification.objects.filter(subscription__user=self.user2, is_read=False).count())
+        self.assertEqual(2, Notification.objects.filter(subscription__user=self.user1, is_read=False).count())
+
 
 class NotificationPublishableContentTest(TestCase):
     def setUp(self):
@@ -0,0 +1,146 @@
+# coding: utf-8
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class SearchCache(object):
+    """Cache of the responses of Elasticsearch, shared by the processes through the Django cache.
+
+    Entries are keyed by a hash of everything that changes the response, and by a generation number which is bumped
+    (see ``invalidate()``) when the index is refreshed, so that new documents appear in the results.
+
+    Identical requests are coalesced: while a response is computed, the other threads of the process wait for it, and
+    the other processes (which see a lock in the Django cache) poll the cache for it, instead of querying the cluster.
+    """
+
+    key_prefix = 'search'
+    generation_key = 'search:generation'
+    wait_interval = .05  # seconds between two polls of a process waiting for a response
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    @property
+    def settings(self):
+        return settings.ZDS_APP['search']['results_cache']
+
+    def get_generation(self):
+        generation = cache.get(self.generation_key)
+        if generation is None:
+            # start from the current time, so that the entries of an evicted generation are never used again
+            cache.add(self.generation_key, int(time.time() * 1000), None)
+            generation = cache.get(self.generation_key) or 0
+        return generation
+
+    def invalidate(self):
+        """Hide every cached response."""
+        try:
+            cache.incr(self.generation_key)
+        except ValueError:  # the generation was evicted
+            cache.set(self.generation_key, int(time.time() * 1000), None)
+
+    def get_key(self, *parts):
+        """
+        :param parts: everything that changes the response (strings or numbers)
+        :return: the key of the entry
+        :rtype: str
+        """
+        digest = hashlib.sha1()
+        for part in parts:
+            if isinstance(part, unicode):
+                part = part.encode('utf-8')
+            digest.update(str(part))
+            digest.update('\0')
+        return '{}:{}:{}'.format(self.key_prefix, self.get_generation(), digest.hexdigest())
+
+    def get_or_execute(self, key, execute):
+        """Get a response from the cache, or compute it (once, even for concurrent requests) and cache it.
+
+        :param key: the key, from ``get_key()``
+        :param execute: function computing the response, it must return a picklable value which is not ``None``
+        :return: the response
+        """
+        if not self.settings['enabled']:
+            return execute()
+
+        value = cache.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        with self._locks_lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+
+        with lock:
+            try:
+                value = cache.get(key)  # computed by another thread while this one was waiting
+                if value is None:
+                    value = self._execute_once(key, execute)
+                else:
+                    self.hits += 1
+            finally:
+                with self._locks_lock:
+                    self._locks.pop(key, None)
+
+        return value
+
+    def _execute_once(self, key, execute):
+        lock_key = key + ':lock'
+        lock_timeout = self.settings['lock_timeout']
+
+        if not cache.add(lock_key, 1, lock_timeout):
+            # another process is computing the response
+            deadline = time.time() + lock_timeout
+            while time.time() < deadline:
+                time.sleep(self.wait_interval)
+                value = cache.get(key)
+                if value is not None:
+                    self.hits += 1
+                    return value
+                if cache.get(lock_key) is None:  # it failed
+                    break
+
+        self.misses += 1
+        try:
+            value = execute()
+            cache.set(key, value, self.settings['timeout'])
+        finally:
+            cache.delete(lock_key)
+        return value
+
+
+search_cache = SearchCache()
+
+
+class CachedSearch(object):
+    """Wrap an ``elasticsearch_dsl.Search`` given to a paginator, so that the number of results and the pages are read
+    from ``search_cache``.
+    """
+
+    def __init__(self, search, *key_parts):
+        """
+        :param search: the search
+        :type search: elasticsearch_dsl.Search
+        :param key_parts: everything that changes the results of the search (the query, the filters...)
+        """
+        self.search = search
+        self.key_parts = key_parts
+
+    def count(self):
+        return search_cache.get_or_execute(search_cache.get_key('count', *self.key_parts), self.search.count)
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            raise TypeError('only slices are supported')
+
+        page = self.search[item]
+        raw_response = search_cache.get_or_execute(
+            search_cache.get_key('page', item.start, item.stop, *self.key_parts), lambda: page.execute().to_dict())
+        return page._response_class(page, raw_response)
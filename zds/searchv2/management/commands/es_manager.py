@@ -1,12 +1,98 @@
 # coding: utf-8
+import os
+import time
+from collections import defaultdict
+from multiprocessing import Pool
 
+from django.apps import apps
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
+from django.db import connections
+from django.db.models import Max, Min
 
-from zds.searchv2.models import ESIndexManager, get_django_indexable_objects
+from elasticsearch import ConnectionError
+
+from zds.searchv2 import setup_es_connections
+from zds.searchv2.models import ESIndexChange, ESIndexManager, NeedIndex, get_django_indexable_objects, \
+    get_index_manager
 from zds.tutorialv2.models.models_database import FakeChapter
 
 
+def get_pk_ranges(model, range_size):
+    """Split the objects of a model into ranges of primary keys, to be indexed separately.
+
+    :param model: the model
+    :type model: class
+    :param range_size: number of primary keys in a range
+    :type range_size: int
+    :return: the ``(start, end)`` ranges, ``end`` excluded
+    :rtype: list
+    """
+
+    bounds = model.get_es_django_indexable(force_reindexing=True).aggregate(Min('pk'), Max('pk'))
+    if bounds['pk__min'] is None:
+        return []
+    return [(start, min(start + range_size, bounds['pk__max'] + 1))
+            for start in range(bounds['pk__min'], bounds['pk__max'] + 1, range_size)]
+
+
+def read_checkpoint(checkpoint_path):
+    """Read the checkpoint of an interrupted ``index_all``. Its first line is the name of the version of the index
+    being filled and the last entry of the change log when the indexing started, the following ones are the ranges
+    already indexed.
+
+    :param checkpoint_path: path of the checkpoint file
+    :return: ``(index_name, last_change, done)``, ``(None, None, set())`` if there is no checkpoint
+    :rtype: tuple
+    """
+
+    if not checkpoint_path or not os.path.isfile(checkpoint_path):
+        return None, None, set()
+
+    with open(checkpoint_path) as checkpoint_file:
+        lines = [line.split() for line in checkpoint_file if line.strip()]
+    if not lines:
+        return None, None, set()
+
+    index_name, last_change = lines[0]
+    done = set((model_label, int(start), int(end)) for model_label, start, end in lines[1:])
+    return index_name, int(last_change) if last_change != '-' else None, done
+
+
+def init_worker():
+    # the connections to Elasticsearch cannot be shared with the parent process (the ones to the database are closed
+    # before the fork, and opened again when needed)
+    setup_es_connections()
+
+
+_worker_index_managers = {}
+
+
+def index_pk_range(task):
+    """Index a range of objects in a worker process.
+
+    :param task: ``(index_name, model_label, start, end)``, the range is ``None`` for ``PublishedContent``, which is
+        indexed at once
+    :return: ``(model_label, start, end, indexed_counter, duration, pid)``
+    :rtype: tuple
+    """
+
+    index_name, model_label, start, end = task
+    if index_name not in _worker_index_managers:
+        _worker_index_managers[index_name] = ESIndexManager(
+            index_name, connection_alias=settings.ES_SEARCH_INDEX.get('connection_alias', 'default'))
+    index_manager = _worker_index_managers[index_name]
+
+    then = time.time()
+    model = apps.get_model(model_label)
+    pk_range = (start, end) if start is not None else None
+    indexed_counter = index_manager.es_bulk_indexing_of_model(model, force_reindexing=True, pk_range=pk_range)
+    if indexed_counter is None:
+        raise CommandError('Unable to connect to Elasticsearch from worker {}, aborting.'.format(os.getpid()))
+
+    return model_label, start, end, indexed_counter, time.time() - then, os.getpid()
+
+
 class Command(BaseCommand):
     help = 'Index data in ES and manage them'
 
@@ -28,7 +114,15 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument(
-            'action', type=str, help='action to perform', choices=['setup', 'clear', 'index_all', 'index_flagged'])
+            'action', type=str, help='action to perform',
+            choices=['setup', 'clear', 'index_all', 'index_flagged', 'follow'])
+        parser.add_argument('--workers', type=int, default=1, dest='workers',
+                            help='index_all: number of processes building the documents')
+        parser.add_argument('--range-size', type=int, default=5000, dest='range_size',
+                            help='index_all: number of primary keys handled by a worker at once')
+        parser.add_argument('--checkpoint', type=str, default=None, dest='checkpoint',
+                            help='index_all: file recording the ranges already indexed, so that an interrupted run can '
+                                 'be resumed by running the same command again')
 
     def handle(self, *args, **options):
 
@@ -37,17 +131,20 @@ class Command(BaseCommand):
         elif options['action'] == 'clear':
             self.clear_es()
         elif options['action'] == 'index_all':
-            self.index_documents(force_reindexing=True)
+            if options['workers'] > 1 or options['checkpoint']:
+                self.index_documents_in_parallel(options['workers'], options['range_size'], options['checkpoint'])
+            else:
+                self.index_documents(force_reindexing=True)
         elif options['action'] == 'index_flagged':
             self.index_documents(force_reindexing=False)
+        elif options['action'] == 'follow':
+            self.follow()
         else:
             raise CommandError('unknown action {}'.format(options['action']))
 
     def setup_es(self):
 
         self.index_manager.reset_es_index(self.models)
-        self.index_manager.setup_custom_analyzer()
-
         self.index_manager.refresh_index()
 
     def clear_es(self):
@@ -56,20 +153,193 @@ class Command(BaseCommand):
         for model in self.models:
             self.index_manager.clear_indexing_of_model(model)
 
+    def create_index_version(self):
+        """Create a new version of the index, to fill it.
+
+        :return: the manager of the new version, and the last entry of the change log when it was created (the objects
+            modified after it may be indexed in their previous state)
+        :rtype: tuple
+        """
+
+        # the entries of the change log are kept by ``follow`` from now on
+        index_manager = self.index_manager.create_index_version(self.models)
+        last_change = ESIndexChange.objects.order_by('-pk').values_list('pk', flat=True).first()
+        return index_manager, last_change
+
+    def switch_to_index_version(self, index_manager, last_change):
+        """Apply the changes logged while a new version of the index was filled, then make the alias target it.
+
+        :param index_manager: the manager of the new version
+        :type index_manager: zds.searchv2.models.ESIndexManager
+        :param last_change: the last entry of the change log when the version was created
+        :type last_change: int
+        """
+
+        batch_size = settings.ZDS_APP['search']['change_log']['batch_size']
+        caught_up = 0
+        while True:
+            applied, after = index_manager.process_change_log(batch_size, after=last_change, consume=False)
+            caught_up += applied
+            last_change = after
+            if applied < batch_size:
+                break
+        print('- {} changes made during the indexing applied'.format(caught_up))
+
+        # the changes logged from now on are applied to the new version by ``follow`` (or ``index_flagged``), which
+        # consumes the log again once the switch is done
+        self.index_manager.switch_to_index_version(index_manager)
+        print('- {} now uses {}'.format(self.index_manager.index, index_manager.index))
+
+        if last_change is not None:
+            ESIndexChange.objects.filter(pk__lte=last_change).delete()
+
     def index_documents(self, force_reindexing=False):
 
+        index_manager = self.index_manager
+        if force_reindexing:
+            # fill a new version of the index, the current one is used by the site until the switch
+            index_manager, last_change = self.create_index_version()
+            print('- building {}'.format(index_manager.index))
+        else:
+            # apply the change log first, the objects it contains are then no longer flagged
+            batch_size = settings.ZDS_APP['search']['change_log']['batch_size']
+            after = None
+            while True:
+                applied, after = self.index_manager.process_change_log(batch_size, after=after)
+                if applied < batch_size:
+                    break
+
+        try:
+            for model in self.models:
+                if model is FakeChapter:
+                    continue
+
+                if force_reindexing:
+                    print('- indexing {}s'.format(model.get_es_document_type()))
+
+                indexed_counter = index_manager.es_bulk_indexing_of_model(model, force_reindexing=force_reindexing)
+                if force_reindexing:
+                    print('  {}\titems indexed'.format(indexed_counter))
+        except BaseException:  # including KeyboardInterrupt
+            if force_reindexing:
+                # otherwise, ``follow`` would keep the change log for it
+                self.index_manager.es.indices.delete(index_manager.index)
+                print('- indexing interrupted, {} deleted'.format(index_manager.index))
+            raise
+
         if force_reindexing:
-            self.setup_es()  # remove all previous data
+            self.switch_to_index_version(index_manager, last_change)
+        else:
+            self.index_manager.refresh_index()
+
+    def index_documents_in_parallel(self, workers, range_size, checkpoint_path=None):
+        """Index all the documents in a new version of the index, like ``index_documents(force_reindexing=True)``, but
+        with a pool of processes: the objects are split in ranges of primary keys, and the documents of each range are
+        built by a worker and sent with ``parallel_bulk``.
+
+        :param workers: number of processes
+        :type workers: int
+        :param range_size: number of primary keys in a range
+        :type range_size: int
+        :param checkpoint_path: file recording the progress, to resume an interrupted run
+        :type checkpoint_path: str
+        """
 
+        index_name, last_change, done = read_checkpoint(checkpoint_path)
+        if index_name is not None and self.index_manager.es.indices.exists(index_name):
+            print('- resuming {} ({} ranges already indexed)'.format(index_name, len(done)))
+            index_manager = ESIndexManager(index_name, self.index_manager.number_of_shards,
+                                           self.index_manager.number_of_replicas, self.index_manager.connection_alias)
+        else:
+            index_manager, last_change = self.create_index_version()
+            done = set()
+            if checkpoint_path:
+                with open(checkpoint_path, 'w') as checkpoint_file:
+                    checkpoint_file.write('{} {}\n'.format(index_manager.index, last_change or '-'))
+            print('- building {}'.format(index_manager.index))
+
+        tasks = []
         for model in self.models:
             if model is FakeChapter:
                 continue
+            model_label = model._meta.label
+            if model.__name__ == 'PublishedContent':
+                # the chapters are generated along with their content, it is indexed by a single worker
+                ranges = [(None, None)]
+            else:
+                ranges = get_pk_ranges(model, range_size)
+            tasks.extend((index_manager.index, model_label, start, end) for start, end in ranges
+                         if (model_label, start or 0, end or 0) not in done)
 
-            if force_reindexing:
-                print('- indexing {}s'.format(model.get_es_document_type()))
+        print('- indexing {} ranges with {} workers'.format(len(tasks), workers))
 
-            indexed_counter = self.index_manager.es_bulk_indexing_of_model(model, force_reindexing=force_reindexing)
-            if force_reindexing:
-                print('  {}\titems indexed'.format(indexed_counter))
+        per_model = defaultdict(lambda: [0, 0.])
+        per_worker = defaultdict(lambda: [0, 0.])
+        then = time.time()
 
-        self.index_manager.refresh_index()
+        # the forked processes must not share the connections to the database
+        connections.close_all()
+        pool = Pool(workers, initializer=init_worker)
+        try:
+            for model_label, start, end, indexed_counter, duration, pid in pool.imap_unordered(index_pk_range, tasks):
+                print('  {} [{}, {}[: {} items in {:.1f}s ({:.2f} obj/s, worker {})'.format(
+                    model_label, start, end, indexed_counter, duration, indexed_counter / (duration or 1), pid))
+                for stats, key in ((per_model, model_label), (per_worker, pid)):
+                    stats[key][0] += indexed_counter
+                    stats[key][1] += duration
+                if checkpoint_path:
+                    with open(checkpoint_path, 'a') as checkpoint_file:
+                        checkpoint_file.write('{} {} {}\n'.format(model_label, start or 0, end or 0))
+        except BaseException:  # including KeyboardInterrupt
+            pool.terminate()
+            if checkpoint_path:
+                print('- indexing interrupted, run the same command again to resume it')
+            else:
+                # otherwise, ``follow`` would keep the change log for it
+                self.index_manager.es.indices.delete(index_manager.index)
+                print('- indexing interrupted, {} deleted'.format(index_manager.index))
+            raise
+        else:
+            pool.close()
+        finally:
+            pool.join()
+
+        for title, stats in (('model', per_model), ('worker', per_worker)):
+            for key, (indexed_counter, duration) in sorted(stats.items()):
+                print('  {} {}:\t{} items indexed ({:.2f} obj/s)'.format(
+                    title, key, indexed_counter, indexed_counter / (duration or 1)))
+        total = sum(indexed_counter for indexed_counter, _ in per_model.values())
+        print('  total:\t{} items indexed in {:.1f}s'.format(total, time.time() - then))
+
+        self.switch_to_index_version(index_manager, last_change)
+        if checkpoint_path and os.path.isfile(checkpoint_path):
+            os.remove(checkpoint_path)
+
+    def follow(self):
+        """Consume the change log of the search index (see ``ESIndexChange``) until the process is stopped, so that the
+        changes are searchable within seconds.
+
+        While ``index_all`` fills a new version of the index, the changes are applied to the current one but kept in
+        the log, so that ``index_all`` applies them to the new version before the switch. Once the switch is done,
+        the log is read from its beginning again: the entries left are applied to the new version and removed.
+        """
+
+        change_log = settings.ZDS_APP['search']['change_log']
+        index_manager = get_index_manager()  # checks the state of the cluster periodically
+
+        self.stdout.write('Following the change log of {}'.format(index_manager.index))
+        after = None
+        while True:
+            try:
+                applied, after = index_manager.process_change_log(change_log['batch_size'], after=after)
+            except (ConnectionError, NeedIndex) as e:
+                self.stderr.write('Unable to apply the change log: {}'.format(e))
+                index_manager.report_failure()
+                applied = 0
+            else:
+                index_manager.report_success()
+
+            if applied:
+                self.stdout.write('{} changes applied'.format(applied))
+            if applied < change_log['batch_size']:
+                time.sleep(change_log['poll_interval'])
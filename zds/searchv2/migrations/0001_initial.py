@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ESIndexChange',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('model_label', models.CharField(max_length=100, verbose_name='Mod\xe8le')),
+                ('object_pk', models.PositiveIntegerField(verbose_name="Identifiant de l'objet")),
+                ('operation', models.CharField(default='index', max_length=10, verbose_name='Op\xe9ration',
+                                               choices=[('index', 'Indexation'), ('delete', 'Suppression')])),
+                ('pubdate', models.DateTimeField(auto_now_add=True, verbose_name='Date de la modification')),
+            ],
+            options={
+                'verbose_name': 'Modification \xe0 indexer',
+                'verbose_name_plural': 'Modifications \xe0 indexer',
+            },
+        ),
+    ]
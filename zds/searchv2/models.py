@@ -1,6 +1,8 @@
 # coding: utf-8
+from collections import OrderedDict, defaultdict
 from functools import partial
 import logging
+import threading
 import time
 
 from django.apps import apps
@@ -15,6 +17,8 @@ from elasticsearch_dsl.connections import connections
 
 from django.db import transaction
 
+from zds.searchv2.cache import search_cache
+
 
 def es_document_mapper(force_reindexing, index, obj):
     action = 'update' if obj.es_already_indexed and not force_reindexing else 'index'
@@ -222,20 +226,72 @@ class AbstractESDjangoIndexable(AbstractESIndexable, models.Model):
 
         self.es_flagged = kwargs.pop('es_flagged', True)
 
-        return super(AbstractESDjangoIndexable, self).save(*args, **kwargs)
+        with transaction.atomic():
+            result = super(AbstractESDjangoIndexable, self).save(*args, **kwargs)
+
+            if self.es_flagged:
+                log_index_changes(self.__class__, [self.pk])
+
+        return result
+
+
+class ESIndexChange(models.Model):
+    """Entry of the change log of the search index: an object which has to be indexed again (or removed from the
+    index). The log is written in the same transaction as the object, and consumed by ``es_manager follow``.
+    """
+
+    class Meta:
+        verbose_name = 'Modification à indexer'
+        verbose_name_plural = 'Modifications à indexer'
+
+    OPERATIONS = (
+        ('index', 'Indexation'),
+        ('delete', 'Suppression'),
+    )
+
+    model_label = models.CharField('Modèle', max_length=100)
+    object_pk = models.PositiveIntegerField('Identifiant de l\'objet')
+    operation = models.CharField('Opération', max_length=10, choices=OPERATIONS, default='index')
+    pubdate = models.DateTimeField('Date de la modification', auto_now_add=True)
+
+
+def log_index_changes(model, pks, operation='index'):
+    """Add some objects to the change log of the search index, if it is enabled
+    (see ``ZDS_APP['search']['change_log']``).
+
+    :param model: the model of the objects
+    :type model: class
+    :param pks: primary keys of the objects
+    :type pks: list
+    :param operation: ``'index'`` or ``'delete'``
+    :type operation: str
+    """
+
+    if not settings.ZDS_APP['search']['change_log']['enabled']:
+        return
+
+    ESIndexChange.objects.bulk_create(
+        [ESIndexChange(model_label=model._meta.label, object_pk=pk, operation=operation) for pk in pks])
 
 
 def delete_document_in_elasticsearch(instance):
     """Delete a ESDjangoIndexable from ES database.
     Must be implemented by all classes that derive from AbstractESDjangoIndexable.
 
+    The deletion is also written in the change log, so that it is done by ``es_manager follow`` if the cluster is not
+    available right now. This function is called by ``pre_delete`` receivers, so that the entry is written in the
+    transaction of the deletion.
+
     :param instance: the document to delete
     :type instance: AbstractESIndexable
     """
 
-    index_manager = ESIndexManager(**settings.ES_SEARCH_INDEX)
+    with transaction.atomic():
+        log_index_changes(instance.__class__, [instance.pk], 'delete')
 
-    if index_manager.index_exists:
+    index_manager = get_index_manager()
+
+    if index_manager.connected_to_es and index_manager.index_exists:
         index_manager.delete_document(instance)
         index_manager.refresh_index()
 
@@ -251,9 +307,19 @@ class NeedIndex(Exception):
 
 
 class ESIndexManager(object):
-    """Manage a given index with different taylor-made functions"""
+    """Manage a given index with different taylor-made functions
+
+    The state of the cluster (is it reachable? does the index exist?) is checked when the manager is created. If
+    ``health_check_interval`` is set, this state is then checked again once it is older than this number of seconds,
+    so that a long-lived manager (see ``get_index_manager()``) follows the changes of the cluster.
+
+    The manager also acts as a circuit breaker: after ``failure_threshold`` failed requests (reported with
+    ``report_failure()``) or a failed health check, ``connected_to_es`` is ``False`` during ``cooldown`` seconds, so
+    that the callers do not wait for an unhealthy cluster. The cluster is then checked again.
+    """
 
-    def __init__(self, name, shards=5, replicas=0, connection_alias='default'):
+    def __init__(self, name, shards=5, replicas=0, connection_alias='default', health_check_interval=None,
+                 health_check_timeout=None, failure_threshold=3, cooldown=30):
         """Create a manager for a given index
 
         :param name: the index name
@@ -264,47 +330,165 @@ class ESIndexManager(object):
         :type replicas: int
         :param connection_alias: the alias for connection
         :type connection_alias: str
+        :param health_check_interval: number of seconds after which the state of the cluster is checked again,
+            ``None`` to only check it once
+        :type health_check_interval: int
+        :param health_check_timeout: timeout of the requests of the health checks, in seconds
+        :type health_check_timeout: float
+        :param failure_threshold: number of consecutive failures which open the circuit
+        :type failure_threshold: int
+        :param cooldown: number of seconds during which the cluster is not used once the circuit is open
+        :type cooldown: int
         """
 
         self.index = name
-        self.index_exists = False
+        self._index_exists = False
 
         self.number_of_shards = shards
         self.number_of_replicas = replicas
 
         self.logger = logging.getLogger('ESIndexManager:{}'.format(self.index))
 
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.last_health_check = None
+        self.circuit_opened_at = None
+
+        self.connection_alias = connection_alias
         self.es = None
-        self.connected_to_es = False
+        self._connected_to_es = False
 
         if settings.ES_ENABLED:
             self.es = connections.get_connection(alias=connection_alias)
-            self.connected_to_es = True
+            self.check_health()
+
+    def check_health(self):
+        """Test the connection to the cluster and the existence of the index.
+        """
+
+        request_options = {}
+        if self.health_check_timeout:
+            request_options['request_timeout'] = self.health_check_timeout
+
+        try:
+            self.es.info(**request_options)
+            self._index_exists = self.es.indices.exists(self.index, **request_options)
+        except ConnectionError:
+            self._connected_to_es = False
+            self.open_circuit()
+            self.logger.warn('failed to connect to ES cluster')
+        else:
+            self._connected_to_es = True
+            self.failures = 0
+            self.circuit_opened_at = None
+            self.logger.info('connected to ES cluster')
+
+        self.last_health_check = time.time()
+
+    def health_check_needed(self):
+        if self.es is None:
+            return False
+        if self.last_health_check is None:
+            return True
+        if self.circuit_opened_at is not None:
+            return time.time() - self.circuit_opened_at >= self.cooldown
+        if self.health_check_interval is not None:
+            return time.time() - self.last_health_check >= self.health_check_interval
+        return False
+
+    def open_circuit(self):
+        self.circuit_opened_at = time.time()
+        self._connected_to_es = False
+        self.logger.warn('ES cluster considered as unavailable for {}s'.format(self.cooldown))
+
+    def report_failure(self):
+        """To be called when a request to the cluster failed (timeout, connection refused...).
+        """
+
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.open_circuit()
+
+    def report_success(self):
+        self.failures = 0
+
+    def invalidate(self):
+        """Check the state of the cluster again before the next use of the manager.
+        """
+
+        self.last_health_check = None
+
+    @property
+    def connected_to_es(self):
+        if self.health_check_needed():
+            self.check_health()
+        return self._connected_to_es
+
+    @connected_to_es.setter
+    def connected_to_es(self, value):
+        self._connected_to_es = value
+
+    @property
+    def index_exists(self):
+        if self.health_check_needed():
+            self.check_health()
+        return self._index_exists
 
-            # test connection:
+    @index_exists.setter
+    def index_exists(self, value):
+        self._index_exists = value
+
+    def get_index_versions(self):
+        """The documents are stored in versioned indexes (``<name>_v<N>``), and ``<name>`` is an alias to one of them.
+
+        :return: the existing versions, sorted
+        :rtype: list
+        """
+
+        prefix = '{}_v'.format(self.index)
+        versions = []
+        for name in self.es.indices.get(index=prefix + '*'):
             try:
-                self.es.info()
-            except ConnectionError:
-                self.connected_to_es = False
-                self.logger.warn('failed to connect to ES cluster')
-            else:
-                self.logger.info('connected to ES cluster')
+                versions.append(int(name[len(prefix):]))
+            except ValueError:
+                pass
+        return sorted(versions)
 
-            if self.connected_to_es:
-                self.index_exists = self.es.indices.exists(self.index)
+    def get_building_versions(self):
+        """The versions of the index which are being filled by ``es_manager index_all``, and are not targeted by the
+        alias yet.
+
+        :return: the names of these versions
+        :rtype: list
+        """
+
+        names = ['{}_v{}'.format(self.index, version) for version in self.get_index_versions()]
+        if self.es.indices.exists_alias(name=self.index):
+            targeted = self.es.indices.get_alias(name=self.index)
+            names = [name for name in names if name not in targeted]
+        return names
 
     def clear_es_index(self):
-        """Clear index
+        """Clear index (and all its versions)
         """
 
         if not self.connected_to_es:
             return
 
-        if self.es.indices.exists(self.index):
-            self.es.indices.delete(self.index)
+        names = ['{}_v{}'.format(self.index, version) for version in self.get_index_versions()]
+        if self.es.indices.exists(self.index) and not self.es.indices.exists_alias(name=self.index):
+            names.append(self.index)  # an index created before the versioning, or a version itself
+
+        if names:
+            for name in names:
+                self.es.indices.delete(name)
             self.logger.info('index cleared')
 
             self.index_exists = False
+            invalidate_index_managers()
 
     def reset_es_index(self, models):
         """Delete old index and create an new one (with the same name). Setup the number of shards and replicas.
@@ -312,16 +496,32 @@ class ESIndexManager(object):
 
         :param models: list of models
         :type models: list
-        :param number_shards: number of shards
-        :type number_shards: int
-        :param number_replicas: number of replicas
-        :type number_replicas: int
         """
 
         if not self.connected_to_es:
             return
 
-        self.clear_es_index()
+        self.switch_to_index_version(self.create_index_version(models, bulk_load=False))
+
+    def create_index_version(self, models, bulk_load=True):
+        """Create a new version of the index, with the mappings of the models and the custom analyzer. The alias still
+        targets the previous version, which keeps being used, until ``switch_to_index_version()`` is called.
+
+        .. attention::
+            The objects modified while the new version is filled may be indexed in their previous state. Before the
+            switch, the changes logged since its creation must be applied to it with ``process_change_log()``.
+
+        :param models: list of models
+        :type models: list
+        :param bulk_load: if ``True``, the index is created without replicas nor periodic refresh, to speed up its
+            filling (the settings are restored by ``switch_to_index_version()``)
+        :type bulk_load: bool
+        :return: a manager of the new version, to fill it
+        :rtype: ESIndexManager
+        """
+
+        versions = self.get_index_versions()
+        name = '{}_v{}'.format(self.index, versions[-1] + 1 if versions else 1)
 
         mappings_def = {}
 
@@ -329,27 +529,59 @@ class ESIndexManager(object):
             mapping = model.get_es_mapping()
             mappings_def.update(mapping.to_dict())
 
-        self.es.indices.create(
-            self.index,
-            body={
-                'settings': {
-                    'number_of_shards': self.number_of_shards,
-                    'number_of_replicas': self.number_of_replicas
-                },
-                'mappings': mappings_def
-            }
-        )
+        index_settings = {
+            'number_of_shards': self.number_of_shards,
+            'number_of_replicas': self.number_of_replicas,
+            'analysis': self.get_custom_analysis()
+        }
+        if bulk_load:
+            index_settings.update(number_of_replicas=0, refresh_interval='-1')
 
-        self.index_exists = True
+        self.es.indices.create(name, body={'settings': index_settings, 'mappings': mappings_def})
+        self.logger.info('index {} created'.format(name))
 
-        self.logger.info('index created')
+        return ESIndexManager(name, self.number_of_shards, self.number_of_replicas, self.connection_alias)
 
-    def setup_custom_analyzer(self):
-        """Override the default analyzer.
+    def switch_to_index_version(self, index_manager):
+        """Make the alias target a new version of the index (atomically), then delete the other versions.
 
-        See https://www.elastic.co/guide/en/elasticsearch/reference/current/analysis.html.
+        :param index_manager: the manager returned by ``create_index_version()``
+        :type index_manager: ESIndexManager
+        """
+
+        name = index_manager.index
+
+        # restore the settings changed for the bulk load, and wait for the replicas
+        self.es.indices.put_settings(
+            index=name,
+            body={'index': {'number_of_replicas': self.number_of_replicas, 'refresh_interval': '1s'}})
+        self.es.indices.refresh(name)
+        self.es.cluster.health(index=name, wait_for_status='yellow')
+
+        actions = [{'add': {'index': name, 'alias': self.index}}]
+        if self.es.indices.exists_alias(name=self.index):
+            for previous in self.es.indices.get_alias(name=self.index):
+                if previous != name:
+                    actions.append({'remove': {'index': previous, 'alias': self.index}})
+        elif self.es.indices.exists(self.index):
+            # an index created before the versioning: it has to be removed to free the name (only happens once)
+            self.es.indices.delete(self.index)
 
-        Our custom analyzer is based on the "french" analyzer
+        self.es.indices.update_aliases(body={'actions': actions})
+        self.logger.info('{} now targets {}'.format(self.index, name))
+
+        self.index_exists = True
+        invalidate_index_managers()
+        search_cache.invalidate()
+
+        for version in self.get_index_versions():
+            previous = '{}_v{}'.format(self.index, version)
+            if previous != name:
+                self.es.indices.delete(previous)
+                self.logger.info('index {} deleted'.format(previous))
+
+    def get_custom_analysis(self):
+        """Our custom analyzer is based on the "french" analyzer
         (https://www.elastic.co/guide/en/elasticsearch/reference/current/analysis-lang-analyzer.html#french-analyzer)
         but with some difference
 
@@ -358,6 +590,69 @@ class ESIndexManager(object):
         - "protect_c_language", a pattern replace filter to prevent "c" from being wiped out by the stopper.
         - "french_keywords", a keyword stopper prevent some programming language from being stemmed.
 
+        :return: the ``analysis`` settings of the index
+        :rtype: dict
+        """
+
+        return {
+            'filter': {
+                'french_elision': {
+                    'type': 'elision',
+                    'articles_case': True,
+                    'articles': [
+                        'l', 'm', 't', 'qu', 'n', 's',
+                        'j', 'd', 'c', 'jusqu', 'quoiqu',
+                        'lorsqu', 'puisqu'
+                    ]
+                },
+                'protect_c_language': {
+                    'type': 'pattern_replace',
+                    'pattern': '^c$',
+                    'replacement': 'langage_c'
+                },
+                'french_stop': {
+                    'type': 'stop',
+                    'stopwords': '_french_'
+                },
+                'french_keywords': {
+                    'type': 'keyword_marker',
+                    'keywords': settings.ZDS_APP['search']['mark_keywords']
+                },
+                'french_stemmer': {
+                    'type': 'stemmer',
+                    'language': 'light_french'
+                }
+            },
+            'tokenizer': {
+                'custom_tokenizer': {
+                    'type': 'pattern',
+                    'pattern': u'[ .,!?%\u2026\u00AB\u00A0\u00BB\u202F\uFEFF\u2013\u2014\n]'
+                }
+            },
+            'analyzer': {
+                'default': {
+                    'tokenizer': 'custom_tokenizer',
+                    'filter': [
+                        'lowercase',
+                        'protect_c_language',
+                        'french_elision',
+                        'french_stop',
+                        'french_keywords',
+                        'french_stemmer'
+                    ],
+                    'char_filter': [
+                        'html_strip',
+                    ]
+                }
+            }
+        }
+
+    def setup_custom_analyzer(self):
+        """Override the default analyzer (see ``get_custom_analysis()``) of an existing index. The versions created by
+        ``create_index_version()`` already use it.
+
+        See https://www.elastic.co/guide/en/elasticsearch/reference/current/analysis.html.
+
         .. warning::
 
             You need to run ``manage.py es_manager index_all`` if you modified this !!
@@ -370,63 +665,7 @@ class ESIndexManager(object):
             raise NeedIndex()
 
         self.es.indices.close(self.index)
-
-        document = {
-            'analysis': {
-                'filter': {
-                    'french_elision': {
-                        'type': 'elision',
-                        'articles_case': True,
-                        'articles': [
-                            'l', 'm', 't', 'qu', 'n', 's',
-                            'j', 'd', 'c', 'jusqu', 'quoiqu',
-                            'lorsqu', 'puisqu'
-                        ]
-                    },
-                    'protect_c_language': {
-                        'type': 'pattern_replace',
-                        'pattern': '^c$',
-                        'replacement': 'langage_c'
-                    },
-                    'french_stop': {
-                        'type': 'stop',
-                        'stopwords': '_french_'
-                    },
-                    'french_keywords': {
-                        'type': 'keyword_marker',
-                        'keywords': settings.ZDS_APP['search']['mark_keywords']
-                    },
-                    'french_stemmer': {
-                        'type': 'stemmer',
-                        'language': 'light_french'
-                    }
-                },
-                'tokenizer': {
-                    'custom_tokenizer': {
-                        'type': 'pattern',
-                        'pattern': u'[ .,!?%\u2026\u00AB\u00A0\u00BB\u202F\uFEFF\u2013\u2014\n]'
-                    }
-                },
-                'analyzer': {
-                    'default': {
-                        'tokenizer': 'custom_tokenizer',
-                        'filter': [
-                            'lowercase',
-                            'protect_c_language',
-                            'french_elision',
-                            'french_stop',
-                            'french_keywords',
-                            'french_stemmer'
-                        ],
-                        'char_filter': [
-                            'html_strip',
-                        ]
-                    }
-                }
-            }
-        }
-
-        self.es.indices.put_settings(index=self.index, body=document)
+        self.es.indices.put_settings(index=self.index, body={'analysis': self.get_custom_analysis()})
         self.es.indices.open(self.index)
 
         self.logger.info('setup analyzer')
@@ -450,7 +689,7 @@ class ESIndexManager(object):
 
         self.logger.info('unindex {}'.format(model.get_es_document_type()))
 
-    def es_bulk_indexing_of_model(self, model, force_reindexing=False):
+    def es_bulk_indexing_of_model(self, model, force_reindexing=False, pk_range=None):
         """Perform a bulk action on documents of a given model. Use the ``objects_per_batch`` property to index.
 
         See http://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.bulk
@@ -464,6 +703,9 @@ class ESIndexManager(object):
         :type model: class
         :param force_reindexing: force all document to be returned
         :type force_reindexing: bool
+        :param pk_range: ``(start, end)``, to only index the objects whose ``pk`` is in ``[start, end[``
+            (not available for ``PublishedContent``)
+        :type pk_range: tuple
         :return: the number of documents indexed
         :rtype: int
         """
@@ -483,7 +725,7 @@ class ESIndexManager(object):
         objects_per_batch = getattr(model, 'objects_per_batch', 100)
         indexed_counter = 0
         if model.__name__ == 'PublishedContent':
-            generate = model.get_es_indexable(force_reindexing)
+            generate = model.get_es_indexable(force_reindexing, index_manager=self)
             while True:
                 with transaction.atomic():
                     try:
@@ -521,6 +763,12 @@ class ESIndexManager(object):
             prev_obj_per_sec = False
             last_pk = 0
             object_source = model.get_es_indexable(force_reindexing)
+            if pk_range is not None:
+                last_pk = pk_range[0] - 1
+                object_source = object_source.filter(pk__lt=pk_range[1])
+
+            # the workers of ``es_manager index_all`` report their own throughput
+            verbose = force_reindexing and pk_range is None
 
             while True:
                 with transaction.atomic():
@@ -552,7 +800,7 @@ class ESIndexManager(object):
                     last_batch_duration = int(now - then) or 1
                     then = now
                     obj_per_sec = round(float(objects_per_batch) / last_batch_duration, 2)
-                    if force_reindexing:
+                    if verbose:
                         print '    {} so far ({} obj/s, batch size: {})'.format(
                               indexed_counter, obj_per_sec, objects_per_batch)
 
@@ -564,7 +812,7 @@ class ESIndexManager(object):
                         # shrink/increase batch size
                         if abs(1 - ratio) > 0.1:
                             objects_per_batch = int(objects_per_batch * ratio)
-                            if force_reindexing:
+                            if verbose:
                                 print '     {}x, new batch size: {}'.format(round(ratio, 2), objects_per_batch)
                         prev_obj_per_sec = obj_per_sec
 
@@ -573,6 +821,110 @@ class ESIndexManager(object):
 
             return indexed_counter
 
+    def process_change_log(self, batch_size=500, after=None, consume=True):
+        """Apply the oldest entries of the change log (see ``ESIndexChange``) to the index, then remove them from the
+        log. Only the last operation on a given object is performed, and all the documents are sent at once.
+
+        The entries are kept while a new version of the index is being filled (see ``get_building_versions()``),
+        so that they are also applied to it before it replaces the current one. The caller then gets the position to
+        read the next entries from. The entries of the documents which could not be indexed or deleted are written
+        again at the end of the log, to be retried later.
+
+        If the cluster cannot be reached, the entries are kept and an exception is raised.
+
+        :param batch_size: maximum number of entries consumed
+        :type batch_size: int
+        :param after: only apply the entries following this one (a primary key)
+        :type after: int
+        :param consume: whether the entries may be removed from the log
+        :type consume: bool
+        :return: the number of entries applied, and the value of ``after`` for the next call (``None`` if the entries
+            were removed)
+        :rtype: tuple
+        """
+
+        if not self.connected_to_es:
+            return 0, after
+
+        if not self.index_exists:
+            raise NeedIndex()
+
+        changes = ESIndexChange.objects.order_by('pk')
+        if after is not None:
+            changes = changes.filter(pk__gt=after)
+        changes = list(changes[:batch_size])
+        if not changes:
+            return 0, after
+
+        # the versions are checked after reading the entries: the objects modified before a version was created are
+        # indexed by the build
+        if consume and self.get_building_versions():
+            consume = False
+
+        # only the last operation on an object matters
+        operations = OrderedDict()
+        for change in changes:
+            operations[(change.model_label, change.object_pk)] = change.operation
+
+        actions = []
+        documents = {}  # (document type, id) -> (model label, pk)
+        to_index = defaultdict(list)
+        for (model_label, pk), operation in operations.items():
+            try:
+                model = apps.get_model(model_label)
+            except LookupError:
+                self.logger.warn('unknown model {} in the change log'.format(model_label))
+                continue
+
+            documents[(model.get_es_document_type(), str(pk))] = (model_label, pk)
+            if operation == 'delete':
+                actions.append({
+                    '_op_type': 'delete',
+                    '_index': self.index,
+                    '_type': model.get_es_document_type(),
+                    '_id': str(pk)
+                })
+            else:
+                to_index[model].append(pk)
+
+        indexed = {}
+        for model, pks in to_index.items():
+            if model.__name__ == 'PublishedContent':
+                # the chapters are generated along with their content, so use the usual indexing of flagged objects
+                # (they may have been indexed in another version of the index already)
+                model.objects.filter(pk__in=pks).update(es_flagged=True)
+                self.es_bulk_indexing_of_model(model)
+                continue
+
+            objects = list(model.get_es_django_indexable(force_reindexing=True).filter(pk__in=pks))
+            actions.extend(obj.get_es_document_as_bulk_action(self.index) for obj in objects)
+            indexed[model] = [obj.pk for obj in objects]
+
+        failed = set()
+        for ok, hit in parallel_bulk(self.es, actions, chunk_size=batch_size, raise_on_error=False, request_timeout=30):
+            action = hit.keys()[0]
+            if ok:
+                self.logger.info('{} {} with id {}'.format(action, hit[action]['_type'], hit[action]['_id']))
+            elif action != 'delete' or hit[action].get('status') != 404:  # a missing document is already deleted
+                self.logger.warn('failed to {} {} with id {}: {}'.format(
+                    action, hit[action]['_type'], hit[action]['_id'], hit[action].get('error')))
+                failed.add(documents[(hit[action]['_type'], hit[action]['_id'])])
+
+        for model, pks in indexed.items():
+            pks = [pk for pk in pks if (model._meta.label, pk) not in failed]
+            model.objects.filter(pk__in=pks).update(es_already_indexed=True, es_flagged=False)
+
+        if not consume:
+            return len(changes), changes[-1].pk
+
+        with transaction.atomic():
+            ESIndexChange.objects.filter(pk__in=[change.pk for change in changes]).delete()
+            for (model_label, pk), operation in operations.items():
+                if (model_label, pk) in failed:
+                    log_index_changes(apps.get_model(model_label), [pk], operation)
+
+        return len(changes), None
+
     def refresh_index(self):
         """Force the refreshing the index. The task is normally done periodically, but may be forced with this method.
 
@@ -590,6 +942,7 @@ class ESIndexManager(object):
             raise NeedIndex()
 
         self.es.indices.refresh(self.index)
+        search_cache.invalidate()
 
     def update_single_document(self, document, doc):
         """Update given fields of a single document.
@@ -697,3 +1050,40 @@ class ESIndexManager(object):
             raise NeedIndex()
 
         return request.index(self.index).using(self.es)
+
+
+_index_managers = {}
+_index_managers_lock = threading.Lock()
+
+
+def get_index_manager():
+    """Get the manager of the search index shared by the whole process (and created at the first call), so that the
+    state of the cluster is not checked for each request. See ``ZDS_APP['search']['health_check']``.
+
+    :rtype: ESIndexManager
+    """
+
+    # the settings are part of the key, since they can be overridden (in tests, for example)
+    key = (settings.ES_ENABLED, tuple(sorted(settings.ES_SEARCH_INDEX.items())))
+    index_manager = _index_managers.get(key)
+    if index_manager is None:
+        with _index_managers_lock:
+            index_manager = _index_managers.get(key)
+            if index_manager is None:
+                health_check = settings.ZDS_APP['search']['health_check']
+                index_manager = ESIndexManager(
+                    health_check_interval=health_check['interval'],
+                    health_check_timeout=health_check['timeout'],
+                    failure_threshold=health_check['failure_threshold'],
+                    cooldown=health_check['cooldown'],
+                    **settings.ES_SEARCH_INDEX)
+                _index_managers[key] = index_manager
+    return index_manager
+
+
+def invalidate_index_managers():
+    """Ask the shared managers to check the state of the cluster again, since the index was created or deleted.
+    """
+
+    for index_manager in _index_managers.values():
+        index_manager.invalidate()
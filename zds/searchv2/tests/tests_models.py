@@ -3,18 +3,20 @@
 import os
 import shutil
 
+from elasticsearch import ConnectionError
 from elasticsearch_dsl import Search
 from elasticsearch_dsl.query import MatchAll
 
 from django.conf import settings
 from django.test import TestCase
 from django.test.utils import override_settings
+from mock import Mock, patch
 from zds.settings import BASE_DIR
 
 from zds.forum.factories import TopicFactory, PostFactory, Topic, Post
 from zds.forum.tests.tests_views import create_category
 from zds.member.factories import ProfileFactory, StaffProfileFactory
-from zds.searchv2.models import ESIndexManager
+from zds.searchv2.models import ESIndexChange, ESIndexManager, get_index_manager
 from zds.tutorialv2.factories import PublishableContentFactory, ContainerFactory, ExtractFactory, publish_content
 from zds.tutorialv2.models.models_database import PublishedContent, FakeChapter, PublishableContent
 
@@ -69,31 +71,40 @@ class ESIndexManagerTests(TestCase):
         manager.reset_es_index([Topic, Post])
         self.assertTrue(manager.index in manager.es.cat.indices())  # index in !
 
+        # the name is an alias to the first version of the index
         index_settings = manager.es.indices.get_settings(index=manager.index)
-        self.assertTrue(manager.index in index_settings)
-        index_settings = index_settings[manager.index]['settings']['index']
+        version_name = manager.index + '_v1'
+        self.assertEqual(list(index_settings.keys()), [version_name])
+        index_settings = index_settings[version_name]['settings']['index']
 
-        self.assertEqual(index_settings['provided_name'], manager.index)
+        self.assertEqual(index_settings['provided_name'], version_name)
         self.assertEqual(index_settings['number_of_shards'], str(manager.number_of_shards))
         self.assertEqual(index_settings['number_of_replicas'], str(manager.number_of_replicas))
 
         # test mappings
         mappings = manager.es.indices.get_mapping(index=manager.index)
-        self.assertTrue(manager.index in mappings)
-        mappings = mappings[manager.index]['mappings']
+        self.assertTrue(version_name in mappings)
+        mappings = mappings[version_name]['mappings']
 
         for model in models:
             self.assertTrue(model.get_es_document_type() in mappings)
 
         # analyzer
-        self.assertTrue('analysis' not in index_settings)
-        manager.setup_custom_analyzer()
-
-        index_settings = manager.es.indices.get_settings(index=manager.index)
-        self.assertTrue(manager.index in index_settings)
-        index_settings = index_settings[manager.index]['settings']['index']
         self.assertTrue('analysis' in index_settings)
 
+        # 2. Build a new version while the first one is used, then switch to it
+        new_version = manager.create_index_version(models)
+        self.assertEqual(new_version.index, manager.index + '_v2')
+        index_settings = manager.es.indices.get_settings(index=new_version.index)[new_version.index]
+        self.assertEqual(index_settings['settings']['index']['refresh_interval'], '-1')  # bulk load
+        self.assertEqual(list(manager.es.indices.get_alias(name=manager.index).keys()), [version_name])
+
+        manager.switch_to_index_version(new_version)
+        self.assertEqual(list(manager.es.indices.get_alias(name=manager.index).keys()), [new_version.index])
+        index_settings = manager.es.indices.get_settings(index=new_version.index)[new_version.index]
+        self.assertEqual(index_settings['settings']['index']['number_of_replicas'], str(manager.number_of_replicas))
+        self.assertEqual(manager.get_index_versions(), [2])  # the first one is deleted
+
         # 3. Clearing
         manager.clear_es_index()
         self.assertTrue(manager.index not in self.manager.es.cat.indices())  # back to the void
@@ -188,7 +199,7 @@ class ESIndexManagerTests(TestCase):
             'post': str(post.pk),
             'topic': str(topic.pk),
             'publishedcontent': str(published.pk),
-            'chapter': tuto.slug + '__' + chapter1.slug
+            'chapter': FakeChapter.get_es_id_of_chapter(published.es_id, chapter1.get_path(relative=True))
         }
 
         for hit in results:
@@ -374,6 +385,123 @@ class ESIndexManagerTests(TestCase):
         self.assertTrue(found_new)
         self.assertFalse(found_old)
 
+    def test_stale_chapters(self):
+        """test that reindexing a content overwrites its chapters and removes the ones which do not exist anymore"""
+
+        if not self.manager.connected_to_es:
+            return
+
+        # 1. Create a middle-tutorial with two chapters, publish it, then index it
+        tuto = PublishableContentFactory(type='TUTORIAL')
+        tuto.authors.add(self.user)
+        tuto.save()
+
+        tuto_draft = tuto.load_version()
+        chapter1 = ContainerFactory(parent=tuto_draft, db_object=tuto)
+        ExtractFactory(container=chapter1, db_object=tuto)
+        chapter2 = ContainerFactory(parent=tuto_draft, db_object=tuto)
+        ExtractFactory(container=chapter2, db_object=tuto)
+        published = publish_content(tuto, tuto_draft, is_major_update=True)
+
+        tuto.sha_public = tuto_draft.current_version
+        tuto.sha_draft = tuto_draft.current_version
+        tuto.public_version = published
+        tuto.save()
+
+        self.manager.es_bulk_indexing_of_model(PublishedContent)
+        self.manager.refresh_index()
+
+        s = Search()
+        s.query(MatchAll())
+        results = self.manager.setup_search(s).execute()
+        self.assertEqual(len([r for r in results if r.meta.doc_type == 'chapter']), 2)
+
+        # 2. Remove the second chapter, then publish and index again
+        tuto = PublishableContent.objects.get(pk=tuto.pk)
+        versioned = tuto.load_version()
+        versioned.children[-1].repo_delete()
+        published = publish_content(tuto, versioned, True)
+
+        tuto.sha_public = versioned.current_version
+        tuto.sha_draft = versioned.current_version
+        tuto.public_version = published
+        tuto.save()
+
+        self.manager.es_bulk_indexing_of_model(PublishedContent)
+        self.manager.refresh_index()
+
+        s = Search()
+        s.query(MatchAll())
+        results = self.manager.setup_search(s).execute()
+        chapters = [r for r in results if r.meta.doc_type == 'chapter']
+        self.assertEqual(len(chapters), 1)
+        self.assertEqual(
+            chapters[0].meta.id, FakeChapter.get_es_id_of_chapter(published.es_id, chapter1.get_path(relative=True)))
+
+    def test_change_log(self):
+        """test that saved and deleted objects are written in the change log, and that consuming it updates the index"""
+
+        # 1. Saving objects writes them in the log, repeated changes are applied only once
+        topic = TopicFactory(forum=self.forum, author=self.user)
+        post = PostFactory(topic=topic, author=self.user, position=1)
+        post.text = 'Un autre texte'
+        post.save()
+
+        changes = ESIndexChange.objects.filter(model_label='forum.Post', object_pk=post.pk)
+        self.assertTrue(changes.count() >= 2)
+        self.assertTrue(all(change.operation == 'index' for change in changes))
+
+        # nothing is written if the object is not flagged
+        count = ESIndexChange.objects.count()
+        post.save(es_flagged=False)
+        self.assertEqual(ESIndexChange.objects.count(), count)
+
+        if not self.manager.connected_to_es:
+            return
+
+        self.assertEqual(self.manager.process_change_log(), (count, None))
+        self.assertEqual(ESIndexChange.objects.count(), 0)
+        self.manager.refresh_index()
+
+        post = Post.objects.get(pk=post.pk)
+        self.assertTrue(post.es_already_indexed)
+        self.assertFalse(post.es_flagged)
+
+        s = Search()
+        s.query(MatchAll())
+        results = self.manager.setup_search(s).execute()
+        self.assertEqual(len(results), 2)  # the topic and the post
+
+        # 2. Deletions are applied as well, even if the cluster was not reachable when they happened
+        with patch.object(ESIndexManager, 'delete_document'):
+            topic.delete()  # also deletes the post
+
+        self.assertEqual(ESIndexChange.objects.filter(operation='delete').count(), 2)
+        self.manager.process_change_log()
+        self.manager.refresh_index()
+
+        results = self.manager.setup_search(s).execute()
+        self.assertEqual(len(results), 0)
+
+        # 3. A batch only consumes the oldest entries
+        topic = TopicFactory(forum=self.forum, author=self.user)
+        PostFactory(topic=topic, author=self.user, position=1)
+        count = ESIndexChange.objects.count()
+        self.assertEqual(self.manager.process_change_log(batch_size=1), (1, None))
+        self.assertEqual(ESIndexChange.objects.count(), count - 1)
+
+        # 4. The entries of the documents refused by ES are written again at the end of the log
+        ESIndexChange.objects.all().delete()
+        post = PostFactory(topic=topic, author=self.user, position=2)
+        change = ESIndexChange.objects.get(model_label='forum.Post', object_pk=post.pk)
+        failure = (False, {'index': {'_type': 'post', '_id': str(post.pk), 'status': 400, 'error': 'mapping'}})
+        with patch('zds.searchv2.models.parallel_bulk', return_value=[failure]):
+            self.assertEqual(self.manager.process_change_log(), (1, None))
+
+        retried = ESIndexChange.objects.get(model_label='forum.Post', object_pk=post.pk)
+        self.assertGreater(retried.pk, change.pk)
+        self.assertTrue(Post.objects.get(pk=post.pk).es_flagged)
+
     def tearDown(self):
         if os.path.isdir(settings.ZDS_APP['content']['repo_private_path']):
             shutil.rmtree(settings.ZDS_APP['content']['repo_private_path'])
@@ -387,3 +515,49 @@ class ESIndexManagerTests(TestCase):
 
         # delete index:
         self.manager.clear_es_index()
+
+
+@override_settings(ES_ENABLED=True)
+class ESIndexManagerHealthTests(TestCase):
+    """The state of the cluster is mocked, so these tests do not need Elasticsearch."""
+
+    def test_circuit_breaker(self):
+        es = Mock()
+        with patch('zds.searchv2.models.connections.get_connection', return_value=es), \
+                patch('zds.searchv2.models.time.time', return_value=1000):
+            manager = ESIndexManager('zds_search_test', health_check_interval=60, failure_threshold=2, cooldown=30)
+            self.assertTrue(manager.connected_to_es)
+            self.assertTrue(manager.index_exists)
+            self.assertEqual(es.info.call_count, 1)
+
+            # the state is cached ...
+            self.assertTrue(manager.connected_to_es)
+            self.assertEqual(es.info.call_count, 1)
+
+            # ... until the circuit opens
+            manager.report_failure()
+            self.assertTrue(manager.connected_to_es)
+            manager.report_failure()
+            self.assertFalse(manager.connected_to_es)
+            self.assertEqual(es.info.call_count, 1)
+
+        # the cluster is checked again after the cooldown, and is still unavailable
+        es.info.side_effect = ConnectionError('N/A', 'unreachable', None)
+        with patch('zds.searchv2.models.time.time', return_value=1031):
+            self.assertFalse(manager.connected_to_es)
+            self.assertEqual(es.info.call_count, 2)
+            self.assertFalse(manager.connected_to_es)
+            self.assertEqual(es.info.call_count, 2)
+
+        # then back
+        es.info.side_effect = None
+        with patch('zds.searchv2.models.time.time', return_value=1062):
+            self.assertTrue(manager.connected_to_es)
+            self.assertEqual(manager.failures, 0)
+
+    def test_shared_index_manager(self):
+        with patch('zds.searchv2.models.connections.get_connection', return_value=Mock()):
+            self.assertIs(get_index_manager(), get_index_manager())
+
+            with override_settings(ES_SEARCH_INDEX={'name': 'zds_search_other', 'shards': 1, 'replicas': 0}):
+                self.assertEqual(get_index_manager().index, 'zds_search_other')
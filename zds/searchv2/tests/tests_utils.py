@@ -1,23 +1,29 @@
 # coding: utf-8
 
+import copy
 import os
 import shutil
+import threading
+import time
 
 from elasticsearch_dsl import Search
 from elasticsearch_dsl.query import MatchAll
 
 from django.conf import settings
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
 from django.test.utils import override_settings
 from zds.settings import BASE_DIR
 from django.core.management import call_command
 
 from zds.member.factories import ProfileFactory, StaffProfileFactory
 from zds.tutorialv2.factories import PublishableContentFactory, ContainerFactory, ExtractFactory, publish_content
-from zds.tutorialv2.models.models_database import PublishedContent
+from zds.tutorialv2.models.models_database import PublishedContent, FakeChapter
 from zds.forum.factories import TopicFactory, PostFactory, Topic, Post
 from zds.forum.tests.tests_views import create_category
-from zds.searchv2.models import ESIndexManager
+from zds.searchv2.cache import SearchCache
+from zds.searchv2.management.commands.es_manager import Command, get_pk_ranges, read_checkpoint
+from zds.searchv2.models import ESIndexChange, ESIndexManager, get_django_indexable_objects
 
 overrided_zds_app = settings.ZDS_APP
 overrided_zds_app['content']['repo_private_path'] = os.path.join(BASE_DIR, 'contents-private-test')
@@ -116,7 +122,7 @@ class UtilsTests(TestCase):
             'post': str(post.pk),
             'topic': str(topic.pk),
             'publishedcontent': str(published.pk),
-            'chapter': tuto.slug + '__' + chapter1.slug
+            'chapter': FakeChapter.get_es_id_of_chapter(published.es_id, chapter1.get_path(relative=True))
         }
 
         for hit in results:
@@ -184,6 +190,72 @@ class UtilsTests(TestCase):
         results = self.index_manager.setup_search(s).execute()
         self.assertEqual(len(results), 4)  # get the 4 results back
 
+    def test_index_all_switch_is_consistent(self):
+        """Test that the changes made while ``index_all`` fills a new version are applied to it before the switch"""
+
+        if not self.index_manager.connected_to_es:
+            return
+
+        kept = TopicFactory(forum=self.forum, author=self.user, title=u'Un titre')
+        deleted = TopicFactory(forum=self.forum, author=self.user)
+        call_command('es_manager', 'index_all')
+        self.index_manager.index_exists = True
+
+        # the topics are read by the build
+        command = Command()
+        index_manager, last_change = command.create_index_version()
+        self.assertEqual(self.index_manager.get_building_versions(), [index_manager.index])
+        index_manager.es_bulk_indexing_of_model(Topic, force_reindexing=True)
+
+        # then modified
+        kept.title = u'Un nouveau titre'
+        kept.save()
+        deleted.delete()
+
+        # ``follow`` applies the changes to the current version, but keeps them for the new one
+        applied, after = self.index_manager.process_change_log()
+        self.assertEqual(applied, 2)
+        self.assertIsNotNone(after)
+        self.assertEqual(ESIndexChange.objects.filter(pk__gt=last_change or 0).count(), 2)
+
+        command.switch_to_index_version(index_manager, last_change)
+        self.assertEqual(self.index_manager.get_building_versions(), [])
+        self.assertEqual(ESIndexChange.objects.count(), 0)
+
+        s = Search()
+        s.query(MatchAll())
+        results = self.index_manager.setup_search(s).execute()
+        self.assertEqual([(hit.meta.id, hit.title) for hit in results if hit.meta.doc_type == 'topic'],
+                         [(str(kept.pk), u'Un nouveau titre')])
+
+    def test_index_all_ranges(self):
+        """Test the ranges of primary keys and the checkpoint used by ``es_manager index_all --workers``"""
+
+        self.assertEqual(get_pk_ranges(Post, 2), [])
+
+        topic = TopicFactory(forum=self.forum, author=self.user)
+        posts = [PostFactory(topic=topic, author=self.user, position=i) for i in range(1, 6)]
+
+        ranges = get_pk_ranges(Post, 2)
+        self.assertEqual(len(ranges), 3)
+        self.assertEqual(ranges[0][0], posts[0].pk)
+        self.assertEqual(ranges[-1][1], posts[-1].pk + 1)
+        for post in posts:  # each post belongs to exactly one range
+            self.assertEqual(len([r for r in ranges if r[0] <= post.pk < r[1]]), 1)
+
+        # checkpoint
+        checkpoint_path = os.path.join(settings.MEDIA_ROOT, 'es_checkpoint')
+        self.assertEqual(read_checkpoint(checkpoint_path), (None, None, set()))
+
+        if not os.path.isdir(settings.MEDIA_ROOT):
+            os.makedirs(settings.MEDIA_ROOT)
+        with open(checkpoint_path, 'w') as checkpoint_file:
+            checkpoint_file.write('zds_search_test_v2 42\nforum.Post 1 3\ntutorialv2.PublishedContent 0 0\n')
+
+        self.assertEqual(
+            read_checkpoint(checkpoint_path),
+            ('zds_search_test_v2', 42, {('forum.Post', 1, 3), ('tutorialv2.PublishedContent', 0, 0)}))
+
     def tearDown(self):
         if os.path.isdir(settings.ZDS_APP['content']['repo_private_path']):
             shutil.rmtree(settings.ZDS_APP['content']['repo_private_path'])
@@ -197,3 +269,97 @@ class UtilsTests(TestCase):
 
         # delete index:
         self.index_manager.clear_es_index()
+
+
+@override_settings(MEDIA_ROOT=os.path.join(BASE_DIR, 'media-test'))
+@override_settings(ES_SEARCH_INDEX={'name': 'zds_search_test', 'shards': 5, 'replicas': 0})
+class ParallelIndexingTests(TransactionTestCase):
+    """The objects must be committed to be seen by the worker processes."""
+
+    def setUp(self):
+        self.index_manager = ESIndexManager(**settings.ES_SEARCH_INDEX)
+        self.checkpoint_path = os.path.join(settings.MEDIA_ROOT, 'es_checkpoint')
+        if not os.path.isdir(settings.MEDIA_ROOT):
+            os.makedirs(settings.MEDIA_ROOT)
+
+    def count_documents(self, doc_type):
+        return self.index_manager.es.count(index=self.index_manager.index, doc_type=doc_type)['count']
+
+    def test_index_all_with_workers(self):
+        """Test ``es_manager index_all --workers``, and the resumption of an interrupted run"""
+
+        if not self.index_manager.connected_to_es:
+            return
+        if connection.vendor == 'sqlite':  # the workers cannot share an in-memory database
+            return
+
+        user = ProfileFactory().user
+        _, forum = create_category()
+        topic = TopicFactory(forum=forum, author=user)
+        posts = [PostFactory(topic=topic, author=user, position=i) for i in range(1, 6)]
+
+        # 1. index everything with two workers
+        call_command('es_manager', 'index_all', workers=2, range_size=2, checkpoint=self.checkpoint_path)
+        first_version = self.index_manager.get_index_versions()[-1]
+        self.assertEqual(self.index_manager.es.indices.get_alias(name=self.index_manager.index).keys(),
+                         ['zds_search_test_v{}'.format(first_version)])
+        self.assertEqual(self.count_documents('topic'), 1)
+        self.assertEqual(self.count_documents('post'), len(posts))
+        self.assertFalse(os.path.isfile(self.checkpoint_path))  # removed once done
+
+        # 2. resume an interrupted run: the ranges recorded in the checkpoint are not indexed again
+        models = [FakeChapter] + get_django_indexable_objects()
+        version = self.index_manager.create_index_version(models)
+        done = get_pk_ranges(Post, 2)[0]
+        with open(self.checkpoint_path, 'w') as checkpoint_file:
+            checkpoint_file.write('{} -\nforum.Post {} {}\n'.format(version.index, *done))
+
+        call_command('es_manager', 'index_all', workers=2, range_size=2, checkpoint=self.checkpoint_path)
+        self.assertEqual(self.index_manager.es.indices.get_alias(name=self.index_manager.index).keys(),
+                         [version.index])
+        self.assertEqual(self.index_manager.get_building_versions(), [])  # the previous version is deleted
+        self.assertEqual(self.count_documents('topic'), 1)
+        self.assertEqual(self.count_documents('post'),
+                         len([post for post in posts if not done[0] <= post.pk < done[1]]))
+
+    def tearDown(self):
+        if os.path.isdir(settings.MEDIA_ROOT):
+            shutil.rmtree(settings.MEDIA_ROOT)
+        self.index_manager.clear_es_index()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class SearchCacheTests(TestCase):
+    def test_get_or_execute(self):
+        calls = []
+
+        def execute():
+            calls.append(1)
+            time.sleep(.2)
+            return {'hits': {'total': len(calls)}}
+
+        cache = SearchCache()
+        key = cache.get_key('python', 'topic')
+        self.assertNotEqual(key, cache.get_key('python', 'post'))
+
+        # identical concurrent searches are computed once
+        threads = [threading.Thread(target=cache.get_or_execute, args=(key, execute)) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+
+        self.assertEqual(cache.get_or_execute(key, execute), {'hits': {'total': 1}})
+        self.assertEqual(len(calls), 1)
+
+        # the refresh of the index hides the previous responses
+        cache.invalidate()
+        key = cache.get_key('python', 'topic')
+        self.assertEqual(cache.get_or_execute(key, execute), {'hits': {'total': 2}})
+
+        # disabled cache
+        zds_app = copy.deepcopy(settings.ZDS_APP)
+        zds_app['search']['results_cache']['enabled'] = False
+        with override_settings(ZDS_APP=zds_app):
+            self.assertEqual(cache.get_or_execute(key, execute), {'hits': {'total': 3}})
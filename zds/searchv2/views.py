@@ -1,7 +1,9 @@
 # coding: utf-8
+import hashlib
 import json
 import operator
 
+from elasticsearch import ConnectionError
 from elasticsearch_dsl import Search
 from elasticsearch_dsl.query import Match, MultiMatch, FunctionScore, Term, Terms, Range
 
@@ -15,12 +17,24 @@ from django.core.urlresolvers import reverse
 from django.views.generic import CreateView
 from django.views.generic.detail import SingleObjectMixin
 
+from zds.searchv2.cache import CachedSearch, search_cache
 from zds.searchv2.forms import SearchForm
-from zds.searchv2.models import ESIndexManager
+from zds.searchv2.models import get_index_manager
 from zds.utils.paginator import ZdSPagingListView
 from zds.utils.templatetags.authorized_forums import get_authorized_forums
 
 
+def get_search_key_parts(search_query, authorized_forums, *other_parts):
+    """
+    :return: what changes the results of a search, for ``search_cache``: the normalized query (the analyzer ignores the
+        case and the spacing) and a hash of the forums the user can read, which is shared by many users
+    :rtype: tuple
+    """
+
+    forums_hash = hashlib.sha1(','.join(str(pk) for pk in sorted(authorized_forums))).hexdigest()
+    return (u' '.join(search_query.lower().split()), forums_hash) + other_parts
+
+
 class SimilarSubjectsView(CreateView, SingleObjectMixin):
     search_query = None
     authorized_forums = ''
@@ -31,7 +45,7 @@ class SimilarSubjectsView(CreateView, SingleObjectMixin):
         """
 
         super(SimilarSubjectsView, self).__init__(**kwargs)
-        self.index_manager = ESIndexManager(**settings.ES_SEARCH_INDEX)
+        self.index_manager = get_index_manager()
 
     def get(self, request, *args, **kwargs):
         if 'q' in request.GET:
@@ -55,8 +69,18 @@ class SimilarSubjectsView(CreateView, SingleObjectMixin):
             scored_query = FunctionScore(query=query, boost_mode='multiply', functions=functions_score)
             search_queryset = search_queryset.query(scored_query)[:10]
 
+            key = search_cache.get_key('similar', *get_search_key_parts(self.search_query, self.authorized_forums))
+            try:
+                raw_response = search_cache.get_or_execute(key, lambda: search_queryset.execute().to_dict())
+                hits = search_queryset._response_class(search_queryset, raw_response)
+            except ConnectionError:
+                self.index_manager.report_failure()
+                hits = []
+            else:
+                self.index_manager.report_success()
+
             # Build the result
-            for hit in search_queryset.execute():
+            for hit in hits:
                 result = {'id': hit.pk,
                           'url': str(hit.get_absolute_url),
                           'title': str(hit.title),
@@ -91,7 +115,7 @@ class SearchView(ZdSPagingListView):
         """
 
         super(SearchView, self).__init__(**kwargs)
-        self.index_manager = ESIndexManager(**settings.ES_SEARCH_INDEX)
+        self.index_manager = get_index_manager()
 
     def get(self, request, *args, **kwargs):
         """Overridden to catch the request and fill the form.
@@ -105,7 +129,18 @@ class SearchView(ZdSPagingListView):
         if self.search_query and not self.search_form.is_valid():
             raise PermissionDenied('research form is invalid')
 
-        return super(SearchView, self).get(request, *args, **kwargs)
+        try:
+            response = super(SearchView, self).get(request, *args, **kwargs)
+        except ConnectionError:
+            # the search was executed during the pagination: display the page without results
+            self.index_manager.report_failure()
+            messages.warning(self.request, _(u'Impossible de se connecter à Elasticsearch'))
+            self.object_list = []
+            return self.render_to_response(self.get_context_data())
+
+        if self.search_query:
+            self.index_manager.report_success()
+        return response
 
     def get_queryset(self):
         if not self.index_manager.connected_to_es:
@@ -154,8 +189,10 @@ class SearchView(ZdSPagingListView):
                 fragment_size=150, number_of_fragments=5, pre_tags=['[hl]'], post_tags=['[/hl]'])
             search_queryset = search_queryset.highlight('text').highlight('text_html')
 
-            # executing:
-            return self.index_manager.setup_search(search_queryset)
+            # executing (through the cache, identical searches being frequent):
+            return CachedSearch(
+                self.index_manager.setup_search(search_queryset),
+                *get_search_key_parts(self.search_query, self.authorized_forums, *sorted(models)))
 
         return []
 
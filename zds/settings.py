@@ -492,10 +492,22 @@ ZDS_APP = {
         'repo_public_path': os.path.join(BASE_DIR, 'contents-public'),
         'extra_contents_dirname': 'extra_contents',
         # can also be 'extra_content_generation_policy': 'WATCHDOG'
+        # or 'extra_content_generation_policy': 'QUEUE' (generated by the `publication_worker` command)
         # or 'extra_content_generation_policy': 'NOTHING'
         'extra_content_generation_policy': 'SYNC',
+        'publication_queue': {
+            'workers': 2,  # number of extra contents generated at the same time by `publication_worker`
+            'max_attempts': 3,
+            'retry_delay': 60,  # seconds, doubled after each failed attempt
+            'poll_interval': 5,  # seconds
+            'stalled_after': 3600,  # seconds after which a running job is considered as lost and queued again
+        },
         'extra_content_watchdog_dir': os.path.join(BASE_DIR, 'watchdog-build'),
         'max_tree_depth': 3,
+        'versions_cache_size': 50,  # parsed manifests kept in each process
+        'versions_cache_dir': None,  # if set, parsed manifests are also kept in this directory
+        'archives_cache_dir': os.path.join(BASE_DIR, 'contents-archives'),  # zip of the drafts, None to disable
+        'archives_cache_size': 100,
         'default_licence_pk': 7,
         'content_per_page': 60,
         'notes_per_page': 25,
@@ -506,11 +518,24 @@ ZDS_APP = {
         'default_image': os.path.join(BASE_DIR, 'fixtures', 'noir_black.png'),
         'import_image_prefix': 'archive',
         'build_pdf_when_published': True,
+        # if greater than 1, the chapters are rendered by this number of processes during a publication
+        'publication_workers': 0,
+        # if True, the files of the previous publication of a content are reused when they did not change
+        'incremental_publication': False,
         'maximum_slug_size': 150,
         'sec_per_minute': 1500,
         'editorial_line_link':
         u'https://zestedesavoir.com/articles/222/la-ligne-editoriale-officielle-de-zeste-de-savoir/'
     },
+    'sendfile': {
+        # how the files are sent (see `zds.utils.sendfile.serve_file()`): 'django' (in chunks),
+        # 'x-accel-redirect' (by nginx) or 'x-sendfile' (by apache or lighttpd)
+        'backend': 'django',
+        # with 'x-accel-redirect', the internal location of nginx which maps `root` (`repo_public_path` if None)
+        'root': None,
+        'url': '/contents-public-internal/',
+        'chunk_size': 64 * 1024,
+    },
     'forum': {
         'posts_per_page': 21,
         'topics_per_page': 21,
@@ -521,6 +546,7 @@ ZDS_APP = {
         'top_tag_max': 5,
         'home_number': 5,
         'old_post_limit_days': 90,
+        'readable_cache_timeout': 60 * 60 * 24,  # seconds, for the cached sets of forums readable by each group set
         # Exclude tags from top tags list. Tags listed here should not be relevant for most of users.
         # Be warned exclude too much tags can restrict performance
         'top_tag_exclu': ['bug', 'suggestion', 'tutoriel', 'beta', 'article']
@@ -532,19 +558,58 @@ ZDS_APP = {
         'max_pings': 15,
         'enable_pings': True,
     },
+    'markdown': {
+        # bump it to invalidate every rendered text (for instance when the smileys or the extensions change)
+        'renderer_version': 1,
+        'render_cache_enabled': True,
+        'render_cache_local_size': 1000,  # entries kept in each process
+        'render_cache_timeout': 60 * 60 * 24 * 7,  # seconds
+    },
     'featured_resource': {
         'featured_per_page': 100,
         'home_number': 5,
     },
     'notification': {
         'per_page': 50,
+        # 'SYNC': the subscribers are notified (and emailed) while the new topic or answer is posted,
+        # 'QUEUE': by the `notification_worker` command
+        'fan_out_policy': 'SYNC',
+        'queue': {
+            'batch_size': 50,  # number of jobs run before sending their emails
+            'email_rate': 10,  # maximum number of emails sent per second, 0 for no limit
+            'max_attempts': 3,
+            'retry_delay': 60,  # seconds, doubled after each failed attempt
+            'poll_interval': 2,  # seconds
+            'stalled_after': 600,  # seconds after which a running job is considered as lost and queued again
+        },
     },
     'paginator': {
-        'folding_limit': 4
+        'folding_limit': 4,
+        # for how long the keyset paginators remember the last item of a page (in seconds)
+        'boundaries_cache_timeout': 60,
     },
     'search': {
         'mark_keywords': ['javafx', 'haskell', 'groovy', 'powershell', 'latex', 'linux', 'windows'],
         'results_per_page': 20,
+        # state of the cluster, as seen by the index manager shared by the process
+        'health_check': {
+            'interval': 30,  # seconds between two checks of the cluster and the index
+            'timeout': 1,  # seconds
+            'failure_threshold': 3,  # failed requests after which the cluster is not used ...
+            'cooldown': 30,  # ... during this number of seconds
+        },
+        # responses of the cluster, shared by the processes and invalidated when the index is refreshed
+        'results_cache': {
+            'enabled': True,
+            'timeout': 60,  # seconds
+            'lock_timeout': 5,  # seconds during which identical searches wait for the first one
+        },
+        # objects saved or deleted are written in a change log, consumed by `es_manager follow`
+        'change_log': {
+            'enabled': True,
+            'batch_size': 500,  # entries consumed at once
+            'poll_interval': 2,  # seconds to wait once the log is empty
+        },
         'search_groups': {
             'content': (
                 _(u'Contenus publiés'), ['publishedcontent', 'chapter']
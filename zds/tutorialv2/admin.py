@@ -2,7 +2,8 @@
 
 from django.contrib import admin
 
-from zds.tutorialv2.models.models_database import PublishableContent, Validation, ContentReaction, PublishedContent
+from zds.tutorialv2.models.models_database import PublishableContent, Validation, ContentReaction, PublishedContent, \
+    PublicationJob
 
 
 class PublishableContentnAdmin(admin.ModelAdmin):
@@ -21,7 +22,14 @@ class ValidationAdmin(admin.ModelAdmin):
     raw_id_fields = ('content', 'validator')
 
 
+class PublicationJobAdmin(admin.ModelAdmin):
+    list_display = ('published_object', 'format_requested', 'state', 'attempts', 'next_attempt_date', 'duration')
+    list_filter = ('state', 'format_requested')
+    raw_id_fields = ('published_object',)
+
+
 admin.site.register(PublishableContent, PublishableContentnAdmin)
 admin.site.register(PublishedContent, PublishedContentAdmin)
 admin.site.register(Validation, ValidationAdmin)
 admin.site.register(ContentReaction, ContentReactionAdmin)
+admin.site.register(PublicationJob, PublicationJobAdmin)
@@ -1,11 +1,105 @@
 # coding: utf-8
 
 import os
+import signal
 import subprocess
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
 from django.core.management.base import BaseCommand
 from django.utils.translation import ugettext_lazy as _
 from zds import settings
 from zds.tutorialv2.models.models_database import PublishedContent
+from zds.utils.misc import compute_hash
+
+MD_HASH_EXTENSION = '.pdf.md5'  # next to the PDF, the hash of the markdown file it was generated from
+
+
+def read_checkpoint(checkpoint_path):
+    """
+    :param checkpoint_path: path of the checkpoint file, if any
+    :return: the ``content_pk`` of the contents which were already handled by a previous (interrupted) run
+    :rtype: set
+    """
+    if not checkpoint_path or not os.path.isfile(checkpoint_path):
+        return set()
+    with open(checkpoint_path) as checkpoint_file:
+        return set(int(line) for line in checkpoint_file if line.strip())
+
+
+def run_with_timeout(command, cwd, timeout):
+    """Run a shell command, killing it (and its children) if it lasts more than ``timeout`` seconds.
+
+    :param command: the shell command
+    :param cwd: working directory
+    :param timeout: in seconds, ``0`` for no limit
+    :return: the exit code of the command, ``None`` if it timed out
+    """
+    # the command gets its own process group, so that the whole pipeline (pandoc, LaTeX, tee...) can be killed
+    process = subprocess.Popen(command, shell=True, cwd=cwd, preexec_fn=os.setsid)
+    if not timeout:
+        return process.wait()
+
+    deadline = time.time() + timeout
+    while process.poll() is None:
+        if time.time() > deadline:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+            return None
+        time.sleep(.5)
+    return process.returncode
+
+
+def generate_pdf(extra_content_dir, slug, changed_only=False, timeout=0):
+    """Generate the PDF of a published content from its bundled markdown file. The PDF is generated next to the
+    previous one, which is replaced only if the generation succeeded.
+
+    :param extra_content_dir: the extra contents directory of the content
+    :param slug: the public slug of the content
+    :param changed_only: do nothing if the markdown file did not change since the previous generation
+    :param timeout: in seconds, ``0`` for no limit
+    :return: ``'OK'``, ``'SKIPPED'``, ``'TIMEOUT'`` or ``'ERROR'``
+    :rtype: str
+    """
+    base_name = os.path.join(extra_content_dir, slug)
+    md_file_path = base_name + '.md'
+    hash_path = base_name + MD_HASH_EXTENSION
+
+    if not os.path.isfile(md_file_path):
+        return 'ERROR'
+
+    md_hash = compute_hash([md_file_path])
+    if changed_only and os.path.isfile(base_name + '.pdf') and os.path.isfile(hash_path):
+        with open(hash_path) as hash_file:
+            if hash_file.read().strip() == md_hash:
+                return 'SKIPPED'
+
+    pandoc_debug_str = ''
+    if settings.PANDOC_LOG_STATE:
+        pandoc_debug_str = ' 2>&1 | tee -a ' + settings.PANDOC_LOG
+
+    building_path = base_name + '__building.pdf'
+    if os.path.exists(building_path):
+        os.remove(building_path)
+
+    # generate PDF (assume images)
+    exit_code = run_with_timeout(
+        settings.PANDOC_LOC + 'pandoc ' + settings.PANDOC_PDF_PARAM + ' ' +
+        md_file_path + ' -o ' + building_path + pandoc_debug_str,
+        extra_content_dir,
+        timeout)
+
+    if not os.path.exists(building_path):
+        return 'TIMEOUT' if exit_code is None else 'ERROR'
+    if exit_code is None:
+        os.remove(building_path)  # probably incomplete
+        return 'TIMEOUT'
+
+    os.rename(building_path, base_name + '.pdf')
+    with open(hash_path, 'w') as hash_file:
+        hash_file.write(md_hash)
+    return 'OK'
 
 
 class Command(BaseCommand):
@@ -15,6 +109,15 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument('id', nargs='*', type=str)
+        parser.add_argument('--jobs', type=int, default=1, dest='jobs',
+                            help='number of PDFs generated at the same time')
+        parser.add_argument('--timeout', type=int, default=0, dest='timeout',
+                            help='maximum duration of the generation of a PDF, in seconds (0 for no limit)')
+        parser.add_argument('--checkpoint', type=str, default=None, dest='checkpoint',
+                            help='file recording the contents already handled, so that an interrupted run can be '
+                                 'resumed by running the same command again')
+        parser.add_argument('--changed-only', action='store_true', default=False, dest='changed_only',
+                            help='skip the contents whose markdown did not change since their PDF was generated')
 
     def handle(self, *args, **options):
         try:
@@ -22,45 +125,56 @@ class Command(BaseCommand):
         except IndexError:
             ids = []
 
-        pandoc_debug_str = ''
-        if settings.PANDOC_LOG_STATE:
-            pandoc_debug_str = ' 2>&1 | tee -a ' + settings.PANDOC_LOG
-
         if len(ids) > 0:
             public_contents = PublishedContent.objects.filter(content_pk__in=ids, must_redirect=False).all()
         else:
             public_contents = PublishedContent.objects.filter(must_redirect=False).all()
 
-        num_of_contents = len(public_contents)
+        checkpoint_path = options['checkpoint']
+        already_done = read_checkpoint(checkpoint_path)
+        # the paths are computed here, so that the threads do not need the database
+        to_generate = [(content.content_pk, content.get_extra_contents_directory(), content.content_public_slug)
+                       for content in public_contents if content.content_pk not in already_done]
+
+        num_of_contents = len(to_generate)
 
         if num_of_contents == 0:
             self.stdout.write(_(u"Aucun contenu n'a été sélectionné, aucun PDF ne sera généré"))
             return
 
+        if already_done:
+            self.stdout.write(_(u'Reprise : {} contenu(s) déjà traité(s)').format(len(already_done)))
+
         self.stdout.write(_(u'Génération de PDF pour {} contenu{}').format(
             num_of_contents, 's' if num_of_contents > 1 else ''))
 
-        for content in public_contents:
-            self.stdout.write(_(u'- {}').format(content.content_public_slug), ending='')
-            extra_content_dir = content.get_extra_contents_directory()
-
-            base_name = os.path.join(extra_content_dir, content.content_public_slug)
-
-            # delete previous one
-            if os.path.exists(base_name + '.pdf'):
-                os.remove(base_name + '.pdf')
-
-            # generate PDF (assume images)
-            subprocess.call(
-                settings.PANDOC_LOC + 'pandoc ' + settings.PANDOC_PDF_PARAM + ' ' +
-                base_name + '.md -o ' + base_name + '.pdf' + pandoc_debug_str,
-                shell=True,
-                cwd=extra_content_dir)
-
-            # check:
-            if os.path.exists(base_name + '.pdf'):
-                self.stdout.write(' [OK]')
-            else:
-                self.stdout.write(' [ERREUR]')
+        lock = threading.Lock()
+        failures = []
+
+        def run(content):
+            content_pk, extra_content_dir, slug = content
+            start = time.time()
+            result = generate_pdf(extra_content_dir, slug, options['changed_only'], options['timeout'])
+            with lock:
+                self.stdout.write(_(u'- {} [{}] ({:.1f}s)').format(slug, result, time.time() - start))
+                if result in ('OK', 'SKIPPED'):
+                    if checkpoint_path:
+                        with open(checkpoint_path, 'a') as checkpoint_file:
+                            checkpoint_file.write('{}\n'.format(content_pk))
+                else:
+                    failures.append(slug)
+
+        pool = ThreadPool(max(1, options['jobs']))
+        try:
+            pool.map(run, to_generate)
+        finally:
+            pool.close()
+            pool.join()
+
+        if failures:
+            self.stdout.write(_(u'{} PDF(s) en erreur : {}').format(len(failures), u', '.join(failures)))
+        elif checkpoint_path and os.path.isfile(checkpoint_path):
+            # everything is done, the next run starts from scratch
+            os.remove(checkpoint_path)
 
         os.chdir(settings.BASE_DIR)
@@ -0,0 +1,72 @@
+# coding: utf-8
+import threading
+from multiprocessing.pool import ThreadPool
+
+from django.core.management import BaseCommand
+from django.db import connection
+
+from zds import settings
+from zds.tutorialv2.models.models_database import PublicationJob
+from zds.tutorialv2.publication_utils import run_publication_job
+
+
+def run_and_close_connection(job):
+    """Run the job in a thread of the pool, then close the database connection this thread opened."""
+    try:
+        run_publication_job(job)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    """
+    `python manage.py publication_worker`; generate the extra contents (pdf, epub...) queued when contents are
+    published with the ``'QUEUE'`` generation policy.
+
+    Several workers can run at the same time, even on different hosts sharing the public contents directory: a job is
+    claimed by only one of them, and never while the same format of the same content is being generated.
+    """
+    help = 'Generate the queued extra contents (pdf, epub...) of the published contents'
+
+    def add_arguments(self, parser):
+        queue_settings = settings.ZDS_APP['content']['publication_queue']
+        parser.add_argument('--jobs', type=int, default=queue_settings['workers'], dest='jobs',
+                            help='number of extra contents generated at the same time')
+        parser.add_argument('--once', action='store_true', dest='once', default=False,
+                            help='stop when there is no more job ready to run instead of waiting for new ones')
+
+    def handle(self, *args, **options):
+        queue_settings = settings.ZDS_APP['content']['publication_queue']
+        jobs = max(1, options['jobs'])
+        pool = ThreadPool(jobs)
+        finished = threading.Event()
+        running = []  # (job, result)
+
+        try:
+            while True:
+                stalled = PublicationJob.objects.requeue_stalled(queue_settings['stalled_after'])
+                if stalled:
+                    self.stdout.write(u'{} stalled jobs queued again'.format(stalled))
+
+                finished.clear()
+                for job, result in running:
+                    if result.ready():
+                        self.stdout.write(u'{}: {} ({:.1f}s)'.format(job, job.get_state_display(), job.duration or 0))
+                running = [(job, result) for job, result in running if not result.ready()]
+
+                # only claim the jobs which can start right now, so that the pool is kept full even when a job is long
+                claimed = PublicationJob.objects.claim(jobs - len(running)) if len(running) < jobs else []
+                for job in claimed:
+                    running.append((job, pool.apply_async(
+                        run_and_close_connection, (job,), callback=lambda _: finished.set())))
+
+                if not running and options['once']:
+                    break
+                if not claimed:
+                    # wait for a new job, or for a running one to finish
+                    finished.wait(queue_settings['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pool.close()
+            pool.join()
@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 
+import os
+from datetime import datetime, timedelta
+
 from django.conf import settings
 from django.db import models
-from django.db.models import Count, F
+from django.db.models import Count, F, Q
 
 from zds.utils.models import Tag
 from django.utils.translation import ugettext_lazy as _
@@ -55,6 +58,35 @@ class PublishedContentManager(models.Manager):
     def last_opinions_of_a_member_loaded(self, author):
         return self.last_contents_of_a_member_loaded(author, _type='OPINION')
 
+    def get_neighbours(self, published_content):
+        """
+        Get the contents of the same type published just before and just after the given one, with two queries on
+        the index of the publication date.
+
+        :param published_content: the published content
+        :type published_content: zds.tutorialv2.models.models_database.PublishedContent
+        :return: the previous and the next contents (``None`` if there is no such content)
+        :rtype: tuple
+        """
+        if published_content.publication_date is None:
+            return None, None
+
+        queryset = self.select_related('content') \
+            .filter(content_type=published_content.content_type, must_redirect=False)
+        publication_date = published_content.publication_date
+        # the contents published at the same time are ordered by primary key
+        previous_content = queryset \
+            .filter(Q(publication_date__lt=publication_date) |
+                    Q(publication_date=publication_date, pk__lt=published_content.pk)) \
+            .order_by('-publication_date', '-pk') \
+            .first()
+        next_content = queryset \
+            .filter(Q(publication_date__gt=publication_date) |
+                    Q(publication_date=publication_date, pk__gt=published_content.pk)) \
+            .order_by('publication_date', 'pk') \
+            .first()
+        return previous_content, next_content
+
     def get_contents_count(self):
         """
         :rtype: int
@@ -221,3 +253,88 @@ class PublishableContentManager(models.Manager):
             content.public_version.content = content
             published.append(content.public_version)
         return published
+
+
+class PublicationJobManager(models.Manager):
+    """
+    Queue of the generations of extra contents.
+    """
+
+    def enqueue(self, published_content, formats):
+        """
+        Queue the generation of some extra contents of a published content. If the same content (even with another
+        slug) already waits for the same format, this job is reused instead of adding a new one.
+
+        :param published_content: the published content
+        :type published_content: zds.tutorialv2.models.models_database.PublishedContent
+        :param formats: formats to generate
+        :type formats: list
+        :return: the queued jobs
+        :rtype: list
+        """
+        base_name = os.path.join(published_content.get_extra_contents_directory(),
+                                 published_content.content_public_slug)
+        jobs = []
+        for format_requested in formats:
+            queued = self.filter(published_object__content_pk=published_content.content_pk,
+                                 format_requested=format_requested, state='QUEUED')
+            job = queued.first()
+            if job is None:
+                job = self.model(format_requested=format_requested)
+            else:
+                queued.exclude(pk=job.pk).delete()
+
+            job.published_object = published_content
+            job.base_name = base_name
+            job.md_file_path = base_name + '.md'
+            job.attempts = 0
+            job.error = ''
+            job.next_attempt_date = datetime.now()
+            job.save()
+            jobs.append(job)
+
+        return jobs
+
+    def claim(self, limit):
+        """
+        Mark some jobs ready to run as running, so that no other worker takes them. A job is not claimed while
+        another one for the same content and format is running.
+
+        :param limit: maximum number of jobs to claim
+        :return: the claimed jobs
+        :rtype: list
+        """
+        running = set(self.filter(state='RUNNING').values_list('published_object__content_pk', 'format_requested'))
+        claimed = []
+        now = datetime.now()
+
+        # there is at most one queued job for a content and a format, so at most ``len(running)`` of them are skipped
+        candidates = self.filter(state='QUEUED', next_attempt_date__lte=now) \
+            .select_related('published_object') \
+            .order_by('next_attempt_date', 'pk')[:limit + len(running)]
+        for job in candidates:
+            if len(claimed) >= limit:
+                break
+            key = (job.published_object.content_pk, job.format_requested)
+            if key in running:
+                continue
+            # the update only succeeds if no other worker claimed it in the meantime
+            if self.filter(pk=job.pk, state='QUEUED').update(state='RUNNING', start_date=now) == 1:
+                job.state = 'RUNNING'
+                job.start_date = now
+                claimed.append(job)
+                running.add(key)
+
+        return claimed
+
+    def requeue_stalled(self, stalled_after):
+        """
+        Queue again the jobs which have been running for too long, probably because their worker died.
+
+        :param stalled_after: number of seconds after which a running job is considered as stalled
+        :return: the number of jobs queued again
+        :rtype: int
+        """
+        limit = datetime.now() - timedelta(seconds=stalled_after)
+        return self.filter(state='RUNNING', start_date__lt=limit) \
+            .update(state='QUEUED', next_attempt_date=datetime.now())
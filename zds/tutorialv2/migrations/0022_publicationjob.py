@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import datetime
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutorialv2', '0021_picklistoperation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PublicationJob',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('format_requested', models.CharField(max_length=10, verbose_name='Format', db_index=True)),
+                ('state', models.CharField(default='QUEUED', max_length=10, verbose_name='\xc9tat', db_index=True, choices=[('QUEUED', 'En attente'), ('RUNNING', 'En cours'), ('SUCCESS', 'R\xe9ussie'), ('FAILURE', '\xc9chou\xe9e')])),
+                ('base_name', models.CharField(max_length=400, verbose_name='Chemin du fichier (sans extension)')),
+                ('md_file_path', models.CharField(max_length=400, verbose_name='Chemin du fichier markdown')),
+                ('attempts', models.IntegerField(default=0, verbose_name='Nombre de tentatives')),
+                ('exit_code', models.IntegerField(null=True, verbose_name='Code de retour', blank=True)),
+                ('duration', models.FloatField(null=True, verbose_name='Dur\xe9e (en secondes)', blank=True)),
+                ('error', models.TextField(default='', verbose_name='Erreur', blank=True)),
+                ('creation_date', models.DateTimeField(auto_now_add=True, verbose_name='Date de cr\xe9ation')),
+                ('next_attempt_date', models.DateTimeField(default=datetime.datetime.now, verbose_name='Date de la prochaine tentative', db_index=True)),
+                ('start_date', models.DateTimeField(null=True, verbose_name='Date de d\xe9but', blank=True)),
+                ('end_date', models.DateTimeField(null=True, verbose_name='Date de fin', blank=True)),
+                ('published_object', models.ForeignKey(related_name='publication_jobs', on_delete=django.db.models.deletion.CASCADE, verbose_name='Contenu publi\xe9', to='tutorialv2.PublishedContent')),
+            ],
+            options={
+                'verbose_name': 'G\xe9n\xe9ration de contenu annexe',
+                'verbose_name_plural': 'G\xe9n\xe9rations de contenus annexes',
+            },
+        ),
+    ]
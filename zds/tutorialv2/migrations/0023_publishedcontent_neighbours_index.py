@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutorialv2', '0022_publicationjob'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='publishedcontent',
+            index_together=set([('content_type', 'must_redirect', 'publication_date')]),
+        ),
+    ]
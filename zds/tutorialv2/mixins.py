@@ -502,6 +502,7 @@ class DownloadViewMixin(View):
     """
     mimetype = None
     filename = None
+    streaming = False  # if True, `get_contents()` returns an iterator over the chunks of the file
 
     def get_mimetype(self):
         return self.mimetype
@@ -517,9 +518,12 @@ class DownloadViewMixin(View):
         Access to a file with only get method then write the file content in response stream.
         Properly sets Content-Type and Content-Disposition headers
         """
-        response = HttpResponse(content_type=self.get_mimetype())
+        if self.streaming:
+            response = StreamingHttpResponse(self.get_contents(), content_type=self.get_mimetype())
+        else:
+            response = HttpResponse(content_type=self.get_mimetype())
+            response.write(self.get_contents())
         response['Content-Disposition'] = 'filename=' + self.get_filename()
-        response.write(self.get_contents())
 
         return response
 
@@ -71,3 +71,10 @@ STATUS_CHOICES = (
     ('REJECT', _(u'Rejeté')),
     ('CANCEL', _(u'Annulé'))
 )
+
+PUBLICATION_JOB_STATES = (
+    ('QUEUED', _(u'En attente')),
+    ('RUNNING', _(u'En cours')),
+    ('SUCCESS', _(u'Réussie')),
+    ('FAILURE', _(u'Échouée')),
+)
@@ -3,7 +3,7 @@ from __future__ import unicode_literals
 
 from django.db.models import CASCADE
 from django.utils.encoding import python_2_unicode_compatible
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from zds.tutorialv2.models.mixins import TemplatableContentModelMixin, OnlineLinkableContentMixin
 
@@ -16,6 +16,7 @@ except ImportError:
         import json as json_reader
 
 from math import ceil
+import hashlib
 import shutil
 
 from django.conf import settings
@@ -38,14 +39,15 @@ from elasticsearch_dsl.field import Text, Keyword, Date, Boolean
 
 from zds.forum.models import Topic
 from zds.gallery.models import Image, Gallery, UserGallery, GALLERY_WRITE
-from zds.tutorialv2.managers import PublishedContentManager, PublishableContentManager
-from zds.tutorialv2.models import TYPE_CHOICES, STATUS_CHOICES, CONTENT_TYPES_VALIDATION_BEFORE, PICK_OPERATIONS
+from zds.tutorialv2.managers import PublishedContentManager, PublishableContentManager, PublicationJobManager
+from zds.tutorialv2.models import TYPE_CHOICES, STATUS_CHOICES, CONTENT_TYPES_VALIDATION_BEFORE, PICK_OPERATIONS, \
+    PUBLICATION_JOB_STATES
 from zds.tutorialv2.models.models_versioned import NotAPublicVersion
-from zds.tutorialv2.utils import get_content_from_json, BadManifestError
+from zds.tutorialv2.utils import get_content_from_json, BadManifestError, versioned_content_cache
 from zds.utils import get_current_user
 from zds.utils.models import SubCategory, Licence, HelpWriting, Comment, Tag
 from zds.searchv2.models import AbstractESDjangoIndexable, AbstractESIndexable, delete_document_in_elasticsearch, \
-    ESIndexManager
+    get_index_manager
 from zds.utils.tutorials import get_blob
 import logging
 
@@ -358,10 +360,17 @@ class PublishableContent(models.Model, TemplatableContentModelMixin):
             if sha != public.sha_public:
                 raise NotAPublicVersion
 
-            manifest = open(os.path.join(path, 'manifest.json'), 'r')
-            json = json_reader.loads(manifest.read())
-            versioned = get_content_from_json(json, public.sha_public,
-                                              slug, public=True, max_title_len=max_title_length)
+            manifest_path = os.path.join(path, 'manifest.json')
+            # the public repository is rewritten at each publication, hence the modification time in the key
+            cache_key = versioned_content_cache.get_key(self.pk, sha, True, slug, os.path.getmtime(manifest_path))
+            versioned = versioned_content_cache.get(cache_key)
+
+            if versioned is None:
+                manifest = open(manifest_path, 'r')
+                json = json_reader.loads(manifest.read())
+                versioned = get_content_from_json(json, public.sha_public,
+                                                  slug, public=True, max_title_len=max_title_length)
+                versioned_content_cache.set(cache_key, versioned)
 
         else:  # draft version, use the repository (slower, but allows manipulation)
             path = self.get_repo_path()
@@ -370,15 +379,23 @@ class PublishableContent(models.Model, TemplatableContentModelMixin):
             if not os.path.isdir(path):
                 raise IOError(path)
 
-            repo = Repo(path)
-            data = get_blob(repo.commit(sha).tree, 'manifest.json')
-            try:
-                json = json_reader.loads(data)
-            except ValueError:
-                raise BadManifestError(
-                    _(u'Une erreur est survenue lors de la lecture du manifest.json, est-ce du JSON ?'))
+            cache_key = versioned_content_cache.get_key(self.pk, sha, False, slug) if sha else None
+            versioned = versioned_content_cache.get(cache_key) if cache_key else None
 
-            versioned = get_content_from_json(json, sha, self.slug, max_title_len=max_title_length)
+            if versioned is not None:
+                versioned.repository = Repo(path)
+            else:
+                repo = Repo(path)
+                data = get_blob(repo.commit(sha).tree, 'manifest.json')
+                try:
+                    json = json_reader.loads(data)
+                except ValueError:
+                    raise BadManifestError(
+                        _(u'Une erreur est survenue lors de la lecture du manifest.json, est-ce du JSON ?'))
+
+                versioned = get_content_from_json(json, sha, self.slug, max_title_len=max_title_length)
+                if cache_key:
+                    versioned_content_cache.set(cache_key, versioned)
 
         self.insert_data_in_versioned(versioned)
         return versioned
@@ -595,6 +612,8 @@ class PublishedContent(AbstractESDjangoIndexable, TemplatableContentModelMixin,
     class Meta:
         verbose_name = 'Contenu publié'
         verbose_name_plural = 'Contenus publiés'
+        # to find the previous and next contents of a type
+        index_together = [('content_type', 'must_redirect', 'publication_date')]
 
     content = models.ForeignKey(PublishableContent, verbose_name='Contenu')
 
@@ -898,34 +917,37 @@ class PublishedContent(AbstractESDjangoIndexable, TemplatableContentModelMixin,
             .filter(must_redirect=False)
 
     @classmethod
-    def get_es_indexable(cls, force_reindexing=False):
+    def get_es_indexable(cls, force_reindexing=False, index_manager=None):
         """Overridden to also include chapters
-        """
 
-        index_manager = ESIndexManager(**settings.ES_SEARCH_INDEX)
+        :param index_manager: the manager of the index where the objects are indexed, the current one if ``None``
+        :type index_manager: zds.searchv2.models.ESIndexManager
+        """
 
         # fetch initial batch
         last_pk = 0
         objects_source = super(PublishedContent, cls).get_es_indexable(force_reindexing)
         objects = list(objects_source.filter(pk__gt=last_pk)[:PublishedContent.objects_per_batch])
 
+        # the chapters have deterministic ids, so (re)indexing them overwrites the previous documents. The ones which
+        # do not exist anymore are removed at the end.
+        reindexed_contents = []
+        current_chapters = []
+
         while objects:
             chapters = []
 
             for content in objects:
                 versioned = content.load_public_version()
+                if content.es_already_indexed:
+                    reindexed_contents.append(content.es_id)
 
                 # chapters are only indexed for middle and big tuto
                 if versioned.has_sub_containers():
-
-                    # delete possible previous chapters
-                    if content.es_already_indexed:
-                        index_manager.delete_by_query(
-                            FakeChapter.get_es_document_type(), ES_Q('match', _routing=content.es_id))
-
-                    # (re)index the new one(s)
                     for chapter in versioned.get_list_of_chapters():
                         chapters.append(FakeChapter(chapter, versioned, content.es_id))
+                        if content.es_already_indexed:
+                            current_chapters.append(chapters[-1].es_id)
 
             if chapters:
                 # since we want to return at most PublishedContent.objects_per_batch items
@@ -940,6 +962,10 @@ class PublishedContent(AbstractESDjangoIndexable, TemplatableContentModelMixin,
             last_pk = objects[-1].pk
             objects = list(objects_source.filter(pk__gt=last_pk)[:PublishedContent.objects_per_batch])
 
+        # every batch has been indexed at this point
+        if reindexed_contents:
+            FakeChapter.delete_stale_chapters(reindexed_contents, current_chapters, index_manager)
+
     def get_es_document_source(self, excluded_fields=None):
         """Overridden to handle the fact that most information are versioned
         """
@@ -987,7 +1013,7 @@ def delete_published_content_in_elasticsearch(sender, instance, **kwargs):
     chapters.
     """
 
-    index_manager = ESIndexManager(**settings.ES_SEARCH_INDEX)
+    index_manager = get_index_manager()
 
     if index_manager.index_exists:
         index_manager.delete_by_query(FakeChapter.get_es_document_type(), ES_Q('match', _routing=instance.es_id))
@@ -1034,7 +1060,7 @@ class FakeChapter(AbstractESIndexable):
         self.parent_id = parent_id
         self.get_absolute_url_online = chapter.get_absolute_url_online()
 
-        self.es_id = main_container.slug + '__' + chapter.slug  # both slugs are unique by design, so id remains unique
+        self.es_id = FakeChapter.get_es_id_of_chapter(parent_id, chapter.get_path(relative=True))
 
         self.parent_title = main_container.title
         self.parent_get_absolute_url_online = main_container.get_absolute_url_online()
@@ -1047,6 +1073,37 @@ class FakeChapter(AbstractESIndexable):
     def get_es_document_type(cls):
         return 'chapter'
 
+    @staticmethod
+    def get_es_id_of_chapter(parent_id, chapter_path):
+        """The id only depends on the content and on the position of the chapter in it, so that indexing a chapter
+        again overwrites its previous document.
+
+        :param parent_id: ``es_id`` of the ``PublishedContent``
+        :param chapter_path: path of the chapter, relative to the content
+        :rtype: str
+        """
+        return '{}__{}'.format(parent_id, hashlib.sha1(chapter_path.encode('utf-8')).hexdigest())
+
+    @classmethod
+    def delete_stale_chapters(cls, parent_ids, current_ids, index_manager=None):
+        """Remove, in a single request, the chapters of some contents which were not indexed again (because they were
+        removed or moved).
+
+        :param parent_ids: ``es_id`` of the ``PublishedContent`` which were indexed again
+        :param current_ids: ids of the chapters which were indexed for these contents
+        :param index_manager: the manager of the index, the current one if ``None``
+        :type index_manager: zds.searchv2.models.ESIndexManager
+        """
+        if index_manager is None:
+            index_manager = get_index_manager()
+        if not index_manager.index_exists:
+            return
+
+        query = ES_Q('terms', _routing=list(parent_ids))
+        if current_ids:
+            query &= ~ES_Q('ids', values=list(current_ids))
+        index_manager.delete_by_query(cls.get_es_document_type(), query)
+
     @classmethod
     def get_es_mapping(self):
         """Define mapping and parenting
@@ -1245,6 +1302,65 @@ class PickListOperation(models.Model):
         raise ValueError('Content cannot be null or something else than opinion.', self.content)
 
 
+@python_2_unicode_compatible
+class PublicationJob(models.Model):
+    """
+    Generation of an extra content (pdf, epub...) of a published content, queued at publication when the
+    ``extra_content_generation_policy`` setting is ``'QUEUE'`` and run by the ``publication_worker`` command.
+    """
+    class Meta:
+        verbose_name = 'Génération de contenu annexe'
+        verbose_name_plural = 'Générations de contenus annexes'
+
+    published_object = models.ForeignKey(PublishedContent, on_delete=CASCADE, verbose_name='Contenu publié',
+                                         related_name='publication_jobs')
+    format_requested = models.CharField('Format', max_length=10, db_index=True)
+    state = models.CharField('État', max_length=10, choices=PUBLICATION_JOB_STATES, default='QUEUED', db_index=True)
+    base_name = models.CharField('Chemin du fichier (sans extension)', max_length=400)
+    md_file_path = models.CharField('Chemin du fichier markdown', max_length=400)
+
+    attempts = models.IntegerField('Nombre de tentatives', default=0)
+    exit_code = models.IntegerField('Code de retour', null=True, blank=True)
+    duration = models.FloatField('Durée (en secondes)', null=True, blank=True)
+    error = models.TextField('Erreur', blank=True, default='')
+
+    creation_date = models.DateTimeField('Date de création', auto_now_add=True)
+    next_attempt_date = models.DateTimeField('Date de la prochaine tentative', default=datetime.now, db_index=True)
+    start_date = models.DateTimeField('Date de début', null=True, blank=True)
+    end_date = models.DateTimeField('Date de fin', null=True, blank=True)
+
+    objects = PublicationJobManager()
+
+    def __str__(self):
+        return '{} de « {} »'.format(self.format_requested, self.published_object.content_public_slug)
+
+    def finish(self, exit_code, duration, error=''):
+        """Record the result of an attempt. A failed job is queued again (with an exponential backoff) until it
+        reaches the maximum number of attempts.
+
+        :param exit_code: exit code of the generation, if any
+        :param duration: time spent, in seconds
+        :param error: the error, if any
+        """
+        self.attempts += 1
+        self.exit_code = exit_code
+        self.duration = duration
+        self.error = error
+        self.end_date = datetime.now()
+
+        queue_settings = settings.ZDS_APP['content']['publication_queue']
+        if not error:
+            self.state = 'SUCCESS'
+        elif self.attempts < queue_settings['max_attempts']:
+            self.state = 'QUEUED'
+            delay = queue_settings['retry_delay'] * 2 ** (self.attempts - 1)
+            self.next_attempt_date = self.end_date + timedelta(seconds=delay)
+        else:
+            self.state = 'FAILURE'
+
+        self.save()
+
+
 @receiver(models.signals.pre_delete, sender=User)
 def transfer_paternity_receiver(sender, instance, **kwargs):
     """
@@ -1,12 +1,15 @@
 # coding: utf-8
 import codecs
 import copy
+import hashlib
 import logging
+import multiprocessing
 import os
 import shutil
 import subprocess
-import zipfile
+import time
 from datetime import datetime
+from itertools import chain
 
 from django.core.exceptions import ObjectDoesNotExist
 from django.template.loader import render_to_string
@@ -17,11 +20,25 @@ from zds import settings
 from zds.settings import ZDS_APP
 from zds.tutorialv2.models.models_database import ContentReaction
 from zds.tutorialv2.signals import content_unpublished
-from zds.tutorialv2.utils import retrieve_and_update_images_links
-from zds.utils.templatetags.emarkdown import emarkdown
+from zds.tutorialv2.utils import retrieve_and_update_images_links, get_blob_sha, iter_zip_archive
+from zds.utils.misc import compute_hash
+from zds.utils.templatetags.emarkdown import emarkdown, get_renderer_version
 
+try:
+    import ujson as json_handler
+except ImportError:
+    try:
+        import simplejson as json_handler
+    except ImportError:
+        import json as json_handler
+
+logger = logging.getLogger('zds.tutorialv2')
+
+# fingerprints of the rendered files, saved next to the manifest of a publication
+RENDER_FINGERPRINTS_FILE = 'fingerprints.json'
 
-def publish_content(db_object, versioned, is_major_update=True):
+
+def publish_content(db_object, versioned, is_major_update=True, incremental=None):
     """
     Publish a given content.
 
@@ -29,22 +46,36 @@ def publish_content(db_object, versioned, is_major_update=True):
         create a manifest.json without the introduction and conclusion if not needed. Also remove the 'text' field
         of extracts.
 
+    .. note::
+        in incremental mode, the files of the previous publication are reused when possible: the HTML of the
+        containers whose blobs did not change, and the extra contents if the markdown file did not change.
+
     :param db_object: Database representation of the content
     :type db_object: PublishableContent
     :param versioned: version of the content to publish
     :type versioned: VersionedContent
     :param is_major_update: if set to `True`, will update the publication date
     :type is_major_update: bool
+    :param incremental: reuse the files of the previous publication (default to the \
+    ``ZDS_APP['content']['incremental_publication']`` setting)
+    :type incremental: bool
     :raise FailureDuringPublication: if something goes wrong
     :return: the published representation
     :rtype: zds.tutorialv2.models.models_database.PublishedContent
     """
 
-    from zds.tutorialv2.models.models_database import PublishedContent
+    from zds.tutorialv2.models.models_database import PublishedContent, PublicationJob
 
     if is_major_update:
         versioned.pubdate = datetime.now()
 
+    if incremental is None:
+        incremental = settings.ZDS_APP['content']['incremental_publication']
+
+    previous_dir = None
+    if incremental and db_object.public_version and os.path.isdir(db_object.public_version.get_prod_path()):
+        previous_dir = db_object.public_version.get_prod_path()
+
     # First write the files in a temporary directory: if anything goes wrong,
     # the last published version is not impacted !
     tmp_path = os.path.join(settings.ZDS_APP['content']['repo_public_path'], versioned.slug + '__building')
@@ -54,7 +85,10 @@ def publish_content(db_object, versioned, is_major_update=True):
 
     # render HTML:
     altered_version = copy.deepcopy(versioned)
-    publish_container(db_object, tmp_path, altered_version)
+    start = time.time()
+    timings = publish_container(db_object, tmp_path, altered_version, previous_dir=previous_dir)
+    logger.info('%s: %d files rendered in %.3fs (%.3fs of rendering)', versioned.slug, len(timings),
+                time.time() - start, sum(duration for __, duration in timings))
     altered_version.dump_json(os.path.join(tmp_path, 'manifest.json'))
 
     # make room for 'extra contents'
@@ -88,10 +122,16 @@ def publish_content(db_object, versioned, is_major_update=True):
     pandoc_debug_str = ''
     if settings.PANDOC_LOG_STATE:
         pandoc_debug_str = ' 2>&1 | tee -a ' + settings.PANDOC_LOG
-    if settings.ZDS_APP['content']['extra_content_generation_policy'] == 'SYNC':
+    extra_content_generation_policy = settings.ZDS_APP['content']['extra_content_generation_policy']
+    extra_contents_reused = False
+    if extra_content_generation_policy in ['SYNC', 'QUEUE'] and previous_dir:
+        extra_contents_reused = reuse_external_content(db_object.public_version, base_name, md_file_path)
+    if extra_contents_reused:
+        logger.info('%s: markdown unchanged, extra contents reused', versioned.slug)
+    elif extra_content_generation_policy == 'SYNC':
         # ok, now we can really publish the thing !
         generate_exernal_content(base_name, extra_contents_path, md_file_path, pandoc_debug_str)
-    elif settings.ZDS_APP['content']['extra_content_generation_policy'] == 'WATCHDOG':
+    elif extra_content_generation_policy == 'WATCHDOG':
         PublicatorRegistery.get('watchdog').publish(md_file_path, base_name, silently_pass=False)
 
     is_update = False
@@ -149,6 +189,10 @@ def publish_content(db_object, versioned, is_major_update=True):
     except IOError:
         pass
 
+    if extra_content_generation_policy == 'QUEUE' and not extra_contents_reused:
+        # the paths of the queued jobs are the final ones, so this must be done once the files are moved
+        PublicationJob.objects.enqueue(public_version, get_external_content_formats())
+
     return public_version
 
 
@@ -164,12 +208,49 @@ def generate_exernal_content(base_name, extra_contents_path, md_file_path, pando
     ask for PDF not to be published
     :return:
     """
-    excluded = []
+    for _format in get_external_content_formats(overload_settings):
+        PublicatorRegistery.get(_format).publish(md_file_path, base_name, change_dir=extra_contents_path,
+                                                 pandoc_debug_str=pandoc_debug_str)
+
+
+def get_external_content_formats(overload_settings=False):
+    """
+    :param overload_settings: include the PDF format even when settings ask for PDF not to be published
+    :return: the formats of the static files generated from the bundled markdown file
+    :rtype: list
+    """
+    excluded = ['watchdog']
     if not ZDS_APP['content']['build_pdf_when_published'] and not overload_settings:
         excluded.append('pdf')
-    for __, publicator in PublicatorRegistery.get_all_registered(excluded):
+    return [name for name, __ in PublicatorRegistery.get_all_registered(excluded)]
+
 
-        publicator.publish(md_file_path, base_name, change_dir=extra_contents_path, pandoc_debug_str=pandoc_debug_str)
+def reuse_external_content(public_version, base_name, md_file_path, overload_settings=False):
+    """
+    copy the static files generated for the previous publication of a content, if its markdown file did not change
+
+    :param public_version: the previous publication
+    :type public_version: zds.tutorialv2.models.models_database.PublishedContent
+    :param base_name: base name of the new files (without extension)
+    :param md_file_path: new bundled markdown file path
+    :param overload_settings: same meaning as for ``generate_exernal_content()``
+    :return: ``True`` if the files were copied, ``False`` if they have to be generated
+    :rtype: bool
+    """
+    previous_base_name = os.path.join(public_version.get_extra_contents_directory(),
+                                      public_version.content_public_slug)
+    if not os.path.isfile(previous_base_name + '.md') or \
+            compute_hash([previous_base_name + '.md']) != compute_hash([md_file_path]):
+        return False
+
+    formats = get_external_content_formats(overload_settings)
+
+    if not all(os.path.isfile(previous_base_name + '.' + _format) for _format in formats):
+        return False
+
+    for _format in formats:
+        shutil.copyfile(previous_base_name + '.' + _format, base_name + '.' + _format)
+    return True
 
 
 class PublicatorRegistery:
@@ -235,6 +316,7 @@ class Publicator:
         :param md_file_path: base markdown file path
         :param base_name: file name without extension
         :param kwargs: other publicator dependant options
+        :return: the exit code of the generation, if any
         """
         raise NotImplemented()
 
@@ -261,11 +343,12 @@ class PandocPublicator(Publicator):
         :param change_dir: directory in wich pandoc commands will be executed
         :param pandoc_debug_str: end of command to allow debugging
         :param kwargs: othe publicator dependant options ignored by this one
-        :return:
+        :return: the exit code of pandoc
+        :rtype: int
         """
         if self.pandoc_pdf_param:
             self.__logger.debug('Started {} generation'.format(base_name + '.' + self.format))
-            subprocess.call(
+            exit_code = subprocess.call(
                 self.pandoc_loc + 'pandoc ' + self.pandoc_pdf_param + ' ' + md_file_path + ' -o ' +
                 base_name + '.' + self.format + ' ' + pandoc_debug_str,
                 shell=True,
@@ -273,12 +356,13 @@ class PandocPublicator(Publicator):
             self.__logger.info('Finished {} generation'.format(base_name + '.' + self.format))
         else:
             self.__logger.debug('Started {} generation'.format(base_name + '.' + self.format))
-            subprocess.call(
+            exit_code = subprocess.call(
                 self.pandoc_loc + 'pandoc -s -S --toc ' + md_file_path + ' -o ' +
                 base_name + '.' + self.format + ' ' + pandoc_debug_str,
                 shell=True,
                 cwd=change_dir)
             self.__logger.info('Finished {} generation'.format(base_name + '.' + self.format))
+        return exit_code
 
 
 @PublicatorRegistery.register('watchdog', settings.ZDS_APP['content']['extra_content_watchdog_dir'])
@@ -301,6 +385,45 @@ class WatchdogFilePublicator(Publicator):
         self.__logger.debug('Registered {} for generation'.format(md_file_path))
 
 
+def run_publication_job(job):
+    """Generate the extra content requested by a claimed ``PublicationJob``, then record the result.
+
+    The file is generated in a temporary directory and moved to its final place only if the generation succeeded, so
+    that the previous file (if any) is served until then.
+
+    :param job: the job
+    :type job: zds.tutorialv2.models.models_database.PublicationJob
+    """
+    extra_contents_path = os.path.dirname(job.base_name)
+    build_dir = os.path.join(extra_contents_path, '__building_' + job.format_requested)
+    build_base_name = os.path.join(build_dir, os.path.basename(job.base_name))
+    output_path = build_base_name + '.' + job.format_requested
+
+    pandoc_debug_str = ''
+    if settings.PANDOC_LOG_STATE:
+        pandoc_debug_str = ' 2>&1 | tee -a ' + settings.PANDOC_LOG
+
+    exit_code = None
+    error = ''
+    start = time.time()
+    try:
+        if not os.path.isdir(build_dir):
+            os.makedirs(build_dir)
+        exit_code = PublicatorRegistery.get(job.format_requested).publish(
+            job.md_file_path, build_base_name, change_dir=extra_contents_path, pandoc_debug_str=pandoc_debug_str)
+        if exit_code == 0 and os.path.isfile(output_path):
+            os.rename(output_path, job.base_name + '.' + job.format_requested)
+        else:
+            error = u'{} was not generated (exit code: {})'.format(output_path, exit_code)
+    except Exception as e:  # the worker must survive anything
+        logger.exception('unable to run %s', job)
+        error = u'{}: {}'.format(type(e).__name__, e)
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+
+    job.finish(exit_code, time.time() - start, error)
+
+
 class FailureDuringPublication(Exception):
     """Exception raised if something goes wrong during publication process
     """
@@ -309,24 +432,159 @@ class FailureDuringPublication(Exception):
         super(FailureDuringPublication, self).__init__(*args, **kwargs)
 
 
-def publish_container(db_object, base_dir, container):
+def publish_container(db_object, base_dir, container, workers=None, previous_dir=None):
     """ 'Publish' a given container, in a recursive way
 
+    The render jobs are first collected from the whole tree (which also patches the manifest), then rendered, either
+    one after the other or by a pool of ``workers`` processes, and finally written. Both ways give the same files.
+
+    The fingerprint of each rendered file is saved in ``base_dir``. If ``previous_dir`` is the directory of a previous
+    publication, the files whose fingerprint did not change are copied from it instead of being rendered again.
+
+    :param db_object: database representation of the content
+    :type db_object: PublishableContent
+    :param base_dir: directory of the top container
+    :type base_dir: str
+    :param container: a given container
+    :type container: Container
+    :param workers: number of processes used to render the containers (default to the \
+    ``ZDS_APP['content']['publication_workers']`` setting), the rendering is done in the current process if lower than 2
+    :type workers: int
+    :param previous_dir: directory of the previous publication of this content, if any
+    :type previous_dir: str
+    :raise FailureDuringPublication: if anything goes wrong
+    :return: the time spent to render each file, as a list of (path relative to ``base_dir``, seconds). Files copied \
+    from ``previous_dir`` are not listed.
+    :rtype: list
+    """
+
+    if workers is None:
+        workers = settings.ZDS_APP['content']['publication_workers']
+
+    previous_fingerprints = {}
+    if previous_dir:
+        try:
+            with open(os.path.join(previous_dir, RENDER_FINGERPRINTS_FILE), 'r') as fingerprints_file:
+                previous_fingerprints = json_handler.load(fingerprints_file)
+        except (IOError, ValueError):
+            previous_fingerprints = {}
+
+    jobs = collect_container_render_jobs(db_object, base_dir, container, previous_dir=previous_dir,
+                                         previous_fingerprints=previous_fingerprints)
+
+    fingerprints = {}
+    to_render = []
+    for job in jobs:
+        if job['fingerprint']:
+            fingerprints[job['path']] = job['fingerprint']
+        if job['reuse']:
+            shutil.copyfile(os.path.join(previous_dir, job['path']), os.path.join(base_dir, job['path']))
+        else:
+            to_render.append(job)
+
+    if workers > 1 and len(to_render) > 1:
+        pool = multiprocessing.Pool(min(workers, len(to_render)), initializer=init_publication_worker)
+        try:
+            results = pool.map(render_publication_job, to_render)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = map(render_publication_job, to_render)
+
+    timings = []
+    for job, (parsed, duration) in zip(to_render, results):
+        try:
+            with codecs.open(os.path.join(base_dir, job['path']), 'w', encoding='utf-8') as f:
+                f.write(parsed)
+        except (UnicodeError, UnicodeEncodeError):
+            if job['kind'] == 'introduction':
+                message = _(u"Une erreur est survenue durant la publication de l'introduction de « {} »,"
+                            u' vérifiez le code markdown')
+            elif job['kind'] == 'conclusion':
+                message = _(u'Une erreur est survenue durant la publication de la conclusion de « {} »,'
+                            u' vérifiez le code markdown')
+            else:
+                message = _(u'Une erreur est survenue durant la publication de « {} », vérifiez le code markdown')
+            raise FailureDuringPublication(message.format(job['title']))
+
+        logger.debug('%s rendered in %.3fs', job['path'], duration)
+        timings.append((job['path'], duration))
+
+    with open(os.path.join(base_dir, RENDER_FINGERPRINTS_FILE), 'w') as fingerprints_file:
+        json_handler.dump(fingerprints, fingerprints_file)
+
+    return timings
+
+
+def get_render_fingerprint(*sources):
+    """Compute the fingerprint of a rendered file from everything it is rendered from.
+
+    :param sources: JSON serializable scalar values (paths, blob shas, titles...)
+    :return: the fingerprint, or ``None`` if one of the sources is unknown
+    :rtype: str
+    """
+    if any(source is None for source in sources):
+        return None
+    sources = (get_renderer_version(),) + sources
+    return hashlib.sha1(json_handler.dumps(sources, sort_keys=True)).hexdigest()
+
+
+def collect_container_render_jobs(db_object, base_dir, container, jobs=None, previous_dir=None,
+                                  previous_fingerprints=None):
+    """Walk a container tree and list what has to be rendered to publish it.
+
+    The texts are read from the repository while walking, then the container is altered as in the published manifest
+    (the paths of the rendered files replace the introductions and conclusions, and the texts of the extracts are
+    removed). The directories are created as well.
+
+    Each job is a dictionary with a ``kind`` (``'chapter'``, ``'introduction'`` or ``'conclusion'``), the ``path`` of
+    the file to write (relative to ``base_dir``), the ``title`` of the container, its ``fingerprint`` (computed from
+    the shas of the blobs it is rendered from) and what is needed to render it without accessing the repository.
+    If the same file of ``previous_dir`` has the same fingerprint, ``reuse`` is set and the texts are not read.
+
     :param db_object: database representation of the content
     :type db_object: PublishableContent
     :param base_dir: directory of the top container
     :type base_dir: str
     :param container: a given container
     :type container: Container
+    :param jobs: list to which the jobs are appended
+    :param previous_dir: directory of the previous publication of this content, if any
+    :type previous_dir: str
+    :param previous_fingerprints: fingerprints of the files of the previous publication
+    :type previous_fingerprints: dict
     :raise FailureDuringPublication: if anything goes wrong
+    :return: the jobs
+    :rtype: list
     """
 
     from zds.tutorialv2.models.models_versioned import Container
 
+    if jobs is None:
+        jobs = []
+    if previous_fingerprints is None:
+        previous_fingerprints = {}
+
     if not isinstance(container, Container):
         raise FailureDuringPublication(_(u"Le conteneur n'en est pas un !"))
 
-    template = 'tutorialv2/export/chapter.html'
+    top_container = container.top_container()
+    tree = None
+    if top_container.repository is not None:
+        tree = top_container.repository.commit(top_container.current_version).tree
+
+    def blob_sha(path):
+        if not path:
+            return ''
+        if tree is None:
+            return None
+        return get_blob_sha(tree, path)
+
+    def can_reuse(path, fingerprint):
+        if fingerprint is None or previous_fingerprints.get(path) != fingerprint:
+            return False
+        return os.path.isfile(os.path.join(previous_dir, path))
 
     # jsFiddle support
     if db_object.js_support:
@@ -340,17 +598,40 @@ def publish_container(db_object, base_dir, container):
         os.makedirs(current_dir)
 
     if container.has_extracts():  # the container can be rendered in one template
-        parsed = render_to_string(template, {'container': container, 'is_js': is_js})
-        f = codecs.open(os.path.join(base_dir, container.get_prod_path(relative=True)), 'w', encoding='utf-8')
-
-        try:
-            f.write(parsed)
-        except (UnicodeError, UnicodeEncodeError):
-            raise FailureDuringPublication(
-                _(u'Une erreur est survenue durant la publication de « {} », vérifiez le code markdown')
-                .format(container.title))
-
-        f.close()
+        path = container.get_prod_path(relative=True)
+        fingerprint = get_render_fingerprint(
+            'chapter', is_js,
+            container.introduction or '', blob_sha(container.introduction),
+            container.conclusion or '', blob_sha(container.conclusion),
+            *chain.from_iterable(
+                [extract.position_in_parent, extract.slug, extract.title, extract.text or '', blob_sha(extract.text)]
+                for extract in container.children))
+        job = {
+            'kind': 'chapter',
+            'path': path,
+            'title': container.title,
+            'fingerprint': fingerprint,
+            'reuse': can_reuse(path, fingerprint),
+        }
+
+        if not job['reuse']:
+            # this is what the template uses from the container, with the texts already read from the repository
+            context_container = {
+                'introduction': container.introduction,
+                'get_introduction': container.get_introduction(),
+                'conclusion': container.conclusion,
+                'get_conclusion': container.get_conclusion(),
+                'children': [{
+                    'position_in_parent': extract.position_in_parent,
+                    'slug': extract.slug,
+                    'title': extract.title,
+                    'text': extract.text,
+                    'get_text': extract.get_text(),
+                } for extract in container.children],
+            }
+            job['context'] = {'container': context_container, 'is_js': is_js}
+
+        jobs.append(job)
 
         for extract in container.children:
             extract.text = None
@@ -367,32 +648,69 @@ def publish_container(db_object, base_dir, container):
 
         if container.introduction:
             path = os.path.join(container.get_prod_path(relative=True), 'introduction.html')
-            f = codecs.open(os.path.join(base_dir, path), 'w', encoding='utf-8')
-
-            try:
-                f.write(emarkdown(container.get_introduction(), db_object.js_support))
-            except (UnicodeError, UnicodeEncodeError):
-                raise FailureDuringPublication(
-                    _(u"Une erreur est survenue durant la publication de l'introduction de « {} »,"
-                      u' vérifiez le code markdown').format(container.title))
-
+            fingerprint = get_render_fingerprint(
+                'introduction', db_object.js_support, container.introduction, blob_sha(container.introduction))
+            job = {
+                'kind': 'introduction',
+                'path': path,
+                'title': container.title,
+                'fingerprint': fingerprint,
+                'reuse': can_reuse(path, fingerprint),
+                'js_support': db_object.js_support,
+            }
+            if not job['reuse']:
+                job['text'] = container.get_introduction()
+            jobs.append(job)
             container.introduction = path
 
         if container.conclusion:
             path = os.path.join(container.get_prod_path(relative=True), 'conclusion.html')
-            f = codecs.open(os.path.join(base_dir, path), 'w', encoding='utf-8')
-
-            try:
-                f.write(emarkdown(container.get_conclusion(), db_object.js_support))
-            except (UnicodeError, UnicodeEncodeError):
-                raise FailureDuringPublication(
-                    _(u'Une erreur est survenue durant la publication de la conclusion de « {} »,'
-                      u' vérifiez le code markdown').format(container.title))
-
+            fingerprint = get_render_fingerprint(
+                'conclusion', db_object.js_support, container.conclusion, blob_sha(container.conclusion))
+            job = {
+                'kind': 'conclusion',
+                'path': path,
+                'title': container.title,
+                'fingerprint': fingerprint,
+                'reuse': can_reuse(path, fingerprint),
+                'js_support': db_object.js_support,
+            }
+            if not job['reuse']:
+                job['text'] = container.get_conclusion()
+            jobs.append(job)
             container.conclusion = path
 
         for child in container.children:
-            publish_container(db_object, base_dir, child)
+            collect_container_render_jobs(db_object, base_dir, child, jobs, previous_dir, previous_fingerprints)
+
+    return jobs
+
+
+def render_publication_job(job):
+    """Render a job collected by ``collect_container_render_jobs()``.
+
+    :param job: the job
+    :type job: dict
+    :return: the rendered HTML and the time spent to render it, in seconds
+    :rtype: tuple
+    """
+
+    start = time.time()
+    if job['kind'] == 'chapter':
+        parsed = render_to_string('tutorialv2/export/chapter.html', job['context'])
+    else:
+        parsed = emarkdown(job['text'], job['js_support'])
+    return parsed, time.time() - start
+
+
+def init_publication_worker():
+    """Initialize a process of the pool used by ``publish_container()``.
+
+    The connections to the cache are inherited from the parent process and must not be shared with it, so the
+    markdown render cache is disabled in the workers (a content is rendered once per publication anyway).
+    """
+
+    settings.ZDS_APP['markdown']['render_cache_enabled'] = False
 
 
 def make_zip_file(published_content):
@@ -406,11 +724,10 @@ def make_zip_file(published_content):
     publishable.sha_public = publishable.sha_draft  # ensure sha update so that archive is updated to
     path = os.path.join(published_content.get_extra_contents_directory(),
                         published_content.content_public_slug + '.zip')
-    zip_file = zipfile.ZipFile(path, 'w')
     versioned = publishable.load_version(None, True)
-    from zds.tutorialv2.views.views_contents import DownloadContent
-    DownloadContent.insert_into_zip(zip_file, versioned.repository.commit(versioned.current_version).tree)
-    zip_file.close()
+    with open(path, 'wb') as zip_file:
+        for chunk in iter_zip_archive(versioned.repository.commit(versioned.current_version).tree):
+            zip_file.write(chunk)
 
 
 def unpublish_content(db_object):
@@ -7,6 +7,7 @@ import shutil
 from django.conf import settings
 from django.test import TestCase
 from django.test.utils import override_settings
+from mock import patch
 
 from zds.gallery.models import UserGallery
 from zds.settings import BASE_DIR
@@ -70,6 +71,25 @@ class ContentTests(TestCase):
         self.assertTrue(self.part1.slug in versioned.children_dict.keys())
         self.assertTrue(self.chapter1.slug in versioned.children_dict[self.part1.slug].children_dict)
 
+    def test_load_version_cache(self):
+        """
+        Ensure that a version is parsed once, and that each call gets its own copy
+        """
+        versioned = self.tuto.load_version()
+
+        with patch('zds.tutorialv2.models.models_database.get_content_from_json') as get_content_from_json:
+            other = self.tuto.load_version()
+            self.assertFalse(get_content_from_json.called)
+
+        self.assertIsNot(versioned, other)
+        self.assertIsNot(versioned.children[0], other.children[0])
+        self.assertEqual(versioned.children[0].title, other.children[0].title)
+        self.assertIsNotNone(other.repository)
+
+        # altering a copy does not alter the cached version
+        other.children[0].title = u'Un autre titre'
+        self.assertEqual(self.part1.title, self.tuto.load_version().children[0].title)
+
     def test_ensure_unique_slug(self):
         """
         Ensure that slugs for a container or extract are always unique
@@ -555,6 +575,25 @@ class ContentTests(TestCase):
         published = PublishedContent.objects.filter(content=tuto).first()
         self.assertEqual(published.get_char_count(), 335 + len_date_now)
 
+    def test_neighbours_of_published_content(self):
+        """The neighbours of an article are the articles of same type published just before and after it"""
+
+        articles = [PublishedContentFactory(type='ARTICLE').public_version for _ in range(3)]
+        PublishedContentFactory(type='TUTORIAL')
+        now = datetime.now()
+        for article, publication_date in zip(articles, [now - timedelta(days=1), now, now]):
+            article.publication_date = publication_date
+            article.save()
+
+        self.assertEqual((None, articles[1]), PublishedContent.objects.get_neighbours(articles[0]))
+        # the articles published at the same time are ordered by primary key
+        self.assertEqual((articles[0], articles[2]), PublishedContent.objects.get_neighbours(articles[1]))
+        self.assertEqual((articles[1], None), PublishedContent.objects.get_neighbours(articles[2]))
+
+        articles[1].must_redirect = True
+        articles[1].save()
+        self.assertEqual((articles[0], None), PublishedContent.objects.get_neighbours(articles[2]))
+
     def test_ensure_gallery(self):
         content = PublishedContentFactory()
         content.authors.add(ProfileFactory().user)
@@ -4,6 +4,7 @@ import os
 import shutil
 import tempfile
 import datetime
+from StringIO import StringIO
 
 from django.conf import settings
 from django.test import TestCase
@@ -19,8 +20,10 @@ from zds.tutorialv2.models.models_versioned import Container
 from zds.tutorialv2.utils import get_target_tagged_tree_for_container, \
     get_target_tagged_tree_for_extract, retrieve_and_update_images_links, last_participation_is_old, \
     InvalidSlugError, BadManifestError, get_content_from_json, get_commit_author, slugify_raise_on_invalid, check_slug
-from zds.tutorialv2.publication_utils import publish_content, unpublish_content
-from zds.tutorialv2.models.models_database import PublishableContent, PublishedContent, ContentReaction, ContentRead
+from zds.tutorialv2.publication_utils import publish_content, unpublish_content, publish_container, \
+    run_publication_job
+from zds.tutorialv2.models.models_database import PublishableContent, PublishedContent, ContentReaction, \
+    ContentRead, PublicationJob
 from django.core.management import call_command
 from zds.tutorialv2.publication_utils import Publicator, PublicatorRegistery
 from watchdog.events import FileCreatedEvent
@@ -259,6 +262,74 @@ class UtilsTests(TestCase):
                 self.assertIsNone(chapter.introduction)
                 self.assertIsNone(chapter.conclusion)
 
+    def test_publish_container_in_parallel(self):
+        """ensure that rendering the containers in a pool of processes gives the same files"""
+
+        part2 = ContainerFactory(parent=self.tuto_draft, db_object=self.tuto)
+        for part in [self.part1, part2]:
+            for __ in range(2):
+                chapter = ContainerFactory(parent=part, db_object=self.tuto)
+                ExtractFactory(container=chapter, db_object=self.tuto)
+                ExtractFactory(container=chapter, db_object=self.tuto)
+
+        tuto = PublishableContent.objects.get(pk=self.tuto.pk)
+        serial_dir = tempfile.mkdtemp()
+        parallel_dir = tempfile.mkdtemp()
+
+        serial_version = tuto.load_version()
+        serial_timings = publish_container(tuto, serial_dir, serial_version, workers=0)
+        parallel_version = tuto.load_version()
+        parallel_timings = publish_container(tuto, parallel_dir, parallel_version, workers=2)
+
+        # same files, with the same content
+        self.assertEqual([path for path, __ in serial_timings], [path for path, __ in parallel_timings])
+        for path, __ in serial_timings:
+            with open(os.path.join(serial_dir, path), 'rb') as serial_file:
+                with open(os.path.join(parallel_dir, path), 'rb') as parallel_file:
+                    self.assertEqual(serial_file.read(), parallel_file.read())
+
+        # and the same manifest
+        self.assertEqual(serial_version.get_json(), parallel_version.get_json())
+
+        shutil.rmtree(serial_dir)
+        shutil.rmtree(parallel_dir)
+
+    def test_publish_container_incrementally(self):
+        """ensure that only the containers which changed are rendered again"""
+
+        extract1 = ExtractFactory(container=self.chapter1, db_object=self.tuto)
+        chapter2 = ContainerFactory(parent=self.part1, db_object=self.tuto)
+        ExtractFactory(container=chapter2, db_object=self.tuto)
+
+        tuto = PublishableContent.objects.get(pk=self.tuto.pk)
+        previous_dir = tempfile.mkdtemp()
+        previous_timings = publish_container(tuto, previous_dir, tuto.load_version(), previous_dir=None)
+        self.assertTrue(os.path.isfile(os.path.join(previous_dir, 'fingerprints.json')))
+
+        # nothing changed: everything is reused
+        same_dir = tempfile.mkdtemp()
+        self.assertEqual(publish_container(tuto, same_dir, tuto.load_version(), previous_dir=previous_dir), [])
+        for path, __ in previous_timings:
+            self.assertTrue(os.path.isfile(os.path.join(same_dir, path)))
+
+        # update a single extract: only its chapter is rendered again
+        versioned = tuto.load_version()
+        extract = versioned.children[0].children[0].children[0]
+        self.assertEqual(extract.slug, extract1.slug)
+        tuto.sha_draft = extract.repo_update(extract.title, u'Un **nouveau** texte')
+        tuto.save()
+
+        new_dir = tempfile.mkdtemp()
+        new_version = tuto.load_version()
+        chapter1_path = new_version.children[0].children[0].get_prod_path(relative=True)
+        timings = publish_container(tuto, new_dir, new_version, previous_dir=previous_dir)
+        self.assertEqual([path for path, __ in timings], [chapter1_path])
+        with open(os.path.join(new_dir, chapter1_path)) as chapter_file:
+            self.assertIn('<strong>nouveau</strong>', chapter_file.read())
+
+        for directory in [previous_dir, same_dir, new_dir]:
+            shutil.rmtree(directory)
+
     def test_tagged_tree_extract(self):
         midsize = PublishableContentFactory(author_list=[self.user_author])
         midsize_draft = midsize.load_version()
@@ -424,6 +495,24 @@ class UtilsTests(TestCase):
         self.assertFalse(os.path.exists(pdf_path))
         self.assertFalse(os.path.exists(pdf_path2))  # so no PDF is generated !
 
+        # 4. only re-generate the PDFs whose markdown changed
+        call_command('generate_pdf', 'id={}'.format(tuto.pk))
+        out = StringIO()
+        call_command('generate_pdf', 'id={}'.format(tuto.pk), changed_only=True, stdout=out)
+        self.assertIn('[SKIPPED]', out.getvalue())
+        self.assertTrue(os.path.exists(pdf_path))
+
+        # 5. resume an interrupted run
+        checkpoint_path = os.path.join(tempfile.mkdtemp(), 'checkpoint')
+        with open(checkpoint_path, 'w') as checkpoint_file:
+            checkpoint_file.write('{}\n'.format(tuto.pk))
+        os.remove(pdf_path)
+        call_command('generate_pdf', checkpoint=checkpoint_path, jobs=2)
+        self.assertFalse(os.path.exists(pdf_path))  # already handled by the "previous" run
+        self.assertTrue(os.path.exists(pdf_path2))
+        self.assertFalse(os.path.exists(checkpoint_path))  # the run is over
+        shutil.rmtree(os.path.dirname(checkpoint_path))
+
     def test_last_participation_is_old(self):
         article = PublishedContentFactory(author_list=[self.user_author], type='ARTICLE')
         new_user = ProfileFactory().user
@@ -571,6 +660,62 @@ class UtilsTests(TestCase):
         handler.prepare_generation.assert_called_with('/path/to')
         os.remove('path')
 
+    def test_publication_queue(self):
+        """ensure that the extra contents are queued then generated by ``run_publication_job()``"""
+
+        PublicatorRegistery.unregister('pdf')
+        PublicatorRegistery.unregister('epub')
+        PublicatorRegistery.unregister('html')
+
+        @PublicatorRegistery.register('test', '', '')
+        class TestPublicator(Publicator):
+            exit_code = 0
+
+            def __init__(self, *__):
+                pass
+
+            def publish(self, md_file_path, base_name, **kwargs):
+                if self.exit_code == 0:
+                    with open(base_name + '.test', 'w') as f:
+                        f.write('generated')
+                return self.exit_code
+
+        ExtractFactory(container=self.chapter1, db_object=self.tuto)
+        tuto = PublishableContent.objects.get(pk=self.tuto.pk)
+
+        settings.ZDS_APP['content']['extra_content_generation_policy'] = 'QUEUE'
+        try:
+            published = publish_content(tuto, tuto.load_version())
+        finally:
+            settings.ZDS_APP['content']['extra_content_generation_policy'] = 'SYNC'
+
+        self.assertEqual(PublicationJob.objects.filter(published_object=published).count(), 1)
+        generated_path = os.path.join(published.get_extra_contents_directory(), published.content_public_slug + '.test')
+        self.assertFalse(os.path.isfile(generated_path))
+
+        # a failed generation is queued again, later
+        PublicatorRegistery.get('test').exit_code = 1
+        job = PublicationJob.objects.claim(10)[0]
+        self.assertEqual(PublicationJob.objects.claim(10), [])  # already running
+        run_publication_job(job)
+        job = PublicationJob.objects.get(pk=job.pk)
+        self.assertEqual(job.state, 'QUEUED')
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.next_attempt_date, datetime.datetime.now())
+        self.assertEqual(PublicationJob.objects.claim(10), [])
+        self.assertFalse(os.path.isfile(generated_path))
+
+        # then succeed
+        PublicatorRegistery.get('test').exit_code = 0
+        PublicationJob.objects.update(next_attempt_date=datetime.datetime.now())
+        job = PublicationJob.objects.claim(10)[0]
+        run_publication_job(job)
+        job = PublicationJob.objects.get(pk=job.pk)
+        self.assertEqual(job.state, 'SUCCESS')
+        self.assertEqual(job.attempts, 2)
+        self.assertTrue(os.path.isfile(generated_path))
+        self.assertFalse(os.path.isdir(os.path.join(published.get_extra_contents_directory(), '__building_test')))
+
     def test_adjust_char_count(self):
         """Test the `adjust_char_count` command"""
 
@@ -1,5 +1,6 @@
 # coding: utf-8
 import datetime
+from StringIO import StringIO
 import shutil
 import tempfile
 import zipfile
@@ -29,6 +30,7 @@ from zds.tutorialv2.factories import PublishableContentFactory, ContainerFactory
 from zds.tutorialv2.models.models_database import PublishableContent, Validation, PublishedContent, ContentReaction, \
     ContentRead
 from zds.tutorialv2.publication_utils import publish_content, Publicator, PublicatorRegistery
+from zds.tutorialv2.utils import archive_cache
 from zds.utils.models import HelpWriting, Alert, Tag
 from zds.utils.factories import HelpWritingFactory
 from zds.utils.templatetags.interventions import interventions_topics
@@ -1394,7 +1396,7 @@ class ContentTests(TestCase):
         self.assertEqual(result.status_code, 200)
         draft_zip_path = os.path.join(tempfile.gettempdir(), '__draft1.zip')
         f = open(draft_zip_path, 'w')
-        f.write(result.content)
+        f.write(b''.join(result.streaming_content))
         f.close()
 
         versioned = PublishableContent.objects.get(pk=tuto_pk).load_version()
@@ -1448,7 +1450,7 @@ class ContentTests(TestCase):
         self.assertEqual(result.status_code, 200)
         draft_zip_path_2 = os.path.join(tempfile.gettempdir(), '__draft2.zip')
         f = open(draft_zip_path_2, 'w')
-        f.write(result.content)
+        f.write(b''.join(result.streaming_content))
         f.close()
 
         versioned = PublishableContent.objects.get(pk=tuto_pk).load_version()
@@ -1476,7 +1478,7 @@ class ContentTests(TestCase):
         self.assertEqual(result.status_code, 200)
         draft_zip_path_3 = os.path.join(tempfile.gettempdir(), '__draft3.zip')
         f = open(draft_zip_path_3, 'w')
-        f.write(result.content)
+        f.write(b''.join(result.streaming_content))
         f.close()
 
         archive = zipfile.ZipFile(draft_zip_path_3, 'r')
@@ -1569,7 +1571,7 @@ class ContentTests(TestCase):
         self.assertEqual(result.status_code, 200)
         draft_zip_path = os.path.join(tempfile.gettempdir(), '__draft1.zip')
         f = open(draft_zip_path, 'w')
-        f.write(result.content)
+        f.write(b''.join(result.streaming_content))
         f.close()
 
         first_version = PublishableContent.objects.get(pk=tuto_pk).load_version()
@@ -1705,7 +1707,7 @@ class ContentTests(TestCase):
         self.assertEqual(result.status_code, 200)
         draft_zip_path = os.path.join(tempfile.gettempdir(), '__draft1.zip')
         f = open(draft_zip_path, 'w')
-        f.write(result.content)
+        f.write(b''.join(result.streaming_content))
         f.close()
 
         first_version = PublishableContent.objects.get(pk=tuto_pk).load_version()
@@ -1819,7 +1821,7 @@ class ContentTests(TestCase):
         self.assertEqual(result.status_code, 200)
         draft_zip_path = os.path.join(tempfile.gettempdir(), '__draft1.zip')
         f = open(draft_zip_path, 'w')
-        f.write(result.content)
+        f.write(b''.join(result.streaming_content))
         f.close()
 
         # create the archive with images:
@@ -4088,6 +4090,35 @@ class ContentTests(TestCase):
             self.assertNotEqual(PublishableContent.objects.all().count(), prev_count)
             prev_count += 1
 
+    def test_download_zip_cache(self):
+        """ensure that the archive of a version is streamed, then served from the cache"""
+
+        self.assertEqual(
+            self.client.login(
+                username=self.user_author.username,
+                password='hostel77'),
+            True)
+
+        versioned = PublishableContent.objects.get(pk=self.tuto.pk).load_version()
+        cached_path = archive_cache.get_file_path(self.tuto.pk, versioned.current_version)
+        self.assertFalse(os.path.exists(cached_path))
+
+        result = self.client.get(reverse('content:download-zip', args=[self.tuto.pk, self.tuto.slug]))
+        self.assertEqual(result.status_code, 200)
+        self.assertTrue(result.streaming)
+        content = b''.join(result.streaming_content)
+        self.assertTrue(os.path.exists(cached_path))
+
+        archive = zipfile.ZipFile(StringIO(content), 'r')
+        self.assertEqual(unicode(archive.read('manifest.json'), 'utf-8'), versioned.get_json())
+        archive.getinfo(self.extract1.text)  # raises KeyError if missing
+
+        # the second download is the cached file
+        os.utime(cached_path, (0, 0))
+        result = self.client.get(reverse('content:download-zip', args=[self.tuto.pk, self.tuto.slug]))
+        self.assertEqual(b''.join(result.streaming_content), content)
+        self.assertEqual(os.path.getmtime(cached_path), 0)  # not built again
+
     def tearDown(self):
 
         if os.path.isdir(settings.ZDS_APP['content']['repo_private_path']):
@@ -4096,6 +4127,7 @@ class ContentTests(TestCase):
             shutil.rmtree(settings.ZDS_APP['content']['repo_public_path'])
         if os.path.isdir(settings.MEDIA_ROOT):
             shutil.rmtree(settings.MEDIA_ROOT)
+        archive_cache.clear()
 
         # re-activate PDF build
         settings.ZDS_APP['content']['build_pdf_when_published'] = True
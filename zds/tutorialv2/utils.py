@@ -1,5 +1,10 @@
 # coding: utf-8
+import cPickle as pickle
+import hashlib
+import logging
 import shutil
+import tempfile
+import zipfile
 from collections import OrderedDict
 from datetime import datetime
 from urllib import urlretrieve
@@ -24,8 +29,11 @@ from zds.tutorialv2 import REPLACE_IMAGE_PATTERN, VALID_SLUG
 from zds.tutorialv2.models import CONTENT_TYPE_LIST
 from zds.utils import get_current_user
 from zds.utils import slugify as old_slugify
+from zds.utils.cache import LRUCache
 from zds.utils.models import Licence
 
+logger = logging.getLogger(__name__)
+
 
 def all_is_string_appart_from_children(dict_representation):
     """check all keys are string appart from the children key
@@ -592,6 +600,247 @@ def get_content_from_json(json, sha, slug_last_draft, public=False, max_title_le
     return versioned
 
 
+class VersionedContentCache(object):
+    """Cache of the trees built by ``get_content_from_json()``, used by ``PublishableContent.load_version()``.
+
+    Since a sha is immutable, a tree is cached with a key built from the content pk, the sha and the public flag.
+    Trees are stored pickled, in an in-process LRU and, if ``directory`` is set, on disk. Every call to ``get()``
+    unpickles a new copy, so that the caller can alter it (or insert database information in it) freely.
+
+    The git repository of a draft version is not stored: it is up to the caller to open it again.
+    """
+
+    def __init__(self, max_size, directory=None):
+        self.local = LRUCache(max_size)
+        self.directory = directory
+
+    @staticmethod
+    def get_key(pk, sha, public, *extra):
+        """
+        :param pk: pk of the content
+        :param sha: version
+        :param public: `True` if the tree comes from the public repository
+        :param extra: anything else the tree depends on (slugs, modification time of the manifest...)
+        :rtype: str
+        """
+        return u':'.join([str(pk), sha, str(int(bool(public)))] + [unicode(e) for e in extra]).encode('utf-8')
+
+    def get_file_path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key).hexdigest() + '.pickle')
+
+    def get(self, key):
+        """
+        :param key: a key built by ``get_key()``
+        :return: a new copy of the cached tree, or `None`
+        :rtype: zds.tutorialv2.models.models_versioned.VersionedContent
+        """
+        data = self.local.get(key)
+        if data is None and self.directory:
+            try:
+                with open(self.get_file_path(key), 'rb') as cached_file:
+                    data = cached_file.read()
+            except IOError:
+                pass
+            else:
+                self.local.set(key, data)
+
+        if data is None:
+            return None
+
+        try:
+            return pickle.loads(data)
+        except Exception:  # corrupted file: forget about it
+            logger.warning('unable to load the cached version %s', key, exc_info=True)
+            self.delete(key)
+            return None
+
+    def set(self, key, versioned):
+        """
+        :param key: a key built by ``get_key()``
+        :param versioned: the tree to cache
+        :type versioned: zds.tutorialv2.models.models_versioned.VersionedContent
+        """
+        repository = versioned.repository
+        versioned.repository = None
+        try:
+            data = pickle.dumps(versioned, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError):
+            logger.warning('unable to cache the version %s', key, exc_info=True)
+            return
+        finally:
+            versioned.repository = repository
+
+        self.local.set(key, data)
+        if self.directory:
+            try:
+                if not os.path.isdir(self.directory):
+                    os.makedirs(self.directory)
+                # write then rename, so that another process never reads a partial file
+                handle, temporary_path = tempfile.mkstemp(dir=self.directory)
+                with os.fdopen(handle, 'wb') as cached_file:
+                    cached_file.write(data)
+                os.rename(temporary_path, self.get_file_path(key))
+            except (IOError, OSError):
+                logger.warning('unable to write the version %s on disk', key, exc_info=True)
+
+    def delete(self, key):
+        self.local.delete(key)
+        if self.directory:
+            try:
+                os.remove(self.get_file_path(key))
+            except OSError:
+                pass
+
+    def clear(self):
+        self.local.clear()
+        if self.directory and os.path.isdir(self.directory):
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+versioned_content_cache = VersionedContentCache(settings.ZDS_APP['content']['versions_cache_size'],
+                                                settings.ZDS_APP['content']['versions_cache_dir'])
+
+
+class ZipStream(object):
+    """
+    Write-only file-like object given to ``zipfile.ZipFile``, so that an archive can be sent while it is built: the
+    bytes written since the last call are retrieved with ``pop()``.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(data)
+        self.position += len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_git_tree_blobs(git_tree):
+    """
+    :param git_tree: Git tree (from ``repository.commit(sha).tree``)
+    :return: the blobs of the tree and of its subtrees (the files of a directory come before its subdirectories)
+    """
+    for blob in git_tree.blobs:
+        yield blob
+    for subtree in git_tree.trees:
+        for blob in iter_git_tree_blobs(subtree):
+            yield blob
+
+
+def iter_zip_archive(git_tree):
+    """Build a zip archive of a Git tree, one file at a time, so that only one file is in memory at once.
+
+    :param git_tree: Git tree (from ``repository.commit(sha).tree``)
+    :return: the successive chunks of the archive
+    """
+    stream = ZipStream()
+    zip_file = zipfile.ZipFile(stream, 'w')
+    for blob in iter_git_tree_blobs(git_tree):
+        zip_file.writestr(blob.path, blob.data_stream.read())
+        yield stream.pop()
+    zip_file.close()
+    yield stream.pop()
+
+
+class ArchiveCache(object):
+    """
+    Zip archives of contents, kept on disk by commit: the same version (typically, a beta) is downloaded many times.
+
+    At most ``max_size`` archives are kept, the least recently built ones are removed first. A ``directory`` set to
+    ``None`` disables the cache.
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, directory, max_size=100):
+        self.directory = directory
+        self.max_size = max_size
+
+    def get_file_path(self, content_pk, sha):
+        return os.path.join(self.directory, '{}-{}.zip'.format(content_pk, sha))
+
+    def iter_archive(self, content_pk, sha, git_tree):
+        """
+        :param content_pk: pk of the content
+        :param sha: the commit
+        :param git_tree: Git tree of the commit, used if the archive is not cached yet
+        :return: the successive chunks of the archive
+        """
+        if not self.directory:
+            return iter_zip_archive(git_tree)
+
+        path = self.get_file_path(content_pk, sha)
+        try:
+            cached_file = open(path, 'rb')
+        except IOError:
+            return self.build(path, iter_zip_archive(git_tree))
+        return self.iter_file(cached_file)
+
+    def iter_file(self, cached_file):
+        with cached_file:
+            for chunk in iter(lambda: cached_file.read(self.chunk_size), b''):
+                yield chunk
+
+    def build(self, path, chunks):
+        """Give the chunks back while writing them into the cache. The archive is only added to the cache if every
+        chunk was consumed (the download may be interrupted).
+        """
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            handle, temporary_path = tempfile.mkstemp(dir=self.directory)
+        except (IOError, OSError):
+            logger.warning('unable to cache the archive %s', path, exc_info=True)
+            for chunk in chunks:
+                yield chunk
+            return
+
+        complete = False
+        try:
+            with os.fdopen(handle, 'wb') as cached_file:
+                for chunk in chunks:
+                    cached_file.write(chunk)
+                    yield chunk
+            complete = True
+        finally:
+            if complete:
+                os.rename(temporary_path, path)
+                self.evict()
+            else:
+                os.remove(temporary_path)
+
+    def clear(self):
+        if self.directory and os.path.isdir(self.directory):
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def evict(self):
+        try:
+            paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.zip')]
+            if len(paths) <= self.max_size:
+                return
+            paths.sort(key=os.path.getmtime)
+            for path in paths[:len(paths) - self.max_size]:
+                os.remove(path)
+        except OSError:  # another process may be doing the same thing
+            pass
+
+
+archive_cache = ArchiveCache(settings.ZDS_APP['content']['archives_cache_dir'],
+                             settings.ZDS_APP['content']['archives_cache_size'])
+
+
 class InvalidSlugError(ValueError):
     """ Error raised when a slug is invalid. Argument is the slug that cause the error.
 
@@ -923,6 +1172,22 @@ def get_blob(tree, path):
         return None
 
 
+def get_blob_sha(tree, path):
+    """Return the sha of a given file, without reading it
+
+    :param tree: Git Tree object
+    :type tree: git.objects.tree.Tree
+    :param path: Path to file
+    :type path: str
+    :return: the sha of the blob, or ``None`` if there is no such file
+    :rtype: str
+    """
+    try:
+        return tree.join(os.path.normpath(path)).hexsha
+    except KeyError:
+        return None
+
+
 class BadArchiveError(Exception):
     """ The exception that is raised when a bad archive is sent """
     message = u''
@@ -45,7 +45,7 @@ from zds.tutorialv2.models.models_database import PublishableContent, Validation
 from zds.tutorialv2.models.models_versioned import Container, Extract
 from zds.tutorialv2.utils import search_container_or_404, get_target_tagged_tree, search_extract_or_404, \
     try_adopt_new_child, TooDeepContainerError, BadManifestError, get_content_from_json, init_new_repo, \
-    default_slug_pool, BadArchiveError, InvalidSlugError
+    default_slug_pool, BadArchiveError, InvalidSlugError, archive_cache
 from zds.utils.forums import send_post, lock_topic, create_topic, unlock_topic
 
 from zds.utils.models import HelpWriting
@@ -434,39 +434,17 @@ class DownloadContent(LoggedWithReadWriteHability, SingleContentDownloadViewMixi
     mimetype = 'application/zip'
     only_draft_version = False  # beta version can also be downloaded
     must_be_author = False  # other user can download archive
-
-    @staticmethod
-    def insert_into_zip(zip_file, git_tree):
-        """Recursively add file into zip
-
-        :param zip_file: a ``zipfile`` object (with writing permissions)
-        :param git_tree: Git tree (from ``repository.commit(sha).tree``)
-        """
-        for blob in git_tree.blobs:  # first, add files :
-            zip_file.writestr(blob.path, blob.data_stream.read())
-        if git_tree.trees:  # then, recursively add dirs :
-            for subtree in git_tree.trees:
-                DownloadContent.insert_into_zip(zip_file, subtree)
+    streaming = True
 
     def get_contents(self):
-        """get the zip file stream
+        """get the zip file stream, built while it is sent (or read from the cache of archives)
 
-        :return: a zip file
-        :rtype: byte
+        :return: the successive chunks of a zip file
+        :rtype: iterator
         """
         versioned = self.versioned_object
-
-        # create and fill zip
-        path = self.object.get_repo_path()
-        zip_path = path + self.get_filename()
-        zip_file = zipfile.ZipFile(zip_path, 'w')
-        self.insert_into_zip(zip_file, versioned.repository.commit(versioned.current_version).tree)
-        zip_file.close()
-
-        # return content
-        response = open(zip_path, 'rb').read()
-        os.remove(zip_path)
-        return response
+        return archive_cache.iter_archive(
+            self.object.pk, versioned.current_version, versioned.repository.commit(versioned.current_version).tree)
 
     def get_filename(self):
         return self.get_object().slug + '.zip'
@@ -29,8 +29,10 @@ from zds.tutorialv2.mixins import SingleOnlineContentDetailViewMixin, SingleOnli
 from zds.tutorialv2.models import TYPE_CHOICES_DICT
 from zds.tutorialv2.models.models_database import PublishableContent, PublishedContent, ContentReaction
 from zds.tutorialv2.utils import search_container_or_404, last_participation_is_old, mark_read
-from zds.utils.models import CommentVote, SubCategory, Alert, Tag, CommentEdit
+from zds.utils.models import SubCategory, Alert, Tag, CommentEdit
+from zds.utils.forums import get_messages_context
 from zds.utils.paginator import make_pagination, ZdSPagingListView
+from zds.utils.sendfile import serve_file
 from zds.utils.templatetags.topbar import top_categories_content
 
 logger = logging.getLogger('zds.tutorialv2')
@@ -87,28 +89,10 @@ class DisplayOnlineContent(SingleOnlineContentDetailViewMixin):
         # pagination of articles
         context['paginate_articles'] = False
 
-        if self.object.type == 'ARTICLE':
-            # fetch all articles in order to find the previous and the next one
-            all_articles = \
-                [a for a in PublishedContent.objects
-                    .filter(content_type='ARTICLE', must_redirect=False)
-                    .order_by('publication_date')
-                    .all()]
-            articles_count = len(all_articles)
-
-            try:
-                position = all_articles.index(self.public_content_object)
-            except ValueError:
-                pass  # for an unknown reason, the article is not in the list. This should not happen
-            else:
-                context['paginate_articles'] = True
-                context['previous_article'] = None
-                context['next_article'] = None
-
-                if position > 0:
-                    context['previous_article'] = all_articles[position - 1]
-                if position < articles_count - 1:
-                    context['next_article'] = all_articles[position + 1]
+        if self.object.type == 'ARTICLE' and not self.public_content_object.must_redirect:
+            context['paginate_articles'] = True
+            context['previous_article'], context['next_article'] = \
+                PublishedContent.objects.get_neighbours(self.public_content_object)
 
         if self.versioned_object.type == 'OPINION':
             context['formPickOpinion'] = PickOpinionForm(
@@ -131,16 +115,8 @@ class DisplayOnlineContent(SingleOnlineContentDetailViewMixin):
         if not self.object.js_support:
             context['is_js'] = False
 
-        # optimize requests:
-        votes = CommentVote.objects.filter(user_id=self.request.user.id, comment__in=queryset_reactions).all()
-        context['user_like'] = [vote.comment_id for vote in votes if vote.positive]
-        context['user_dislike'] = [vote.comment_id for vote in votes if not vote.positive]
-
-        if self.request.user.has_perm('tutorialv2.change_contentreaction'):
-            context['user_can_modify'] = [reaction.pk for reaction in queryset_reactions]
-        else:
-            context['user_can_modify'] = [reaction.pk for reaction in queryset_reactions
-                                          if reaction.author == self.request.user]
+        context.update(get_messages_context(
+            context['reactions'], self.request.user, self.request.user.has_perm('tutorialv2.change_contentreaction')))
 
         context['isantispam'] = self.object.antispam()
         context['pm_link'] = self.object.get_absolute_contact_url(_(u'À propos de'))
@@ -153,8 +129,7 @@ class DisplayOnlineContent(SingleOnlineContentDetailViewMixin):
             logger.warning('could not compute reading time : setting sec_per_minute is set to zero (error=%s)', e)
 
         if self.request.user.is_authenticated():
-            for reaction in context['reactions']:
-                signals.content_read.send(sender=reaction.__class__, instance=reaction, user=self.request.user)
+            signals.contents_read.send(sender=ContentReaction, instances=context['reactions'], user=self.request.user)
             signals.content_read.send(
                 sender=self.object.__class__, instance=self.object, user=self.request.user, target=PublishableContent)
         if last_participation_is_old(self.object, self.request.user):
@@ -233,19 +208,14 @@ class DownloadOnlineContent(SingleOnlineContentViewMixin, DownloadViewMixin):
         if self.requested_file == 'md':
             self.mimetype += '; charset=utf-8'
 
-        return super(DownloadOnlineContent, self).get(context, **response_kwargs)
+        # the permissions are checked, the file itself can be sent by the web server
+        return serve_file(self.request, self.get_file_path(), self.get_mimetype(), self.get_filename())
 
     def get_filename(self):
         return self.public_content_object.content_public_slug + '.' + self.requested_file
 
-    def get_contents(self):
-        path = os.path.join(self.public_content_object.get_extra_contents_directory(), self.get_filename())
-        try:
-            response = open(path, 'rb').read()
-        except IOError:
-            raise Http404(u"Le fichier n'existe pas.")
-
-        return response
+    def get_file_path(self):
+        return os.path.join(self.public_content_object.get_extra_contents_directory(), self.get_filename())
 
 
 class DownloadOnlineArticle(DownloadOnlineContent):
@@ -1,4 +1,5 @@
 # coding: utf-8
+from contextlib import contextmanager
 
 from django.template import defaultfilters
 
@@ -19,6 +20,27 @@ def get_current_request():
     return getattr(_thread_locals, 'request', None)
 
 
+def is_loading_fixtures():
+    """
+    :return: ``True`` while fixtures are loaded (see ``loading_fixtures()``) by the current thread
+    :rtype: bool
+    """
+    return getattr(_thread_locals, 'loading_fixtures', False)
+
+
+@contextmanager
+def loading_fixtures():
+    """Context in which the current thread loads fixtures: the receivers decorated with
+    ``zds.notification.receivers.disable_for_loaddata`` do nothing.
+    """
+    previous = is_loading_fixtures()
+    _thread_locals.loading_fixtures = True
+    try:
+        yield
+    finally:
+        _thread_locals.loading_fixtures = previous
+
+
 class ThreadLocals(object):
 
     def process_request(self, request):
@@ -0,0 +1,74 @@
+# coding: utf-8
+
+import threading
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    Small thread-safe, in-process, least-recently-used cache.
+
+    It keeps at most ``max_size`` entries (a ``max_size`` of ``0`` disables it) and counts hits and misses so that
+    callers can expose them.
+    """
+
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        :param key: the key to look for.
+        :param default: what is returned on a miss.
+        :return: the cached value, or ``default``.
+        """
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = value  # move it back to the most recently used end
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """
+        :return: a dictionary with the size, the maximum size, the hits and the misses of this cache.
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
@@ -125,6 +125,32 @@ def unlock_topic(topic):
     topic.save()
 
 
+def get_messages_context(messages, user, can_modify_all):
+    """
+    Get the votes of a user and the messages they can edit, among the messages displayed on a page (and not all the
+    messages of the topic or content).
+
+    :param messages: the messages of the page
+    :param user: the user reading the page
+    :param can_modify_all: whether the user can edit the messages of the other members
+    :return: the ``user_like``, ``user_dislike`` and ``user_can_modify`` lists of primary keys of messages
+    :rtype: dict
+    """
+    messages = list(messages)
+    context = {
+        'user_like': [],
+        'user_dislike': [],
+        'user_can_modify': [message.pk for message in messages if can_modify_all or message.author_id == user.pk],
+    }
+    if user.is_authenticated():
+        votes = CommentVote.objects \
+            .filter(user=user, comment__in=[message.pk for message in messages]) \
+            .values_list('comment', 'positive')
+        for comment_pk, positive in votes:
+            context['user_like' if positive else 'user_dislike'].append(comment_pk)
+    return context
+
+
 class CreatePostView(CreateView, SingleObjectMixin, QuoteMixin):
     posts = None
 
@@ -148,20 +174,12 @@ class CreatePostView(CreateView, SingleObjectMixin, QuoteMixin):
             'form': form,
         }
 
-        votes = CommentVote.objects.filter(user_id=self.request.user.pk,
-                                           comment_id__in=[p.pk for p in context['posts']]).all()
-        context['user_like'] = [vote.comment_id for vote in votes if vote.positive]
-        context['user_dislike'] = [vote.comment_id for vote in votes if not vote.positive]
         context['is_staff'] = self.request.user.has_perm('forum.change_topic')
+        context.update(get_messages_context(context['posts'], self.request.user, context['is_staff']))
 
         if hasattr(self.object, 'antispam'):
             context['isantispam'] = self.object.antispam()
 
-        if self.request.user.has_perm('forum.change_topic'):
-            context['user_can_modify'] = [post.pk for post in context['posts']]
-        else:
-            context['user_can_modify'] = [post.pk for post in context['posts'] if post.author == self.request.user]
-
         return render(request, self.template_name, context)
 
     def post(self, request, *args, **kwargs):
@@ -7,6 +7,7 @@ import yaml
 from django.core.management.base import BaseCommand
 from django.db import transaction
 from zds.settings import MEDIA_ROOT
+from zds.utils import loading_fixtures
 
 
 @transaction.atomic
@@ -26,15 +27,16 @@ class Command(BaseCommand):
         if not os.path.exists(MEDIA_ROOT):
             os.mkdir(MEDIA_ROOT)
 
-        for filename in glob.glob(files):
-            stream = open(filename, 'r')
-            fixture_list = yaml.load(stream)
-            for fixture in fixture_list:
-                splitted = str(fixture['factory']).split('.')
-                module_part = '.'.join(splitted[:-1])
-                module = __import__(module_part)
-                for comp in splitted[1:-1]:
-                    module = getattr(module, comp)
-
-                obj = getattr(module, splitted[-1])(**fixture['fields'])
-                print(obj)
+        with loading_fixtures():
+            for filename in glob.glob(files):
+                stream = open(filename, 'r')
+                fixture_list = yaml.load(stream)
+                for fixture in fixture_list:
+                    splitted = str(fixture['factory']).split('.')
+                    module_part = '.'.join(splitted[:-1])
+                    module = __import__(module_part)
+                    for comp in splitted[1:-1]:
+                        module = getattr(module, comp)
+
+                    obj = getattr(module, splitted[-1])(**fixture['fields'])
+                    print(obj)
@@ -17,7 +17,7 @@ from django.contrib.auth.models import User, Permission
 from zds.member.models import Profile
 from zds.forum.models import Forum, Topic, Category as FCategory
 from zds.utils.models import Tag, Category as TCategory, CategorySubCategory, SubCategory, Licence
-from zds.utils import slugify
+from zds.utils import slugify, loading_fixtures
 from zds import settings
 from django.db import transaction
 from zds.tutorialv2.factories import PublishableContentFactory, ContainerFactory, ExtractFactory, \
@@ -593,29 +593,31 @@ Examples:
             size = 1
         fake = Factory.create(locale='fr_FR')
 
-        if 'member' in default_module:
-            load_member(self, size, fake, default_root)
-        if 'staff' in default_module:
-            load_staff(self, size, fake, default_root)
-        if 'gallery' in default_module:
-            load_gallery(self, size, fake)
-        if 'category_forum' in default_module:
-            load_categories_forum(self, size, fake)
-        if 'forum' in default_module:
-            load_forums(self, size, fake)
-        if 'tag' in default_module:
-            load_tags(self, size, fake)
-        if 'topic' in default_module:
-            load_topics(self, size, fake)
-        if 'post' in default_module:
-            load_posts(self, size, fake)
-        if 'category_content' in default_module:
-            load_categories_content(self, size, fake)
-        if 'tutorial' in default_module:
-            load_contents(self, 'TUTORIAL', size, fake)
-        if 'article' in default_module:
-            load_contents(self, 'ARTICLE', size, fake)
-        if 'opinion' in default_module:
-            load_contents(self, 'OPINION', size, fake)
-        if 'comment' in default_module:
-            load_comment_content(self, size, fake)
+        # the notifications of the generated contents are not wanted
+        with loading_fixtures():
+            if 'member' in default_module:
+                load_member(self, size, fake, default_root)
+            if 'staff' in default_module:
+                load_staff(self, size, fake, default_root)
+            if 'gallery' in default_module:
+                load_gallery(self, size, fake)
+            if 'category_forum' in default_module:
+                load_categories_forum(self, size, fake)
+            if 'forum' in default_module:
+                load_forums(self, size, fake)
+            if 'tag' in default_module:
+                load_tags(self, size, fake)
+            if 'topic' in default_module:
+                load_topics(self, size, fake)
+            if 'post' in default_module:
+                load_posts(self, size, fake)
+            if 'category_content' in default_module:
+                load_categories_content(self, size, fake)
+            if 'tutorial' in default_module:
+                load_contents(self, 'TUTORIAL', size, fake)
+            if 'article' in default_module:
+                load_contents(self, 'ARTICLE', size, fake)
+            if 'opinion' in default_module:
+                load_contents(self, 'OPINION', size, fake)
+            if 'comment' in default_module:
+                load_comment_content(self, size, fake)
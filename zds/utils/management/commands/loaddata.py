@@ -0,0 +1,14 @@
+# coding: utf-8
+from django.core.management.commands import loaddata
+
+from zds.utils import loading_fixtures
+
+
+class Command(loaddata.Command):
+    """
+    Django's `loaddata`, run in ``zds.utils.loading_fixtures()`` so that the notification receivers are disabled.
+    """
+
+    def handle(self, *fixture_labels, **options):
+        with loading_fixtures():
+            return super(Command, self).handle(*fixture_labels, **options)
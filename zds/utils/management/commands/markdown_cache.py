@@ -0,0 +1,43 @@
+# coding: utf-8
+from django.core.management.base import BaseCommand, CommandError
+
+from zds.member.models import Profile
+from zds.utils.templatetags.emarkdown import render_cache
+
+
+class Command(BaseCommand):
+    help = 'Warm, purge or inspect the cache of rendered markdown'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', type=str, help='action to perform', choices=['warm', 'purge', 'stats'])
+
+    def handle(self, *args, **options):
+        if options['action'] == 'warm':
+            self.warm()
+        elif options['action'] == 'purge':
+            render_cache.purge()
+            self.stdout.write(u'Rendered markdown cache purged.')
+        elif options['action'] == 'stats':
+            self.show_stats()
+        else:
+            raise CommandError('unknown action {}'.format(options['action']))
+
+    def warm(self):
+        """Render the texts which are displayed on most pages: the signatures (next to every message) and the
+        biographies of the members."""
+        counter = 0
+        profiles = Profile.objects.exclude(sign='', biography='').only('sign', 'biography')
+        for profile in profiles.iterator():
+            if profile.sign:
+                render_cache.get_or_render(profile.sign, inline=True)
+                counter += 1
+            if profile.biography:
+                render_cache.get_or_render(profile.biography)
+                counter += 1
+
+        self.stdout.write(u'{} texts rendered.'.format(counter))
+        self.show_stats()
+
+    def show_stats(self):
+        for name, value in sorted(render_cache.stats().items()):
+            self.stdout.write(u'{}\t{}'.format(name, value))
@@ -0,0 +1,56 @@
+# coding: utf-8
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from zds.forum.models import Post
+from zds.mp.models import PrivatePost
+from zds.tutorialv2.models.models_database import ContentReaction
+from zds.utils.templatetags.emarkdown import get_renderer_version
+
+
+class Command(BaseCommand):
+    """
+    `python manage.py rerender_comments`; render again every message whose html was generated by another version
+    of the markdown renderer, so that it does not happen while displaying it.
+
+    Messages are walked by primary key ranges. Since up-to-date messages are skipped, an interrupted run can simply be
+    started again (``--from-pk`` avoids walking the ranges which were already done).
+    """
+    help = 'Render again the messages whose html is outdated'
+
+    models = {
+        'post': Post,
+        'contentreaction': ContentReaction,
+        'privatepost': PrivatePost,
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', action='append', choices=sorted(self.models.keys()), dest='models',
+                            help='only render this kind of messages (can be repeated)')
+        parser.add_argument('--chunk-size', type=int, default=500, dest='chunk_size',
+                            help='number of primary keys handled per transaction')
+        parser.add_argument('--from-pk', type=int, default=0, dest='from_pk',
+                            help='start at this primary key')
+
+    def handle(self, *args, **options):
+        version = get_renderer_version()
+        chunk_size = options['chunk_size']
+
+        for name in options['models'] or sorted(self.models.keys()):
+            model = self.models[name]
+            queryset = model.objects.exclude(text_html_version=version)
+            last_pk = queryset.order_by('-pk').values_list('pk', flat=True).first()
+            if last_pk is None:
+                self.stdout.write(u'{}: nothing to render'.format(name))
+                continue
+
+            counter = 0
+            start = options['from_pk']
+            while start <= last_pk:
+                end = start + chunk_size
+                with transaction.atomic():
+                    for message in queryset.filter(pk__gte=start, pk__lt=end).order_by('pk'):
+                        message.render_text_html()
+                        counter += 1
+                self.stdout.write(u'{}: {} messages rendered, next chunk starts at pk={}'.format(name, counter, end))
+                start = end
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('utils', '0012_commentedit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='text_html_version',
+            field=models.CharField(default='', max_length=80, verbose_name='Version du rendu du texte en Html', blank=True),
+        ),
+    ]
@@ -22,7 +22,7 @@ from zds.mp.models import PrivateTopic
 from zds.tutorialv2.models import TYPE_CHOICES, TYPE_CHOICES_DICT
 from zds.utils.mps import send_mp
 from zds.utils import slugify
-from zds.utils.templatetags.emarkdown import get_markdown_instance, render_markdown
+from zds.utils.templatetags.emarkdown import get_markdown_instance, render_markdown, get_renderer_version
 
 from model_utils.managers import InheritanceManager
 
@@ -168,6 +168,7 @@ class Comment(models.Model):
 
     text = models.TextField('Texte')
     text_html = models.TextField('Texte en Html')
+    text_html_version = models.CharField('Version du rendu du texte en Html', max_length=80, blank=True, default='')
 
     like = models.IntegerField('Likes', default=0)
     dislike = models.IntegerField('Dislikes', default=0)
@@ -191,10 +192,34 @@ class Comment(models.Model):
         self.text = text
         md_instance = get_markdown_instance(ping_url=ping_url)
         self.text_html = render_markdown(md_instance, self.text)
+        self.text_html_version = get_renderer_version()
         self.save()
         for username in list(md_instance.metadata.get('ping', []))[:settings.ZDS_APP['comment']['max_pings']]:
             signals.new_content.send(sender=self.__class__, instance=self, user=User.objects.get(username=username))
 
+    def get_text_html(self):
+        """Get the html version of the text, which is rendered again (and saved) if it was generated by another
+        version of the markdown renderer.
+
+        :return: the html version of the text
+        """
+        if self.text_html_version != get_renderer_version():
+            self.render_text_html()
+        return self.text_html
+
+    def render_text_html(self):
+        """Render the text again with the current markdown renderer, without sending pings again.
+
+        Only ``text_html`` and ``text_html_version`` are saved, so that this can happen while displaying the comment.
+        """
+        from zds.notification.models import ping_url
+
+        self.text_html = render_markdown(get_markdown_instance(ping_url=ping_url), self.text)
+        self.text_html_version = get_renderer_version()
+        if self.pk:
+            Comment.objects.filter(pk=self.pk).update(text_html=self.text_html,
+                                                      text_html_version=self.text_html_version)
+
     def hide_comment_by_user(self, user, text_hidden):
         """Hide a comment and save it
 
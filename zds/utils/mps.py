@@ -80,8 +80,7 @@ def send_message_mp(
     post = PrivatePost()
     post.privatetopic = n_topic
     post.author = author
-    post.text = text
-    post.text_html = emarkdown(text)
+    post.update_content(text)
     post.pubdate = datetime.now()
     post.position_in_topic = pos
     post.save()
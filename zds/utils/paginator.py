@@ -1,9 +1,12 @@
 # coding: utf-8
 
-from django.views.generic import ListView
-from django.views.generic.list import MultipleObjectMixin
+from django.core.cache import cache
 from django.core.paginator import Paginator, EmptyPage
+from django.db.models import Q
 from django.http import Http404
+from django.utils.functional import cached_property
+from django.views.generic import ListView
+from django.views.generic.list import MultipleObjectMixin
 
 from zds.settings import ZDS_APP
 
@@ -47,19 +50,149 @@ class ZdSPagingListView(ListView):
         For some list paginated, we would like to display the last item of the previous page.
         This function returns the list paginated with this previous item.
         """
-        original_list = queryset.all()
         items_list = []
         # If necessary, add the last item in the previous page.
         if self.page.number != 1:
-            last_page = self.paginator.page(self.page.number - 1).object_list
-            last_item = last_page[len(last_page) - 1]
-            items_list.append(last_item)
+            if isinstance(self.paginator, KeysetPaginator):
+                last_item = self.paginator.get_previous_item(self.page)
+            else:
+                last_page = self.paginator.page(self.page.number - 1).object_list
+                last_item = last_page[len(last_page) - 1]
+            if last_item is not None:
+                items_list.append(last_item)
         # Adds all items of the list paginated.
-        for item in original_list:  # TODO: refacto
+        for item in queryset:  # TODO: refacto
             items_list.append(item)
         return items_list
 
 
+class KeysetPaginator(Paginator):
+    """Paginator seeking the first item of a page right after the last item of the previous page (its *boundary*),
+    instead of skipping the items of all the previous pages with an ``OFFSET``, so that a deep page costs as much as
+    the first one. The pages are still numbered:
+
+    - the boundaries of the pages are remembered in the cache (if ``cache_key`` is given), so that going from a page
+      to the next one only uses the index;
+    - when the boundary of the previous page is not known, it is read from the keys of the items only, which is
+      lighter than reading whole pages.
+
+    The number of items should be given (from a counter), otherwise it is counted. Orphans are not supported.
+    """
+
+    def __init__(self, object_list, per_page, ordering, count=None, cache_key=None, cache_timeout=None, **kwargs):
+        """
+        :param object_list: the queryset to paginate
+        :param per_page: number of items in a page
+        :param ordering: the fields the items are sorted by (prefixed by ``-`` for a descending order), the last ones
+            must be unique (e.g. ``('-last_message__pubdate', '-pk')``)
+        :type ordering: tuple
+        :param count: the number of items, if known
+        :param cache_key: identify the list (e.g. a forum and a filter) to remember the boundaries of its pages
+        :param cache_timeout: for how long (in seconds) a boundary is remembered
+        """
+        super(KeysetPaginator, self).__init__(object_list, per_page, **kwargs)
+        self.ordering = ordering
+        self.fields = [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+        self.known_count = count
+        self.cache_key = cache_key
+        self.cache_timeout = cache_timeout or ZDS_APP['paginator']['boundaries_cache_timeout']
+
+    @cached_property
+    def count(self):
+        if self.known_count is not None:
+            return self.known_count
+        return super(KeysetPaginator, self).count
+
+    def get_key(self, item):
+        """
+        :param item: an item of the list
+        :return: the values of the ordering fields for this item
+        :rtype: tuple
+        """
+        key = []
+        for field, _ in self.fields:
+            value = item
+            for attribute in field.split('__'):
+                value = getattr(value, attribute)
+            key.append(value)
+        return tuple(key)
+
+    def get_seek_query(self, key, backward=False):
+        """
+        :param key: the key of an item
+        :param backward: select the items before this one instead of after it
+        :return: a query selecting the items after (or before) the item with this key
+        :rtype: django.db.models.Q
+        """
+        query = Q()
+        equal = {}
+        for (field, descending), value in zip(self.fields, key):
+            lookup = 'lt' if descending != backward else 'gt'
+            query |= Q(**dict(equal, **{'{}__{}'.format(field, lookup): value}))
+            equal[field] = value
+        return query
+
+    def _get_boundary_cache_key(self, number):
+        return 'paginator:{}:{}:{}'.format(self.cache_key, self.per_page, number)
+
+    def get_boundary(self, number):
+        """
+        :param number: the number of a page
+        :return: the key of the last item of this page
+        :rtype: tuple
+        :raise EmptyPage: if the page does not exist (anymore)
+        """
+        key = cache.get(self._get_boundary_cache_key(number)) if self.cache_key else None
+        if key is None:
+            index = number * self.per_page
+            keys = list(self.object_list.order_by(*self.ordering)
+                                        .values_list(*[field for field, _ in self.fields])[index - 1:index])
+            if not keys:
+                raise EmptyPage('That page contains no results')
+            key = keys[0]
+            self.remember_boundary(number, key)
+        return key
+
+    def remember_boundary(self, number, key):
+        if self.cache_key:
+            cache.set(self._get_boundary_cache_key(number), key, self.cache_timeout)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        queryset = self.object_list.order_by(*self.ordering)
+        if number > 1:
+            queryset = queryset.filter(self.get_seek_query(self.get_boundary(number - 1)))
+
+        items = list(queryset[:self.per_page])
+        if len(items) == self.per_page:
+            self.remember_boundary(number, self.get_key(items[-1]))
+        return self._get_page(items, number, self)
+
+    def get_previous_item(self, page):
+        """
+        :param page: a page of this paginator
+        :return: the item before the first one of the page, if any
+        """
+        if not page.object_list:
+            return None
+        return self.object_list.order_by(*[field.lstrip('-') if field.startswith('-') else '-' + field
+                                           for field in self.ordering]) \
+                               .filter(self.get_seek_query(self.get_key(page.object_list[0]), backward=True)) \
+                               .first()
+
+
+class PositionPaginator(KeysetPaginator):
+    """Paginate messages, which are numbered from 1 by their ``position``: the boundary of a page is known without
+    any query, and a message is on the page its URL points to.
+    """
+
+    def __init__(self, object_list, per_page, **kwargs):
+        super(PositionPaginator, self).__init__(object_list, per_page, ('position',), **kwargs)
+
+    def get_boundary(self, number):
+        return number * self.per_page,
+
+
 def paginator_range(current, stop, start=1):
     assert current <= stop
 
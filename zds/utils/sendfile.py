@@ -0,0 +1,142 @@
+# coding: utf-8
+
+import os
+import re
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag, parse_etags
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def get_file_etag(stat):
+    """
+    :param stat: result of ``os.stat()`` on the file
+    :return: an (unquoted) ETag changing each time the file is replaced
+    :rtype: str
+    """
+    return '{:x}-{:x}'.format(int(stat.st_mtime * 1000), stat.st_size)
+
+
+def parse_range(header, size):
+    """Parse the value of a ``Range`` header. Only a single range is supported: a request with several ones is answered
+    with the whole file, as allowed by the RFC.
+
+    :param header: value of the header
+    :param size: size of the file
+    :return: ``(start, end)`` (both included), ``None`` if the whole file should be sent
+    :raise ValueError: if the range cannot be satisfied
+    """
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        return None
+
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:  # the last bytes
+        length = int(end)
+        if length == 0:
+            raise ValueError(header)
+        return max(0, size - length), size - 1
+
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def iter_file_range(path, start, end, chunk_size):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def serve_file(request, path, content_type, filename=None):
+    """Send a file from the disk, with the backend defined by ``ZDS_APP['sendfile']['backend']``:
+
+    - ``'django'``: the file is sent in chunks by Django, ``Range`` requests are supported;
+    - ``'x-accel-redirect'``: the file is sent by nginx from an ``internal`` location (``ZDS_APP['sendfile']['url']``)
+      which maps the ``ZDS_APP['sendfile']['root']`` directory;
+    - ``'x-sendfile'``: the file is sent by the web server (apache with ``mod_xsendfile``, lighttpd...).
+
+    In every case, the ``ETag`` and ``Last-Modified`` headers are set and conditional requests are answered by Django.
+    Permissions must be checked before calling this function.
+
+    :param request: the request
+    :param path: absolute path of the file
+    :param content_type: value of the ``Content-Type`` header
+    :param filename: name given to the downloaded file, if any
+    :raise Http404: if the file does not exist
+    :rtype: django.http.HttpResponse
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise Http404(u"Le fichier n'existe pas.")
+
+    sendfile_settings = settings.ZDS_APP['sendfile']
+    backend = sendfile_settings['backend']
+    etag = get_file_etag(stat)
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if not_modified is not None:
+        not_modified['ETag'] = quote_etag(etag)
+        return not_modified
+
+    if backend == 'x-accel-redirect':
+        root = sendfile_settings['root'] or settings.ZDS_APP['content']['repo_public_path']
+        relative_path = os.path.relpath(path, root)
+        if relative_path.startswith(os.pardir):
+            raise ValueError('{} is not in {}'.format(path, root))
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = sendfile_settings['url'] + relative_path.replace(os.sep, '/')
+    elif backend == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+    else:
+        response = serve_file_with_django(request, path, stat, etag, content_type, sendfile_settings['chunk_size'])
+
+    response['ETag'] = quote_etag(etag)
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if filename:
+        response['Content-Disposition'] = 'filename=' + filename
+    return response
+
+
+def serve_file_with_django(request, path, stat, etag, content_type, chunk_size):
+    size = stat.st_size
+    byte_range = None
+
+    range_header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    # if the file changed since the client got its first part, send it again completely
+    if range_header and (not if_range or etag in parse_etags(if_range)):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */{}'.format(size)
+            return response
+
+    if byte_range is None:
+        response = StreamingHttpResponse(iter_file_range(path, 0, size - 1, chunk_size), content_type=content_type)
+        response['Content-Length'] = size
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(iter_file_range(path, start, end, chunk_size), status=206,
+                                         content_type=content_type)
+        response['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, size)
+        response['Content-Length'] = end - start + 1
+
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -1,15 +1,20 @@
 # coding: utf-8
 
+import hashlib
 import re
+import time
 
 from django.conf import settings
 from django import template
+from django.core.cache import cache
 from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext_lazy as _
 
+import zmarkdown
 from zmarkdown import ZMarkdown
 from zmarkdown.extensions.zds import ZdsExtension
 
+from zds.utils.cache import LRUCache
 from zds.utils.templatetags.smileysDef import smileys
 
 register = template.Library()
@@ -60,6 +65,119 @@ def render_markdown(markdown, text, inline=False):
             return mark_safe(u'<div class="error ico-after"><p>{}</p></div>'.format(__MD_ERROR_PARSING))
 
 
+def get_renderer_version():
+    """
+    :return: a string identifying the markdown renderer, which changes whenever a rendered text may change.
+    :rtype: str
+    """
+    return u'{}-{}'.format(getattr(zmarkdown, 'version', ''), settings.ZDS_APP['markdown']['renderer_version'])
+
+
+class RenderCache(object):
+    """
+    Content-addressed cache of rendered markdown.
+
+    Entries are keyed by a hash of the text and of every parameter that changes the output (``inline``,
+    ``js_support``, ``ping_url`` and the renderer version), so they never need to be invalidated when a text is
+    edited. Two tiers are used: an in-process LRU in front of the Django cache.
+
+    Purging bumps a generation number stored in the Django cache: it hides every previous entry of the shared tier
+    at once, and every process drops its local tier when it notices the new generation.
+    """
+
+    key_prefix = 'emarkdown'
+    generation_key = 'emarkdown:generation'
+    generation_check_interval = 30  # seconds
+
+    def __init__(self, local_size, timeout):
+        self.local = LRUCache(local_size)
+        self.timeout = timeout
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self._generation = None
+        self._generation_checked_at = 0
+
+    def get_generation(self):
+        now = time.time()
+        if self._generation is None or now - self._generation_checked_at > self.generation_check_interval:
+            generation = cache.get(self.generation_key)
+            if generation is None:
+                generation = 1
+                cache.add(self.generation_key, generation, None)
+            if generation != self._generation:
+                self.local.clear()
+            self._generation = generation
+            self._generation_checked_at = now
+        return self._generation
+
+    def get_key(self, text, inline=False, js_support=False, ping_url=None):
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        digest = hashlib.sha1()
+        digest.update(get_renderer_version().encode('utf-8'))
+        digest.update('\0{:d}{:d}\0'.format(bool(inline), bool(js_support)))
+        if ping_url is not None:
+            digest.update('{}.{}'.format(ping_url.__module__, ping_url.__name__))
+        digest.update('\0')
+        digest.update(text)
+        return '{}:{}:{}'.format(self.key_prefix, self.get_generation(), digest.hexdigest())
+
+    def get_or_render(self, text, inline=False, js_support=False, ping_url=None):
+        """
+        Render ``text`` unless it was already rendered with the same parameters.
+
+        :param str text: Text to render.
+        :param bool inline: If `True`, parse only inline content.
+        :param bool js_support: If `True`, enable the JS-dependent extensions.
+        :param ping_url: function used to build the ping urls, if any.
+        :return: Equivalent html string.
+        :rtype: str
+        """
+        key = self.get_key(text, inline=inline, js_support=js_support, ping_url=ping_url)
+
+        html = self.local.get(key)
+        if html is None:
+            html = cache.get(key)
+            if html is None:
+                self.shared_misses += 1
+                md_instance = get_markdown_instance(inline=inline, js_support=js_support, ping_url=ping_url)
+                html = render_markdown(md_instance, text, inline=inline)
+                cache.set(key, html, self.timeout)
+            else:
+                self.shared_hits += 1
+            self.local.set(key, html)
+
+        return mark_safe(html)
+
+    def purge(self):
+        """Invalidate every rendered text, in both tiers."""
+        try:
+            self._generation = cache.incr(self.generation_key)
+        except ValueError:  # the generation was evicted, so there is nothing to hide anymore
+            self._generation = None
+        self._generation_checked_at = 0
+        self.local.clear()
+
+    def stats(self):
+        """
+        :return: hit and miss counters of both tiers for the current process.
+        :rtype: dict
+        """
+        local_stats = self.local.stats()
+        return {
+            'local_size': local_stats['size'],
+            'local_max_size': local_stats['max_size'],
+            'local_hits': local_stats['hits'],
+            'local_misses': local_stats['misses'],
+            'shared_hits': self.shared_hits,
+            'shared_misses': self.shared_misses,
+        }
+
+
+render_cache = RenderCache(local_size=settings.ZDS_APP['markdown']['render_cache_local_size'],
+                           timeout=settings.ZDS_APP['markdown']['render_cache_timeout'])
+
+
 @register.filter(needs_autoescape=False)
 def emarkdown(text, use_jsfiddle='', inline=False):
     """
@@ -69,7 +187,11 @@ def emarkdown(text, use_jsfiddle='', inline=False):
     :return: Equivalent html string.
     :rtype: str
     """
-    md_instance = get_markdown_instance(inline=inline, js_support=(use_jsfiddle == 'js'), ping_url=None)
+    js_support = use_jsfiddle == 'js'
+    if settings.ZDS_APP['markdown']['render_cache_enabled'] and isinstance(text, basestring):
+        return render_cache.get_or_render(text, inline=inline, js_support=js_support)
+
+    md_instance = get_markdown_instance(inline=inline, js_support=js_support, ping_url=None)
     return render_markdown(md_instance, text, inline=inline)
 
 
@@ -7,7 +7,7 @@ from django import template
 from django.contrib.contenttypes.models import ContentType
 from django.utils.translation import ugettext_lazy as _
 
-from zds.forum.models import Post, is_read as topic_is_read
+from zds.forum.models import Post, is_read as topic_is_read, resolve_read_states
 from zds.mp.models import PrivateTopic
 from zds.tutorialv2.models.models_database import Validation
 from zds.notification.models import Notification, TopicAnswerSubscription, ContentReactionAnswerSubscription, \
@@ -100,7 +100,8 @@ def humane_delta(value):
 
 @register.filter('followed_topics')
 def followed_topics(user):
-    topics_followed = TopicAnswerSubscription.objects.get_objects_followed_by(user)[:10]
+    topics_followed = resolve_read_states(list(TopicAnswerSubscription.objects.get_objects_followed_by(user)
+                                               .select_related('last_message')[:10]), user)
     # periods is a map associating a period (Today, Yesterday, Last n days)
     # with its corresponding number of days: (humane_delta index, number of days).
     # (3, 7) thus means that passing 3 to humane_delta would return "This week", for which
@@ -2,6 +2,10 @@
 
 from django.test import TestCase
 from django.template import Context, Template
+from mock import patch
+
+from zds.utils.templatetags import emarkdown as emarkdown_module
+from zds.utils.templatetags.emarkdown import emarkdown, render_cache
 
 
 class EMarkdownTest(TestCase):
@@ -54,3 +58,24 @@ class EMarkdownTest(TestCase):
                          '##### Titre **2**\n\n'
                          '###### Titre 3\n\n'
                          '&gt; test', tr)
+
+    def test_render_cache(self):
+        text = u'Un texte **rendu** une seule fois'
+        render_cache.purge()
+
+        with patch.object(emarkdown_module, 'get_markdown_instance',
+                          wraps=emarkdown_module.get_markdown_instance) as get_instance:
+            first = emarkdown(text)
+            self.assertEqual(get_instance.call_count, 1)
+            self.assertEqual(first, emarkdown(text))
+            self.assertEqual(get_instance.call_count, 1)  # served by the cache
+
+            # the parameters are part of the key
+            emarkdown(text, inline=True)
+            self.assertEqual(get_instance.call_count, 2)
+
+            render_cache.purge()
+            self.assertEqual(first, emarkdown(text))
+            self.assertEqual(get_instance.call_count, 3)
+
+        self.assertGreater(render_cache.stats()['local_hits'], 0)
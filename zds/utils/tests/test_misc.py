@@ -1,15 +1,76 @@
 # coding: utf-8
 import datetime
-from django.test import TestCase
+import os
+import tempfile
+from copy import deepcopy
+
+from django.conf import settings
+from django.test import TestCase, RequestFactory
+from django.test.utils import override_settings
 
 from zds.member.factories import ProfileFactory, StaffProfileFactory
 from zds.tutorialv2.factories import PublishedContentFactory
+from zds.utils.cache import LRUCache
 from zds.utils.misc import contains_utf8mb4
 from zds.utils.models import Alert
+from zds.utils.sendfile import serve_file
 from zds.utils.templatetags.interventions import alerts_list
 
 
 class Misc(TestCase):
+    def test_lru_cache(self):
+        lru = LRUCache(max_size=2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        self.assertEqual(lru.get('a'), 1)
+        lru.set('c', 3)  # 'b' is the least recently used one
+        self.assertNotIn('b', lru)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('c'), 3)
+        self.assertEqual(lru.stats(), {'size': 2, 'max_size': 2, 'hits': 2, 'misses': 1})
+
+        lru.clear()
+        self.assertEqual(len(lru), 0)
+
+    def test_serve_file(self):
+        handle, path = tempfile.mkstemp()
+        with os.fdopen(handle, 'wb') as f:
+            f.write(b'0123456789')
+        factory = RequestFactory()
+
+        response = serve_file(factory.get('/'), path, 'application/pdf', 'file.pdf')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Content-Disposition'], 'filename=file.pdf')
+        etag = response['ETag']
+
+        # conditional request
+        response = serve_file(factory.get('/', HTTP_IF_NONE_MATCH=etag), path, 'application/pdf')
+        self.assertEqual(response.status_code, 304)
+
+        # ranges
+        response = serve_file(factory.get('/', HTTP_RANGE='bytes=2-4'), path, 'application/pdf')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-4/10')
+        self.assertEqual(b''.join(response.streaming_content), b'234')
+        response = serve_file(factory.get('/', HTTP_RANGE='bytes=-3'), path, 'application/pdf')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+        response = serve_file(factory.get('/', HTTP_RANGE='bytes=20-'), path, 'application/pdf')
+        self.assertEqual(response.status_code, 416)
+        response = serve_file(factory.get('/', HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE='"outdated"'), path,
+                              'application/pdf')
+        self.assertEqual(response.status_code, 200)
+
+        # the web server sends the file
+        zds_app = deepcopy(settings.ZDS_APP)
+        zds_app['sendfile'].update(backend='x-accel-redirect', root=os.path.dirname(path), url='/internal/')
+        with override_settings(ZDS_APP=zds_app):
+            response = serve_file(factory.get('/'), path, 'application/pdf')
+        self.assertEqual(response['X-Accel-Redirect'], '/internal/' + os.path.basename(path))
+        self.assertEqual(response.content, b'')
+
+        os.remove(path)
+
     def test_utf8mb4(self):
         self.assertFalse(contains_utf8mb4('abc'))
         self.assertFalse(contains_utf8mb4(u'abc'))
@@ -1,9 +1,14 @@
 # coding: utf-8
+from django.core.management import call_command
 from django.test import TestCase
 from django.db import IntegrityError, transaction
 
+from zds.forum.factories import CategoryFactory, ForumFactory, TopicFactory, PostFactory
+from zds.member.factories import ProfileFactory
 from zds.utils.forms import TagValidator
-from zds.utils.models import Tag
+from zds.utils.forums import get_messages_context
+from zds.utils.models import Tag, Comment, CommentVote
+from zds.utils.templatetags.emarkdown import get_renderer_version
 
 
 class TagsTests(TestCase):
@@ -74,3 +79,53 @@ class TagsTests(TestCase):
         validator = TagValidator()
         self.assertFalse(validator.validate_raw_string(raw_string))
         self.assertEqual(1, len(validator.errors))
+
+
+class CommentRenderingTests(TestCase):
+    def setUp(self):
+        self.user = ProfileFactory().user
+        forum = ForumFactory(category=CategoryFactory(position=1), position_in_category=1)
+        self.topic = TopicFactory(forum=forum, author=self.user)
+
+    def test_outdated_html_is_rendered_on_read(self):
+        post = PostFactory(topic=self.topic, author=self.user, position=1, text=u'Un **texte**',
+                           text_html=u'html périmé', text_html_version='')
+
+        self.assertIn(u'<strong>texte</strong>', post.get_text_html())
+        stored = Comment.objects.get(pk=post.pk)
+        self.assertEqual(stored.text_html_version, get_renderer_version())
+        self.assertIn(u'<strong>texte</strong>', stored.text_html)
+
+    def test_rerender_comments_command(self):
+        outdated = PostFactory(topic=self.topic, author=self.user, position=1, text=u'Un **texte**',
+                               text_html=u'html périmé', text_html_version='old')
+        up_to_date = PostFactory(topic=self.topic, author=self.user, position=2)
+
+        call_command('rerender_comments', chunk_size=1)
+
+        self.assertIn(u'<strong>texte</strong>', Comment.objects.get(pk=outdated.pk).text_html)
+        self.assertEqual(up_to_date.text_html, Comment.objects.get(pk=up_to_date.pk).text_html)
+        self.assertFalse(Comment.objects.exclude(text_html_version=get_renderer_version()).exists())
+
+
+class CommentVotesTests(TestCase):
+    def setUp(self):
+        self.user = ProfileFactory().user
+        self.voter = ProfileFactory().user
+        forum = ForumFactory(category=CategoryFactory(position=1), position_in_category=1)
+        topic = TopicFactory(forum=forum, author=self.user)
+        self.posts = [PostFactory(topic=topic, author=author, position=position)
+                      for position, author in enumerate([self.user, self.voter, self.user], 1)]
+        CommentVote.objects.create(user=self.voter, comment=self.posts[0], positive=True)
+        CommentVote.objects.create(user=self.voter, comment=self.posts[2], positive=False)
+        CommentVote.objects.create(user=self.user, comment=self.posts[2], positive=True)
+
+    def test_messages_context_of_a_page(self):
+        context = get_messages_context(self.posts[1:], self.voter, False)
+        self.assertEqual([], context['user_like'])  # the vote on the first post is not on the page
+        self.assertEqual([self.posts[2].pk], context['user_dislike'])
+        self.assertEqual([self.posts[1].pk], context['user_can_modify'])
+
+        context = get_messages_context(self.posts[1:], self.user, True)
+        self.assertEqual([self.posts[2].pk], context['user_like'])
+        self.assertEqual([self.posts[1].pk, self.posts[2].pk], context['user_can_modify'])